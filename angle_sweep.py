@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+'''
+/************************/
+/*    angle_sweep.py    */
+/*    Version 1.0       */
+/*      2026/10/17      */
+/************************/
+'''
+import argparse
+from mod_epr import CustomHelpFormatter
+from mod_rng import seed, generator
+from mod_spin_operators import TwoSpin
+from mod_sweep import two_spin_state, exact_sweep, sampled_sweep
+import numpy as np
+import sys
+import time
+
+description = (
+    'This script computes the correlation E = < σ^A σ^B > of the two '
+    'spin simulation over grids of apparatus angles, without any '
+    'graphical interface.\n\n'
+    'The simulation types are the ones of two_spin_sim.py '
+    '(-t SIMUL_TYPE, --simul_type SIMUL_TYPE), default singlet state.\n'
+    'Each angle (-a, --thetaA, -p, --phiA, -b, --thetaB, -q, --phiB) is '
+    'a value or a range "start:stop:num" in degrees, the grid is made by '
+    'all their combinations.\n'
+    'The exact correlations are always computed, with '
+    '"-n, --shots" greater than 0 each point of the grid is also measured '
+    'the given number of times.\n'
+    'The results are printed in CSV format or written with '
+    '"-o, --output" in CSV or, if the file ends with .npz, numpy format.\n'
+)
+
+
+def parse_angles(angles_string):
+    """Parse a value or a "start:stop:num" range of angles in degrees."""
+    values = [float(x) for x in angles_string.split(':')]
+    if len(values) == 1:
+        return np.array(values)
+    if len(values) != 3:
+        raise argparse.ArgumentTypeError(
+            f"Incorrect angles {angles_string}")
+    return np.linspace(values[0], values[1], int(values[2]))
+
+
+def main():
+    # Set a fixed seed value
+    seed_value = 5948
+    seed(seed_value)
+    parser = argparse.ArgumentParser(description=description,
+                                     formatter_class=CustomHelpFormatter)
+    parser.add_argument('-t', '--simul_type', type=int, default=3,
+                        help='simulation type - Default: 3')
+    parser.add_argument('-a', '--thetaA', type=parse_angles,
+                        default=np.zeros(1), help='angles theta of A')
+    parser.add_argument('-p', '--phiA', type=parse_angles,
+                        default=np.zeros(1), help='angles phi of A')
+    parser.add_argument('-b', '--thetaB', type=parse_angles,
+                        default=np.zeros(1), help='angles theta of B')
+    parser.add_argument('-q', '--phiB', type=parse_angles,
+                        default=np.zeros(1), help='angles phi of B')
+    parser.add_argument('-n', '--shots', type=int, default=0,
+                        help='Number of measurements per point - '
+                        'Default: 0')
+    parser.add_argument('-s', '--bloch-theta', type=float, default=1.0,
+                        help='coefficient theta between real '
+                        'and Hilbert world')
+    parser.add_argument('-c', '--bloch-phi', type=float, default=1.0,
+                        help='coefficient phi between real '
+                        'and Hilbert world')
+    parser.add_argument('-o', '--output', type=str,
+                        help='Write the results to a CSV or .npz file')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='verbose output', required=False)
+    args = parser.parse_args()
+    spin = TwoSpin()
+    two_spin_state(spin, args.simul_type)
+    grid = np.meshgrid(args.thetaA, args.phiA, args.thetaB, args.phiB,
+                       indexing='ij')
+    angles = [np.deg2rad(g) for g in grid]
+    start = time.perf_counter()
+    exact = exact_sweep(spin, *angles, args.bloch_theta, args.bloch_phi)
+    results = {'thetaA': grid[0], 'phiA': grid[1], 'thetaB': grid[2],
+               'phiB': grid[3], 'E_exact': exact.E}
+    if args.verbose:
+        print(f"Exact: {exact.E.size} points in "
+              f"{time.perf_counter() - start:.3f} s", file=sys.stderr)
+    if args.shots > 0:
+        start = time.perf_counter()
+        sampled = sampled_sweep(spin, *angles, args.shots, args.bloch_theta,
+                                args.bloch_phi, generator())
+        results['E_sampled'] = sampled.E
+        results['E_stderr'] = sampled.stderr
+        if args.verbose:
+            print(f"Sampled: {exact.E.size * args.shots} measurements in "
+                  f"{time.perf_counter() - start:.3f} s", file=sys.stderr)
+    if args.output and args.output.endswith('.npz'):
+        np.savez(args.output, **results)
+        return
+    header = ','.join(results)
+    table = np.stack([v.reshape(-1) for v in results.values()], axis=1)
+    np.savetxt(args.output or sys.stdout, table, fmt='%.6g',
+               delimiter=',', header=header, comments='')
+
+
+if __name__ == '__main__':
+    if sys.version_info[0] < 3:
+        raise RuntimeError('Must be using Python 3')
+    main()
@@ -6,18 +6,25 @@
 /*      2024/05/28      */
 /************************/
 '''
-import argparse
 import math
-from mod_spin_operators import TwoSpin
+from mod_epr import cfg, build_parser, apply_args
+from mod_epr import EPRApparatus, EPRPool, EPRReplay
+from mod_epr import EPRSequential, sequential_rule
+from mod_epr import EPRCounts, bell_text_exp2, percent
+from mod_lhv import make_apparatus
+from mod_rng import seed, generator, spawn, streams
+from mod_storage import ShotBuffer, PackedShotBuffer, ShotLog
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from PyQt6 import QtWidgets
 from PyQt6.QtWidgets import QPushButton, QLabel
 from PyQt6.QtWidgets import QButtonGroup, QRadioButton
 from PyQt6.QtWidgets import QVBoxLayout, QHBoxLayout, QGridLayout
-from PyQt6.QtWidgets import QWidget, QSizePolicy
+from PyQt6.QtWidgets import QWidget, QSizePolicy, QProgressBar
+from PyQt6.QtWidgets import QSlider, QFileDialog, QMessageBox
 from PyQt6.QtOpenGLWidgets import QOpenGLWidget
 from PyQt6.QtGui import QPainter, QFont, QColor
-from PyQt6.QtCore import QRect
+from PyQt6.QtCore import QRect, QThread, pyqtSignal
 from PyQt6.QtCore import Qt
 from OpenGL.GL import (
     glClear, glClearColor, glEnable, glPushMatrix, glPopMatrix, glRotatef,
@@ -30,69 +37,8 @@ from OpenGL.GL import (
     GL_QUADS, GL_LINES, glFlush, GL_PROJECTION, GL_MODELVIEW,
     GL_TRIANGLE_FAN, GL_LINE_SMOOTH, GL_LINE_SMOOTH_HINT,
     GL_NICEST, GL_BLEND)
-import random
 import sys
-from types import SimpleNamespace
-
-cfg = SimpleNamespace(
-    stype=1, n=100, color_up=[0, 1, 0], color_down=[1, 0, 0],
-    invert=True, theta1=0, phi1=0, theta2=0, phi2=0,
-    # additional coefficients  to to convert the real-space angles
-    # into the corresponding angles in the Hilbert space (Bloch sphere)
-    bloch_t=1.0, bloch_p=1.0,
-    appthetaL=240, appthetaC=0, appthetaR=120, experiment=-1,
-    verbose=False)
-
-description = (
-    'This script simulates two entangled spin following '
-    'quantum mechanics principles.\n\n'
-    'It can be used to simulate the violation of Bell\'s theorem'
-    'and therefore the impossibility of the presence of hidden variables.\n\n'
-    'Simulation types available (-t SIMUL_TYPE, --simul_type SIMUL_TYPE):\n'
-    '1 - Singlet state\n'
-    '    | Psi > = 1 / sqrt(2) * (| ud > - | du >) [DEFAULT]\n'
-    '2 - Triplet state I\n'
-    '    | Psi > = 1 / sqrt(2) * (| ud > + | du >)\n'
-    '3 - Triplet state II\n'
-    '    | Psi > = 1 / sqrt(2) * (| uu > + | dd >)\n'
-    '4 - Triplet state III\n'
-    '    | Psi > = 1 / sqrt(2) * (| uu > - | dd >)\n'
-    'Both apparatus measure at the same time.\n'
-    'There is a button which allow a random selection of the direction, so '
-    'that statistically they will measure the same direction ⅓ of the times.\n'
-    ' There is a button to perform \'n\' measurements, with the number that '
-    'can be set with the command line option '
-    '"-m, --measurement_number" (default = 100).\n\n'
-    'It is possible to set the color for the spin up (| +1 >) result '
-    'with the command line option "-u, --color_up" (default = green) '
-    'and for the spin down (| -1 >) with '
-    '"-d, --color_down (default = red).\n\n'
-    'By default the results are inverted, so, in the case of singlet, if '
-    'the apparatus 1 measure | +1 >, the apparatus 2 will also agree 100% '
-    'of the time if oriented in the same direction, otherwise will be a '
-    '0% agreement. It is set in this way for onvenience of analyizing '
-    'the results and can be overwritten with the command line option '
-    '-n --no-invert.\n\n'
-    'The orientation of the apparatus can be set with theta1, theta2, '
-    'phi1 and phi2 in degrees (default set to 0).\n\n'
-    'The equivalent result (100% agreement if in the same direction '
-    'and 25% otherwise with the following configurations:\n'
-    '1 - invert = True - theta2 = 0° (both apparatus same direction).\n'
-    '2 - invert = False - theta2 = 180° (second apparatus upside down).\n\n'
-    'For convenience, two set of experiments can be selected with the '
-    'command line option "-e, --experiment", and the variables will be set '
-    'automatically:\n'
-    '1 - The detectors are three Stern-Gerlach magnets one oriented along '
-    'the z axis and the other two in the zx plane with ±120° rotation.\n'
-    '    The particles are two entangled electrons in the singlet state.\n'
-    '2 - The apparatus is composed by two polarizers which send two photons '
-    'to three photodectors, one oriented along the z axis and the other two '
-    'in the zx plane with 22.5° and 45° rotation.\n'
-    '    The particles are two entangled photons in the second triplet '
-    ' state | Psi > = 1 / sqrt(2) ( | uu > + | dd > ).'
-    'Selecting either of these experiments will ignore any physical variable '
-    'set from the command line (e.g. theta1, theta2, ..).\n'
-)
+import time
 
 
 class OpenGLWidget(QOpenGLWidget):
@@ -106,108 +52,31 @@ class OpenGLWidget(QOpenGLWidget):
         self.isFixed = None
         self.measurement1 = None
         self.measurement2 = None
-        self.measurements1 = np.array([], dtype=int)
-        self.measurements2 = np.array([], dtype=int)
-        self.switches1 = np.array([], dtype=int)
-        self.switches2 = np.array([], dtype=int)
-
-        # Set the Spin Type
-        spin = TwoSpin()
-        match cfg.stype:
-            case 1:
-                spin.Singlet()
-            case 2:
-                spin.Triplet(1)
-            case 3:
-                spin.Triplet(2)
-            case 4:
-                spin.Triplet(3)
-            case _:
-                raise ValueError(
-                    f"Incorrect simulation type {self.simul_type}")
-        self.spin = spin
-        # Initialize the directions which have a defined rotation between
-        # each other
-        # First apparatus
-        theta_i = (cfg.theta1 + cfg.appthetaL) * cfg.bloch_t * np.pi / 180
-        theta_j = (cfg.theta1 + cfg.appthetaC) * cfg.bloch_t * np.pi / 180
-        theta_k = (cfg.theta1 + cfg.appthetaR) * cfg.bloch_t * np.pi / 180
-        phi_i = cfg.phi1 * cfg.bloch_p * np.pi / 180
-        self.direction1p = np.array([
-            [
-                np.cos(theta_i / 2),
-                np.exp(1j * phi_i) * np.sin(theta_i / 2)
-            ],
-            [
-                np.cos(theta_j / 2),
-                np.exp(1j * phi_i) * np.sin(theta_j / 2)
-            ],
-            [
-                np.cos(theta_k / 2),
-                np.exp(1j * phi_i) * np.sin(theta_k / 2)
-            ]
-        ])
-        theta_i = (
-            cfg.theta1 + cfg.appthetaL) * cfg.bloch_t * np.pi / 180 + np.pi
-        theta_j = (
-            cfg.theta1 + cfg.appthetaC) * cfg.bloch_t * np.pi / 180 + np.pi
-        theta_k = (
-            cfg.theta1 + cfg.appthetaR) * cfg.bloch_t * np.pi / 180 + np.pi
-        phi_i = cfg.phi1 * cfg.bloch_p * np.pi / 180
-        self.direction1m = np.array([
-            [
-                np.cos(theta_i / 2),
-                np.exp(1j * phi_i) * np.sin(theta_i / 2)
-            ],
-            [
-                np.cos(theta_j / 2),
-                np.exp(1j * phi_i) * np.sin(theta_j / 2)
-            ],
-            [
-                np.cos(theta_k / 2),
-                np.exp(1j * phi_i) * np.sin(theta_k / 2)
-            ]
-        ])
-        # Second apparatus
-        theta_i = (cfg.theta2 + cfg.appthetaL) * cfg.bloch_t * np.pi / 180
-        theta_j = (cfg.theta2 + cfg.appthetaC) * cfg.bloch_t * np.pi / 180
-        theta_k = (cfg.theta2 + cfg.appthetaR) * cfg.bloch_t * np.pi / 180
-        phi_i = cfg.phi2 * cfg.bloch_p * np.pi / 180
-        self.direction2p = np.array([
-            [
-                np.cos(theta_i / 2),
-                np.exp(1j * phi_i) * np.sin(theta_i / 2)
-            ],
-            [
-                np.cos(theta_j / 2),
-                np.exp(1j * phi_i) * np.sin(theta_j / 2)
-            ],
-            [
-                np.cos(theta_k / 2),
-                np.exp(1j * phi_i) * np.sin(theta_k / 2)
-            ]
-        ])
-        theta_i = (
-            cfg.theta2 + cfg.appthetaL) * cfg.bloch_t * np.pi / 180 + np.pi
-        theta_j = (
-            cfg.theta2 + cfg.appthetaC) * cfg.bloch_t * np.pi / 180 + np.pi
-        theta_k = (
-            cfg.theta2 + cfg.appthetaR) * cfg.bloch_t * np.pi / 180 + np.pi
-        phi_i = cfg.phi2 * cfg.bloch_p * np.pi / 180
-        self.direction2m = np.array([
-            [
-                np.cos(theta_i / 2),
-                np.exp(1j * phi_i) * np.sin(theta_i / 2)
-            ],
-            [
-                np.cos(theta_j / 2),
-                np.exp(1j * phi_i) * np.sin(theta_j / 2)
-            ],
-            [
-                np.cos(theta_k / 2),
-                np.exp(1j * phi_i) * np.sin(theta_k / 2)
-            ]
-        ])
+        # history of switches and measurements
+        self.shots = PackedShotBuffer() if cfg.packed else ShotBuffer()
+        # raw shots kept on disk for audit
+        self.log = ShotLog.create(cfg.log, cfg, streams.root) \
+            if cfg.log else None
+        # stored run shown instead of the measurements
+        self.replay = None
+        # running counts from which all the statistics are derived
+        self.counts = EPRCounts()
+        self.last_update = 0.0
+        # confidence intervals of the counts, computed outside of the GUI
+        # thread when the counts change and only drawn by paintGL
+        self.intervals = None
+        self.interval_thread = None
+        self.intervals_stale = False
+        self.interval_executor = ProcessPoolExecutor(cfg.jobs) \
+            if cfg.interval == 'bootstrap' and cfg.jobs > 1 else None
+        # generator of the single measurements, spawned from the seeded
+        # streams so that the fixed seed in main still applies
+        self.rng = generator()
+
+        # Apparatus with the joint outcome distributions of every
+        # combination of switches computed once, quantum or local hidden
+        # variable one
+        self.apparatus = make_apparatus(cfg)
 
     def initializeGL(self):
         glClearColor(0.0, 0.0, 0.0, 1.0)
@@ -458,27 +327,37 @@ class OpenGLWidget(QOpenGLWidget):
                 rect,
                 Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft,
                 f"θ (R)ight: {cfg.appthetaR:.1f}°")
+        # exact values shown next to the measured ones
+        exact = None
+        if cfg.exact:
+            exact = self.apparatus.expected(self.switch_probabilities())
+        # confidence intervals of the measured values, see
+        # update_intervals
+        ci = self.intervals
         if self.measurement1:
+            stats = self.counts.statistics()
             painter.setPen(QColor(255, 255, 255))
             half_width = int(self.width() / 2)
             tq_width = int(self.width() * 3 / 2)
-            measurements_nb = len(self.measurements1)
+            measurements_nb = stats.total
             y = int(0.25 * self.height() + base1 + 1 * step)
             rect = QRect(0, y, half_width, self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
                              f"Measurement: {self.measurement1}")
             y = int(0.25 * self.height() + base1 + 2 * step)
             rect = QRect(0, y, half_width, self.height() - y)
-            prob_p1 = np.count_nonzero(
-                self.measurements1 == 1) / measurements_nb
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             f"< color 1 > = {prob_p1 * 100:.1f}%")
+                             "< color 1 > = " + percent(
+                                 stats.prob_p1,
+                                 getattr(exact, 'prob_p1', None),
+                                 getattr(ci, 'prob_p1', None)))
             y = int(0.25 * self.height() + base1 + 3 * step)
             rect = QRect(0, y, half_width, self.height() - y)
-            prob_m1 = np.count_nonzero(
-                self.measurements1 == -1) / measurements_nb
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             f"< color 2 > = {prob_m1 * 100:.1f}%")
+                             "< color 2 > = " + percent(
+                                 stats.prob_m1,
+                                 getattr(exact, 'prob_m1', None),
+                                 getattr(ci, 'prob_m1', None)))
             # Invert back the results for apparatus 2 if in the config,
             # for correctly displaying the measurement as it would be
             # if the apparatus measure it (so if apparatus 1 shows +1
@@ -494,35 +373,20 @@ class OpenGLWidget(QOpenGLWidget):
                              f"Measurement: {measurement2_disp}")
             y = int(0.25 * self.height() + base1 + 2 * step)
             rect = QRect(0, y, tq_width, self.height() - y)
-            prob_p2 = np.count_nonzero(
-                self.measurements2 == 1) / measurements_nb
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             f"< color 1 > = {prob_p2 * 100:.1f}%")
+                             "< color 1 > = " + percent(
+                                 stats.prob_p2,
+                                 getattr(exact, 'prob_p2', None),
+                                 getattr(ci, 'prob_p2', None)))
             y = int(0.25 * self.height() + base1 + 3 * step)
             rect = QRect(0, y, tq_width, self.height() - y)
-            prob_m2 = np.count_nonzero(
-                self.measurements2 == -1) / measurements_nb
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             f"< color 2 > = {prob_m2 * 100:.1f}%")
-            same_mask = self.switches1 == self.switches2
-            diff_mask = self.switches1 != self.switches2
-            num_same = np.sum(same_mask)
-            num_diff = np.sum(diff_mask)
-            # Count occurrences where measurements have
-            # the same value
-            equal = np.sum(self.measurements1 == self.measurements2)
-            # Count occurrences where measurements have
-            # the same value for same_mask
-            if num_same > 0:
-                equal_same_mask = np.sum(
-                    self.measurements1[same_mask] == self.measurements2[
-                        same_mask])
-            # Count occurrences where measurements have
-            # the same value for diff_mask
-            if num_diff > 0:
-                equal_diff_mask = np.sum(
-                    self.measurements1[diff_mask] == self.measurements2[
-                        diff_mask])
+                             "< color 2 > = " + percent(
+                                 stats.prob_m2,
+                                 getattr(exact, 'prob_m2', None),
+                                 getattr(ci, 'prob_m2', None)))
+            num_same = stats.num_same
+            num_diff = stats.num_diff
             y = int(0.25 * self.height() + base1 + 5 * step)
             rect = QRect(0, 0, self.width(), self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
@@ -530,14 +394,19 @@ class OpenGLWidget(QOpenGLWidget):
             y = int(0.25 * self.height() + base1 + 4 * step)
             rect = QRect(0, 0, self.width(), self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             "Percentage = "
-                             f"{num_same / measurements_nb * 100:.1f}%")
+                             "Percentage = " + percent(
+                                 num_same / measurements_nb,
+                                 getattr(exact, 'same', None),
+                                 getattr(ci, 'same', None)))
             if num_same > 0:
+                equal_same_mask = stats.equal_same_mask
                 y = int(0.25 * self.height() + base1 + 3 * step)
                 rect = QRect(0, 0, self.width(), self.height() - y)
                 painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                                 "% same results = "
-                                 f"{equal_same_mask / num_same * 100:.1f}%")
+                                 "% same results = " + percent(
+                                     equal_same_mask / num_same,
+                                     getattr(exact, 'equal_same', None),
+                                     getattr(ci, 'equal_same', None)))
             y = int(0.25 * self.height() + base2 + 2 * step)
             rect = QRect(0, 0, self.width(), self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
@@ -545,14 +414,19 @@ class OpenGLWidget(QOpenGLWidget):
             y = int(0.25 * self.height() + base2 + 1 * step)
             rect = QRect(0, 0, self.width(), self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             "Percentage = "
-                             f"{num_diff / measurements_nb * 100:.1f}%")
+                             "Percentage = " + percent(
+                                 num_diff / measurements_nb,
+                                 getattr(exact, 'diff', None),
+                                 getattr(ci, 'diff', None)))
             if num_diff > 0:
+                equal_diff_mask = stats.equal_diff_mask
                 y = int(0.25 * self.height() + base2 + 0 * step)
                 rect = QRect(0, 0, self.width(), self.height() - y)
                 painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                                 "% same results = "
-                                 f"{equal_diff_mask / num_diff * 100:.1f}%")
+                                 "% same results = " + percent(
+                                     equal_diff_mask / num_diff,
+                                     getattr(exact, 'equal_diff', None),
+                                     getattr(ci, 'equal_diff', None)))
             y = int(0.25 * self.height() + base1 + 1 * step)
             rect = QRect(0, y, self.width(), self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
@@ -560,30 +434,33 @@ class OpenGLWidget(QOpenGLWidget):
             y = int(0.25 * self.height() + base1 + 2 * step)
             rect = QRect(0, y, self.width(), self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             "% same results = "
-                             f"{equal / measurements_nb * 100:.1f}%")
+                             "% same results = " + percent(
+                                 stats.equal / measurements_nb,
+                                 getattr(exact, 'equal', None),
+                                 getattr(ci, 'equal', None)))
         if cfg.experiment == 2:
             # Compute the probability for Bell's inequality
-            c01, p01 = self.calculate_probabilities_exp2(0, 1, 1, -1)
-            c12, p12 = self.calculate_probabilities_exp2(1, 2, 1, -1)
-            c02, p02 = self.calculate_probabilities_exp2(0, 2, 1, -1)
+            c01, p01, c12, p12, c02, p02 = self.counts.bell_exp2()
+            text1, text2 = bell_text_exp2()
             if c01 and c12 and c02:
                 p1 = (p01 + p12) * 100
                 p2 = p02 * 100
                 painter.setPen(QColor(255, 153, 51))
-                text1 = f"N({cfg.appthetaL}°+,{cfg.appthetaC}°-) + "\
-                    f"N({cfg.appthetaC}°+,{cfg.appthetaR}°-) ≥ "\
-                    f"N({cfg.appthetaL}°+,{cfg.appthetaR}°-)"
                 y = int(0.25 * self.height() + base3 - 4 * step)
                 rect = QRect(0, y, self.width(), self.height() - y)
                 painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, text1)
-                text2 = f"1/2*sin^2({cfg.appthetaC - cfg.appthetaL}°) + " \
-                    f"1/2*sin^2({cfg.appthetaR - cfg.appthetaC}°)  ≥ " \
-                    f"1/2*sin^2({cfg.appthetaR - cfg.appthetaL}°)"
                 y = int(0.25 * self.height() + base3 - 3 * step)
                 rect = QRect(0, y, self.width(), self.height() - y)
                 painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, text2)
                 text3 = f"{p1:.2f}% ≥ {p2:.2f}%"
+                if ci is not None and ci.bell is not None:
+                    low, high = ci.bell
+                    text3 += f" (difference [{low * 100:.2f}%, " \
+                        f"{high * 100:.2f}%])"
+                if cfg.exact:
+                    e01, e12, e02 = self.apparatus.expected_bell_exp2()
+                    text3 += f" (exact {(e01 + e12) * 100:.2f}% ≥ " \
+                        f"{e02 * 100:.2f}%)"
                 y = int(0.25 * self.height() + base3 - 2 * step)
                 rect = QRect(0, y, self.width(), self.height() - y)
                 painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, text3)
@@ -610,24 +487,6 @@ class OpenGLWidget(QOpenGLWidget):
         painter.end()
         glEnable(GL_DEPTH_TEST)
 
-    def calculate_probabilities_exp2(self, sw_A, sw_B, r_1, r_2):
-        cond1 = (self.switches1 == sw_A) & (self.switches2 == sw_B)
-        count1 = np.sum(cond1)
-        cond2 = (self.switches1 == sw_B) & (self.switches2 == sw_A)
-        count2 = np.sum(cond2)
-        countnb = count1 + count2
-        prob = 0.0
-        if count1 > 0:
-            prob = np.mean((self.measurements1[cond1] == r_1) & (
-                self.measurements2[cond1] == r_2))
-        else:
-            prob = 0
-        if count2 > 0:
-            prob2 = np.mean((self.measurements1[cond2] == r_2) & (
-                self.measurements2[cond2] == r_1))
-            prob = (prob * count1 + prob2 * count2) / countnb
-        return countnb, prob
-
     def resizeGL(self, w: int, h: int):
         glViewport(0, 0, w, h)
         glMatrixMode(GL_PROJECTION)
@@ -635,46 +494,95 @@ class OpenGLWidget(QOpenGLWidget):
         gluPerspective(60.0, w / h, 0.1, 100.0)
         glMatrixMode(GL_MODELVIEW)
 
+    def switch_settings(self):
+        # Randomize the button is selected
+        if not self.isFixed:
+            return None, None
+        return self.button1, self.button2
+
     def measure(self, n):
-        for i in range(n):
-            # Randomize the button is selected
-            if not self.isFixed:
-                self.button1 = random.randint(0, 2)
-                self.button2 = random.randint(0, 2)
-            self.switches1 = np.append(self.switches1, self.button1)
-            self.switches2 = np.append(self.switches2, self.button2)
-            # it is possible to measure always the first apparatus first
-            # but to give more variability, which one to measure is
-            # randomly chosen
-            random_number = random.uniform(0, 1)
-            if random_number < 0.5:
-
-                # Simulate measuring the first apparatus
-                self.measurement1, self.measurement2 = self.spin.Measure(
-                    np.array([self.direction1p[self.button1],
-                              self.direction1m[self.button1]]),
-                    np.array([self.direction2p[self.button2],
-                              self.direction2m[self.button2]]),
-                    True)
-            else:
-                # Simulate measuring the second apparatus
-                self.measurement2, self.measurement1 = self.spin.Measure(
-                    np.array([self.direction1p[self.button1],
-                              self.direction1m[self.button1]]),
-                    np.array([self.direction2p[self.button2],
-                              self.direction2m[self.button2]]),
-                    False)
-            # Invert the results for apparatus 2 if in the config,
-            # so, in the case of singlet, if the apparatus 1 measure +1,
-            #  apparatus 2 will agree 100% of the time it is oriented
-            # in the same direction.
-            if cfg.invert:
-                self.measurement2 *= -1
-            self.measurements1 = np.append(
-                self.measurements1, self.measurement1)
-            self.measurements2 = np.append(
-                self.measurements2, self.measurement2)
+        # settings and outcomes are drawn from the precomputed joint
+        # distributions
+        self.add_shots(self.apparatus.sample(
+            n, self.rng, *self.switch_settings()))
         # redraw
+        self.update_intervals()
+        self.update()
+
+    def add_shots(self, shots: tuple):
+        switches1, switches2, measurements1, measurements2 = shots
+        start = len(self.shots)
+        self.shots.append(switches1, switches2, measurements1, measurements2)
+        if cfg.packed:
+            # counted with AND and popcount on the packed words of the
+            # new shots
+            self.counts.merge(self.shots.counts(start))
+        else:
+            self.counts.update(
+                switches1, switches2, measurements1, measurements2)
+        if self.log is not None:
+            self.log.append(
+                switches1, switches2, measurements1, measurements2)
+        self.button1 = int(switches1[-1])
+        self.button2 = int(switches2[-1])
+        self.measurement1 = int(measurements1[-1])
+        self.measurement2 = int(measurements2[-1])
+        # redraw at most 10 times per second while the shots are streamed
+        now = time.monotonic()
+        if now - self.last_update >= 0.1:
+            self.last_update = now
+            self.update_intervals()
+            self.update()
+
+    def update_intervals(self):
+        # compute the confidence intervals of the current counts in a
+        # thread, at most one at a time: counts changed meanwhile are
+        # taken when it finishes
+        if not cfg.interval:
+            return
+        if self.interval_thread is not None:
+            self.intervals_stale = True
+            return
+        self.intervals_stale = False
+        self.interval_thread = IntervalThread(
+            EPRCounts(self.counts.counts.copy()), self.interval_executor)
+        self.interval_thread.result.connect(self.set_intervals)
+        self.interval_thread.finished.connect(self.on_intervals_finished)
+        self.interval_thread.start()
+
+    def set_intervals(self, intervals):
+        self.intervals = intervals
+        self.update()
+
+    def on_intervals_finished(self):
+        self.interval_thread = None
+        if self.intervals_stale:
+            self.update_intervals()
+
+    def switch_probabilities(self):
+        # switches of the stored run, or of the current settings
+        if self.replay is not None:
+            p_switches = self.counts.counts.sum(axis=(2, 3))
+            return p_switches / max(p_switches.sum(), 1)
+        return self.apparatus.switch_probabilities(*self.switch_settings())
+
+    def save(self, path: str):
+        # store the shots measured so far in a shot log
+        with ShotLog.create(path, cfg, streams.root) as log:
+            log.append(self.shots.switches1, self.shots.switches2,
+                       self.shots.measurements1, self.shots.measurements2)
+
+    def replay_to(self, index: int):
+        # show the stored run up to the shot index, the counts come from
+        # the prefix tables of the replay
+        self.counts = self.replay.counts(index)
+        if index > 0:
+            self.button1, self.button2, self.measurement1, \
+                self.measurement2 = self.replay.shot(index - 1)
+        else:
+            self.measurement1 = None
+            self.measurement2 = None
+        self.update_intervals()
         self.update()
 
     def update_button1(self, value: int):
@@ -697,10 +605,62 @@ class OpenGLWidget(QOpenGLWidget):
         self.update()
 
 
+class IntervalThread(QThread):
+    # Compute the confidence intervals of a copy of the counts outside of
+    # the GUI thread, the bootstrap resamples on executor if given
+    result = pyqtSignal(object)
+
+    def __init__(self, counts: EPRCounts, executor=None):
+        super().__init__()
+        self.counts = counts
+        self.executor = executor
+
+    def run(self):
+        # resampled from a fixed stream so that they do not flicker
+        self.result.emit(self.counts.confidence(
+            method=cfg.interval,
+            seed_seq=np.random.SeedSequence(streams.entropy),
+            executor=self.executor))
+
+
+class MeasurementThread(QThread):
+    # Perform the measurements in chunks outside of the GUI thread,
+    # streaming the partial results back
+    result = pyqtSignal(object)
+    progress = pyqtSignal(int)
+
+    def __init__(self, engine: EPRApparatus | EPRPool | EPRSequential,
+                 seed_seq: np.random.SeedSequence, n: int,
+                 switch1: int = None, switch2: int = None):
+        super().__init__()
+        # either the apparatus, the pool of processes or a run stopped
+        # by a rule on one of them
+        self.engine = engine
+        self.seed_seq = seed_seq
+        self.n = n
+        self.switch1 = switch1
+        self.switch2 = switch2
+
+    def run(self):
+        done = 0
+        for shots in self.engine.sample_chunks(
+                self.n, self.seed_seq, self.switch1, self.switch2):
+            if self.isInterruptionRequested():
+                break
+            self.result.emit(shots)
+            done += len(shots[0])
+            self.progress.emit(int(done * 100 / self.n))
+
+
 class MainWindow(QWidget):
 
-    def __init__(self):
+    def __init__(self, replay: EPRReplay = None):
         super(MainWindow, self).__init__()
+        self.measurement_thread = None
+        self.replay = replay
+        # processes performing the multiple measurements
+        self.pool = EPRPool(cfg, cfg.jobs, make_apparatus) \
+            if cfg.jobs > 1 and replay is None else None
         self.initUI()
 
     def initUI(self):
@@ -790,6 +750,13 @@ class MainWindow(QWidget):
         self.button2 = QPushButton(
             f'Measure ({cfg.n} times)', self)
         self.button2.clicked.connect(self.on_button2_clicked)
+        self.progressBar = QProgressBar(self)
+        self.progressBar.setRange(0, 100)
+        self.buttonCancel = QPushButton('Cancel', self)
+        self.buttonCancel.clicked.connect(self.on_buttonCancel_clicked)
+        self.buttonCancel.setEnabled(False)
+        self.buttonSave = QPushButton('Save', self)
+        self.buttonSave.clicked.connect(self.on_buttonSave_clicked)
 
         self.containerLCR1.setSizePolicy(
             QSizePolicy.Policy.MinimumExpanding, QSizePolicy.Policy.Fixed)
@@ -810,6 +777,9 @@ class MainWindow(QWidget):
         self.gridlayout.addWidget(self.button2, 1, 3)
         self.gridlayout.setColumnStretch(1, 0)
         self.gridlayout.setRowStretch(1, 0)
+        self.gridlayout.addWidget(self.progressBar, 2, 0, 1, 2)
+        self.gridlayout.addWidget(self.buttonCancel, 2, 2)
+        self.gridlayout.addWidget(self.buttonSave, 2, 3)
 
         # Set Default
         self.radioButtonC1.setChecked(True)
@@ -820,6 +790,32 @@ class MainWindow(QWidget):
             self.radioButtonRandom.setChecked(True)
 
         self.layout.addLayout(self.gridlayout)
+        if self.replay is not None:
+            self.initReplayUI()
+
+    def initReplayUI(self):
+        # the measurement controls are replaced by a slider scrubbing
+        # the stored shots
+        for widget in [self.containerLCR1, self.labelLeftApparatusSwitch1,
+                       self.containerLCR2, self.labelLeftApparatusSwitch2,
+                       self.containerFixRandom, self.labelSwitchSetting,
+                       self.button1, self.button2, self.progressBar,
+                       self.buttonCancel, self.buttonSave]:
+            widget.setVisible(False)
+        self.setWindowTitle(f"{self.windowTitle()} - "
+                            f"Replay of {self.replay.log.path}")
+        n = len(self.replay)
+        # a slider is limited to 32 bits integers
+        self.replay_step = max(1, -(-n // (2 ** 31 - 1)))
+        self.sliderReplay = QSlider(Qt.Orientation.Horizontal, self)
+        self.sliderReplay.setRange(0, -(-n // self.replay_step))
+        self.sliderReplay.setValue(self.sliderReplay.maximum())
+        self.sliderReplay.valueChanged.connect(self.on_sliderReplay_changed)
+        self.labelReplay = QLabel(self)
+        self.gridlayout.addWidget(self.sliderReplay, 3, 0, 1, 3)
+        self.gridlayout.addWidget(self.labelReplay, 3, 3)
+        self.opengl_widget.replay = self.replay
+        self.on_sliderReplay_changed(self.sliderReplay.value())
 
     def radio_button1_toggled(self, id, checked):
         if checked:
@@ -837,141 +833,90 @@ class MainWindow(QWidget):
         self.opengl_widget.measure(1)
 
     def on_button2_clicked(self):
-        self.opengl_widget.measure(cfg.n)
-
-
-class CustomHelpFormatter(argparse.HelpFormatter):
-    def _fill_text(self, text, width, indent):
-        # Preserve line breaks by not wrapping text
-        return "\n".join([indent + line for line in text.splitlines()])
-
-
-def parse_color(color_string):
-    """Parse a comma-separated RGB string and normalize it
-    to a tuple of floats."""
-    rgb = tuple(int(x) for x in color_string.split(','))
-    return tuple(c / 255.0 for c in rgb)
+        if self.measurement_thread is not None:
+            return
+        engine = self.pool or self.opengl_widget.apparatus
+        # with a stopping rule cfg.n is the maximum of measurements
+        try:
+            rule = sequential_rule(cfg, not self.opengl_widget.isFixed)
+        except ValueError as e:
+            QMessageBox.warning(self, 'Stopping rule', str(e))
+            return
+        if rule is not None:
+            engine = EPRSequential(engine, *rule)
+        self.measurement_thread = MeasurementThread(
+            engine, spawn(), cfg.n, *self.opengl_widget.switch_settings())
+        self.measurement_thread.result.connect(self.opengl_widget.add_shots)
+        self.measurement_thread.progress.connect(self.progressBar.setValue)
+        self.measurement_thread.finished.connect(
+            self.on_measurement_finished)
+        self.set_measuring(True)
+        self.progressBar.setValue(0)
+        self.measurement_thread.start()
+
+    def on_buttonSave_clicked(self):
+        path, _ = QFileDialog.getSaveFileName(self, 'Save shots')
+        if path:
+            self.opengl_widget.save(path)
+
+    def on_sliderReplay_changed(self, value: int):
+        index = min(value * self.replay_step, len(self.replay))
+        self.labelReplay.setText(f"Shot: {index} / {len(self.replay)}")
+        self.opengl_widget.replay_to(index)
+
+    def on_buttonCancel_clicked(self):
+        if self.measurement_thread is not None:
+            self.measurement_thread.requestInterruption()
+
+    def on_measurement_finished(self):
+        engine = self.measurement_thread.engine
+        if isinstance(engine, EPRSequential) and engine.stopped:
+            self.progressBar.setValue(100)
+        self.measurement_thread = None
+        self.set_measuring(False)
+        self.opengl_widget.update_intervals()
+        self.opengl_widget.update()
+
+    def closeEvent(self, event):
+        if self.measurement_thread is not None:
+            self.measurement_thread.requestInterruption()
+            self.measurement_thread.wait()
+        if self.pool is not None:
+            self.pool.shutdown()
+        if self.opengl_widget.interval_thread is not None:
+            self.opengl_widget.interval_thread.wait()
+        if self.opengl_widget.interval_executor is not None:
+            self.opengl_widget.interval_executor.shutdown()
+        if self.opengl_widget.log is not None:
+            self.opengl_widget.log.close()
+        super().closeEvent(event)
+
+    def set_measuring(self, measuring: bool):
+        # the settings cannot be changed while measuring
+        for widget in [self.button1, self.button2, self.containerLCR1,
+                       self.containerLCR2, self.containerFixRandom]:
+            widget.setEnabled(not measuring)
+        self.buttonSave.setEnabled(not measuring)
+        self.buttonCancel.setEnabled(measuring)
 
 
 def main():
     # Set a fixed seed value
     seed_value = 9285
-    random.seed(seed_value)
-    parser = argparse.ArgumentParser(description=description,
-                                     formatter_class=CustomHelpFormatter)
-    parser.add_argument('-t', '--simul_type', help='simulation type',
-                        required=False)
-    parser.add_argument('-m', '--measurement_number', type=int, default=100,
-                        help='Number of simultaneous measurements - '
-                        'Default: 100')
-    parser.add_argument('-n', '--no-invert', action='store_true',
-                        help='Do not invert the results for apparatus 2',
-                        required=False)
-    parser.add_argument('-u', '--color_up', type=parse_color,
-                        help='Set the spin up (| +1 >) color as '
-                        'comma-separated RGB values (0-255). '
-                        'Example: -c 0,255,0 - Default: green')
-    parser.add_argument('-d', '--color_down', type=parse_color,
-                        help='Set the spin down (| -1 >) color as '
-                        'comma-separated RGB values (0-255). '
-                        'Example: -c 255,0,0 - Default: red')
-    parser.add_argument('-r', '--theta1', type=float,
-                        help='angle theta1 in degrees')
-    parser.add_argument('-s', '--theta2', type=float,
-                        help='angle theta2 in degrees')
-    parser.add_argument('-p', '--phi1', type=float,
-                        help='angle phi1 in degrees')
-    parser.add_argument('-q', '--phi2', type=float,
-                        help='angle phi2 in degrees')
-    parser.add_argument('-e', '--experiment', type=int, choices=[1, 2],
-                        help='predefined experiment')
-    parser.add_argument('-v', '--verbose', action='store_true',
-                        help='verbose output', required=False)
-    parser.add_argument('-b', '--bloch-theta', type=float,
-                        help='coefficient theta between real '
-                        'and Hilbert world')
-    parser.add_argument('-c', '--bloch-phi', type=float,
-                        help='coefficient phi between real '
-                        'and Hilbert world')
+    seed(seed_value)
+    parser = build_parser()
+    parser.add_argument('-R', '--replay', type=str,
+                        help='Replay a run stored in a shot log')
     args = parser.parse_args()
-    if (args.simul_type):
-        cfg.stype = int(args.simul_type)
-    if (args.measurement_number):
-        cfg.n = int(args.measurement_number)
-    if (args.no_invert):
-        cfg.invert = False
-    if (args.verbose):
-        cfg.verbose = True
-    if (args.color_up):
-        cfg.color_up = args.color_up
-    if (args.color_down):
-        cfg.color_down = args.color_down
-    if (args.theta1):
-        cfg.theta1 = args.theta1
-    if (args.theta2):
-        cfg.theta2 = args.theta2
-    if (args.phi1):
-        cfg.phi1 = args.phi1
-    if (args.phi2):
-        cfg.phi2 = args.phi2
-    if (args.bloch_theta):
-        cfg.bloch_t = args.bloch_theta
-    if (args.bloch_phi):
-        cfg.bloch_p = args.bloch_phi
-    # if a specific experiment is selected, set the proper variables
-    if args.experiment is not None:
-        cfg.experiment = args.experiment
-        match cfg.experiment:
-            case 1:
-                # The detectors are three Stern-Gerlach magnets one
-                # oriented along the z axis and the other two in the zx plane
-                # with ±120° rotation and the particles are two entangled
-                # electrons in the singlet state
-                # Particles are in the singlet state
-                cfg.stype = 1
-                # orientation ±120°
-                cfg.appthetaL = 240
-                cfg.appthetaC = 0
-                cfg.appthetaR = 120
-                cfg.theta1 = 0
-                cfg.theta2 = 0
-                # xz plane
-                cfg.phi1 = 0
-                cfg.phi2 = 0
-                cfg.invert = True
-            case 2:
-                # The apparatus is composed by two polarizers which
-                # send the photons to three photodectors, one oriented
-                # along the z axis and the other two in the zx plane
-                # with 22.5° and 67.5° rotation and the particles
-                # are two entangled photons in the second triplet state
-                # Particles are a triplet in the second state
-                cfg.stype = 3
-                # orientation 22.5° and 67.5°
-                cfg.appthetaL = 0
-                cfg.appthetaC = 22.5
-                cfg.appthetaR = 45
-                cfg.theta1 = 0
-                cfg.theta2 = 0
-                # In the real world, light polarization is typically measured
-                # in degrees, and the angle θ can be from 0° to 360°.
-                # In the Hilbert space, the angles are typically represented by
-                # the state vectors on the Bloch sphere,
-                # where θ ranges from 0 to π.
-                #  Since vertical and horizontal polarizations are orthogonal
-                # and correspond to π/2 in real-world measurements and π
-                # on the Bloch sphere, the relationship between the real-world
-                # polarization angle `θ_real` and the Hilbert space angle
-                # `θ_Hilbert` is given by:
-                # θHilbert = 2 * θreal
-                cfg.bloch_t = 2
-                cfg.bloch_p = 1
-                # xz plane
-                cfg.phi1 = 0
-                cfg.phi2 = 0
-                cfg.invert = False
+    apply_args(args)
+    replay = None
+    if args.replay:
+        replay = EPRReplay(args.replay)
+        # the stored configuration replaces the command line one
+        replay.apply_config(cfg)
+        cfg.log = None
     app = QtWidgets.QApplication(sys.argv)
-    window = MainWindow()
+    window = MainWindow(replay)
     window.show()
     sys.exit(app.exec())
 
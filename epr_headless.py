@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+'''
+/************************/
+/*   epr_headless.py    */
+/*    Version 1.0       */
+/*      2026/10/17      */
+/************************/
+'''
+from concurrent.futures import ProcessPoolExecutor
+import json
+from mod_epr import cfg, build_parser, apply_args
+from mod_epr import EPRPool, EPRSequential, sequential_rule
+from mod_epr import EPRCounts, bell_text_exp2, percent
+from mod_lhv import make_apparatus
+from mod_rng import seed, spawn, streams
+from mod_storage import ShotLog
+import numpy as np
+import sys
+
+description = (
+    'This script runs the EPR experiment without any graphical '
+    'interface, so that it can be used on machines without a display '
+    'and in batch pipelines.\n\n'
+    'It accepts the same options of epr_experiment.py, performs '
+    '"-m, --measurement_number" measurements and prints the same '
+    'statistics shown in the window.\n'
+    'As in the window, the switches are fixed on C unless a predefined '
+    'experiment is selected or the option "-x, --random-switches" is '
+    'set.\n'
+    'With the option "-j, --jobs" the measurements are split among '
+    'several processes, with the same results of a single process.\n'
+    'With the option "-z, --model" the outcomes are predetermined by a '
+    'local hidden variable model instead of quantum mechanics.\n'
+    'The shots can be written to a binary shot log with the option '
+    '"-l, --log".\n'
+    'With the options "-w, --width" or "-g, --sigma" the run stops as '
+    'soon as the statistic is measured with the requested precision.\n'
+    'With the option "-i, --interval" the measured values are followed '
+    'by their 95% confidence intervals.\n'
+    'The statistics can also be written in JSON format with the option '
+    '"-o, --output".\n'
+)
+
+
+def main():
+    # Set a fixed seed value
+    seed_value = 9285
+    seed(seed_value)
+    parser = build_parser()
+    parser.description = description
+    parser.add_argument('-x', '--random-switches', action='store_true',
+                        help='Select the switches randomly',
+                        required=False)
+    parser.add_argument('-o', '--output', type=str,
+                        help='Write the statistics to a JSON file')
+    args = parser.parse_args()
+    apply_args(args)
+    switches = (None, None)
+    if cfg.experiment < 0 and not args.random_switches:
+        switches = (1, 1)
+    # run stopped by a rule on the measured statistic
+    try:
+        rule = sequential_rule(cfg, switches == (None, None))
+    except ValueError as e:
+        parser.error(str(e))
+    apparatus = make_apparatus(cfg)
+    engine = EPRPool(cfg, cfg.jobs, make_apparatus) if cfg.jobs > 1 \
+        else apparatus
+    # same streams of the first batch run in the window
+    seed_seq = spawn()
+    log = ShotLog.create(cfg.log, cfg, seed_seq) if cfg.log else None
+    sequential = EPRSequential(engine, *rule) if rule else None
+    if cfg.jobs > 1 and log is None and sequential is None:
+        # only the count tables are moved between the processes
+        counts = engine.count(cfg.n, seed_seq, *switches)
+    else:
+        counts = EPRCounts()
+        for shots in (sequential or engine).sample_chunks(
+                cfg.n, seed_seq, *switches):
+            counts.update(*shots)
+            if log is not None:
+                log.append(*shots)
+    if log is not None:
+        log.close()
+    if cfg.jobs > 1:
+        engine.shutdown()
+    stats = counts.statistics()
+    exact = None
+    if cfg.exact:
+        exact = apparatus.expected(
+            apparatus.switch_probabilities(*switches))
+    # confidence intervals of the measured values
+    ci = None
+    if cfg.interval:
+        executor = ProcessPoolExecutor(cfg.jobs) if cfg.jobs > 1 else None
+        ci = counts.confidence(
+            method=cfg.interval,
+            seed_seq=np.random.SeedSequence(streams.entropy),
+            executor=executor)
+        if executor is not None:
+            executor.shutdown()
+    measurements_nb = stats.total
+    print(f"Total Measurements: {measurements_nb}")
+    if sequential is not None:
+        value, stderr = sequential.estimate
+        reason = "Stopped by the rule" if sequential.stopped \
+            else "Maximum number of measurements reached"
+        print(f"{reason}: {sequential.statistic} = {value:.4f} "
+              f"± {stderr:.4f}")
+    print("% same results = " + percent(
+        stats.equal / measurements_nb, getattr(exact, 'equal', None),
+        getattr(ci, 'equal', None)))
+    print("Apparatus 1: "
+          "< color 1 > = " + percent(
+              stats.prob_p1, getattr(exact, 'prob_p1', None),
+              getattr(ci, 'prob_p1', None)) + " "
+          "< color 2 > = " + percent(
+              stats.prob_m1, getattr(exact, 'prob_m1', None),
+              getattr(ci, 'prob_m1', None)))
+    print("Apparatus 2: "
+          "< color 1 > = " + percent(
+              stats.prob_p2, getattr(exact, 'prob_p2', None),
+              getattr(ci, 'prob_p2', None)) + " "
+          "< color 2 > = " + percent(
+              stats.prob_m2, getattr(exact, 'prob_m2', None),
+              getattr(ci, 'prob_m2', None)))
+    print("Same Switch: Percentage = " + percent(
+        stats.num_same / measurements_nb, getattr(exact, 'same', None),
+        getattr(ci, 'same', None)))
+    if stats.num_same > 0:
+        print("Same Switch: % same results = " + percent(
+            stats.equal_same_mask / stats.num_same,
+            getattr(exact, 'equal_same', None),
+            getattr(ci, 'equal_same', None)))
+    print("Different Switch: Percentage = " + percent(
+        stats.num_diff / measurements_nb, getattr(exact, 'diff', None),
+        getattr(ci, 'diff', None)))
+    if stats.num_diff > 0:
+        print("Different Switch: % same results = " + percent(
+            stats.equal_diff_mask / stats.num_diff,
+            getattr(exact, 'equal_diff', None),
+            getattr(ci, 'equal_diff', None)))
+    results = vars(stats)
+    results['model'] = cfg.model
+    if sequential is not None:
+        results['sequential'] = {
+            'statistic': sequential.statistic,
+            'stopped': sequential.stopped,
+            'estimate': [float(v) for v in sequential.estimate]}
+    if exact is not None:
+        results['exact'] = {
+            name: float(value) for name, value in vars(exact).items()}
+    if ci is not None:
+        results['interval'] = {
+            name: None if value is None else list(value)
+            for name, value in vars(ci).items()}
+    if cfg.experiment == 2:
+        # Compute the probability for Bell's inequality
+        c01, p01, c12, p12, c02, p02 = counts.bell_exp2()
+        text1, text2 = bell_text_exp2()
+        if c01:
+            print(f"pass {cfg.appthetaL} and not pass "
+                  f"{cfg.appthetaC}: {p01 * 100:.2f}%")
+        if c12:
+            print(f"pass {cfg.appthetaC} and not pass "
+                  f"{cfg.appthetaR}: {p12 * 100:.2f}%")
+        if c02:
+            print(f"pass {cfg.appthetaL} and not pass "
+                  f"{cfg.appthetaR}: {p02 * 100:.2f}%")
+        if c01 and c12 and c02:
+            p1 = (p01 + p12) * 100
+            p2 = p02 * 100
+            print(text1)
+            print(text2)
+            print(f"{p1:.2f}% ≥ {p2:.2f}%")
+            if ci is not None and ci.bell is not None:
+                low, high = ci.bell
+                print(f"difference {p1 - p2:.2f}% [{low * 100:.2f}%, "
+                      f"{high * 100:.2f}%]")
+            if p1 < p2:
+                print("Bell's inequality is violated")
+        if exact is not None:
+            e01, e12, e02 = apparatus.expected_bell_exp2()
+            print(f"exact {(e01 + e12) * 100:.2f}% ≥ {e02 * 100:.2f}%")
+            results['exact']['bell'] = [float(e01), float(e12), float(e02)]
+        results['bell'] = {
+            'counts': [int(c01), int(c12), int(c02)],
+            'probabilities': [float(p01), float(p12), float(p02)]}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    if sys.version_info[0] < 3:
+        raise RuntimeError('Must be using Python 3')
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+'''
+/************************/
+/*       mod_bell       */
+/*      Version 1.0     */
+/*      2026/10/17      */
+/************************/
+'''
+from mod_spin_operators import TwoSpin
+from mod_sweep import exact_sweep, sampled_sweep
+import numpy as np
+import sys
+from types import SimpleNamespace
+
+# local (hidden variables) bounds of the inequalities and the quantum
+# maximum of CHSH (Tsirelson bound)
+CHSH_LOCAL_BOUND = 2.0
+CHSH_QUANTUM_BOUND = 2 * np.sqrt(2)
+CH_LOCAL_BOUND = 0.0
+EBERHARD_LOCAL_BOUND = 0.0
+WIGNER_LOCAL_BOUND = 0.0
+
+
+class BellTest:
+    '''
+    Bell tests with K settings per side computed from a table
+    counts[..., x, y, a, b] of the outcomes a, b (index 0 is "+1" and
+    1 is "-1") for the settings x of A and y of B. Leading dimensions
+    are independent candidate setting sets, so every test is evaluated
+    for all of them at once.
+    With exact=True the table contains the probabilities of the
+    outcomes and the standard errors are zero, otherwise they are
+    estimated from the counts of each pair of settings.
+    '''
+
+    def __init__(self, counts: np.ndarray, exact: bool = False):
+        counts = np.asarray(counts)
+        self.counts = counts
+        self.exact = exact
+        # shots per pair of settings and conditional probabilities
+        self.shots = counts.sum(axis=(-2, -1))
+        self.probabilities = np.divide(
+            counts, self.shots[..., None, None],
+            out=np.zeros(counts.shape), where=self.shots[..., None, None] > 0)
+
+    @property
+    def settings(self):
+        return self.counts.shape[-4], self.counts.shape[-3]
+
+    def __stderr(self, p: np.ndarray, shots: np.ndarray):
+        # standard error of the probabilities p estimated from shots
+        if self.exact:
+            return np.zeros_like(p)
+        return np.sqrt(np.divide(
+            p * (1 - p), shots, out=np.full_like(p, np.inf),
+            where=shots > 0))
+
+    def correlators(self):
+        '''
+        Return the correlators E[..., x, y] = < A_x B_y > and their
+        standard errors.
+        '''
+        p = self.probabilities
+        E = p[..., 0, 0] + p[..., 1, 1] - p[..., 0, 1] - p[..., 1, 0]
+        if self.exact:
+            return E, np.zeros_like(E)
+        stderr = np.sqrt(np.divide(
+            np.clip(1 - E ** 2, 0, None), self.shots,
+            out=np.full_like(E, np.inf), where=self.shots > 0))
+        return E, stderr
+
+    def __select(self, x, y):
+        # correlators and their variances of the 2 x 2 settings x, y
+        E, stderr = self.correlators()
+        x, y = np.asarray(x), np.asarray(y)
+        E = E[..., x[:, None], y[None, :]]
+        return E, stderr[..., x[:, None], y[None, :]] ** 2
+
+    def chsh(self, x=(0, 1), y=(0, 1)):
+        '''
+        Return the CHSH value
+        S = E(x0, y0) + E(x0, y1) + E(x1, y0) - E(x1, y1)
+        and its standard error, |S| <= 2 for local hidden variables.
+        '''
+        E, var = self.__select(x, y)
+        signs = np.array([[1, 1], [1, -1]])
+        return (np.sum(signs * E, axis=(-2, -1)),
+                np.sqrt(np.sum(var, axis=(-2, -1))))
+
+    def chsh_max(self, x=(0, 1), y=(0, 1)):
+        '''
+        Return the largest |S| over the four CHSH expressions, placing
+        the minus sign on each pair of settings, and its standard error.
+        '''
+        E, var = self.__select(x, y)
+        total = np.sum(E, axis=(-2, -1))
+        # S with the minus sign on (i, j) is total - 2 E(i, j)
+        S = np.abs(total[..., None, None] - 2 * E)
+        S = S.reshape(S.shape[:-2] + (4,))
+        return (S.max(axis=-1),
+                np.sqrt(np.sum(var, axis=(-2, -1))))
+
+    def ch(self, x=(0, 1), y=(0, 1)):
+        '''
+        Return the Clauser-Horne value
+        CH = P(++|x0 y0) + P(++|x0 y1) + P(++|x1 y0) - P(++|x1 y1)
+             - P_A(+|x0) - P_B(+|y0)
+        and its standard error, CH <= 0 for local hidden variables.
+        The marginals are taken from the shots of (x0, y0), where
+        P(++) - P_A(+) - P_B(+) = P(--) - 1.
+        '''
+        p, n = self.probabilities, self.shots
+        terms = [(p[..., x[0], y[0], 1, 1], n[..., x[0], y[0]], 1),
+                 (p[..., x[0], y[1], 0, 0], n[..., x[0], y[1]], 1),
+                 (p[..., x[1], y[0], 0, 0], n[..., x[1], y[0]], 1),
+                 (p[..., x[1], y[1], 0, 0], n[..., x[1], y[1]], -1)]
+        return self.__combine(terms, -1)
+
+    def eberhard(self, x=(0, 1), y=(0, 1)):
+        '''
+        Return the Eberhard value
+        J = P(++|x0 y0) - P(+-|x0 y1) - P(-+|x1 y0) - P(++|x1 y1)
+        and its standard error, J <= 0 for local hidden variables,
+        where "-" includes the undetected events.
+        '''
+        p, n = self.probabilities, self.shots
+        terms = [(p[..., x[0], y[0], 0, 0], n[..., x[0], y[0]], 1),
+                 (p[..., x[0], y[1], 0, 1], n[..., x[0], y[1]], -1),
+                 (p[..., x[1], y[0], 1, 0], n[..., x[1], y[0]], -1),
+                 (p[..., x[1], y[1], 0, 0], n[..., x[1], y[1]], -1)]
+        return self.__combine(terms)
+
+    def wigner(self, a: int = 0, b: int = 1, c: int = 2):
+        '''
+        Return the Wigner value
+        W = P(a+, b-) + P(b+, c-) - P(a+, c-)
+        and its standard error, W >= 0 for local hidden variables.
+        Both sides use the same set of settings, and each probability
+        is estimated from the shots of the two settings in either order
+        as in the experiment 2 of epr_experiment.
+        '''
+        terms = []
+        for (s, t), sign in [((a, b), 1), ((b, c), 1), ((a, c), -1)]:
+            counts = self.counts[..., s, t, 0, 1] + \
+                self.counts[..., t, s, 1, 0]
+            shots = self.shots[..., s, t] + self.shots[..., t, s]
+            p = np.divide(counts, shots, out=np.zeros(shots.shape),
+                          where=shots > 0)
+            terms.append((p, shots, sign))
+        return self.__combine(terms)
+
+    def __combine(self, terms: list, offset: float = 0):
+        # sum of the signed probabilities estimated from independent
+        # shots, and its standard error
+        value = offset
+        var = 0
+        for p, shots, sign in terms:
+            value = value + sign * p
+            var = var + self.__stderr(p, shots) ** 2
+        return value, np.sqrt(var)
+
+
+def settings_grid(thetaA: np.ndarray, phiA: np.ndarray,
+                  thetaB: np.ndarray, phiB: np.ndarray):
+    '''
+    Return the angles of the K settings of A and B (radians, last
+    dimension K, leading dimensions broadcast together) arranged on the
+    grid [..., x, y] of the settings pairs.
+    '''
+    thetaA, phiA = np.broadcast_arrays(thetaA, phiA)
+    thetaB, phiB = np.broadcast_arrays(thetaB, phiB)
+    return (thetaA[..., :, None], phiA[..., :, None],
+            thetaB[..., None, :], phiB[..., None, :])
+
+
+def exact_test(spin: TwoSpin, thetaA: np.ndarray, phiA: np.ndarray,
+               thetaB: np.ndarray, phiB: np.ndarray,
+               bloch_t: float = 1.0, bloch_p: float = 1.0):
+    '''
+    Return the BellTest of the exact probabilities of the state of spin
+    for the settings angles of A and B, see settings_grid.
+    '''
+    angles = settings_grid(thetaA, phiA, thetaB, phiB)
+    p = exact_sweep(spin, *angles, bloch_t, bloch_p).probabilities
+    return BellTest(p, exact=True)
+
+
+def sampled_test(spin: TwoSpin, thetaA: np.ndarray, phiA: np.ndarray,
+                 thetaB: np.ndarray, phiB: np.ndarray, shots: int,
+                 bloch_t: float = 1.0, bloch_p: float = 1.0,
+                 rng: np.random.Generator = None):
+    '''
+    Return the BellTest of shots measurements of the state of spin for
+    every pair of the settings angles of A and B, see settings_grid.
+    '''
+    angles = settings_grid(thetaA, phiA, thetaB, phiB)
+    counts = sampled_sweep(spin, *angles, shots, bloch_t, bloch_p,
+                           rng).counts
+    return BellTest(counts)
+
+
+def optimal_chsh(T: np.ndarray):
+    '''
+    Return the maximum CHSH value S = 2 sqrt(l1 + l2) of the states with
+    correlation tensors T[..., k, l] (Horodecki criterion, l1 and l2 the
+    two largest eigenvalues of T^t T) and the settings attaining it: the
+    Bloch vectors a, a' of A and b, b' of B, shape (..., 2, 3), and
+    their angles theta, phi on the Bloch sphere, shape (..., 2), ready
+    for exact_test. The value is reached by chsh with x = y = (0, 1).
+    '''
+    T = np.asarray(T, dtype=float)
+    eigenvalues, eigenvectors = np.linalg.eigh(np.swapaxes(T, -1, -2) @ T)
+    eigenvalues = np.clip(eigenvalues, 0, None)
+    l1, l2 = eigenvalues[..., 2], eigenvalues[..., 1]
+    c1, c2 = eigenvectors[..., 2], eigenvectors[..., 1]
+    # b, b' = cos(t) c1 +- sin(t) c2, with tan(t) = sqrt(l2 / l1), so that
+    # b + b' and b - b' lie along c1 and c2
+    t = np.arctan2(np.sqrt(l2), np.sqrt(l1))[..., None]
+    directionsB = np.stack([np.cos(t) * c1 + np.sin(t) * c2,
+                            np.cos(t) * c1 - np.sin(t) * c2], axis=-2)
+    # a, a' along T c1 and T c2, any direction if they vanish
+    Tc = np.einsum('...kl,...lj->...jk', T, np.stack([c1, c2], axis=-1))
+    norm = np.linalg.norm(Tc, axis=-1, keepdims=True)
+    directionsA = np.divide(Tc, norm, out=np.stack([c1, c2], axis=-2),
+                            where=norm > 1e-12)
+    thetaA, phiA = bloch_angles(directionsA)
+    thetaB, phiB = bloch_angles(directionsB)
+    return SimpleNamespace(
+        S=2 * np.sqrt(l1 + l2), directionsA=directionsA,
+        directionsB=directionsB, thetaA=thetaA, phiA=phiA, thetaB=thetaB,
+        phiB=phiB)
+
+
+def bloch_angles(vectors: np.ndarray):
+    '''
+    Return the angles theta, phi on the Bloch sphere of the unit
+    vectors (x, y, z), shape (..., 3).
+    '''
+    theta = np.arccos(np.clip(vectors[..., 2], -1, 1))
+    phi = np.arctan2(vectors[..., 1], vectors[..., 0])
+    return theta, phi
+
+
+if __name__ == '__main__':
+    if sys.version_info[0] < 3:
+        raise RuntimeError('Must be using Python 3')
+    pass
@@ -0,0 +1,933 @@
+#!/usr/bin/env python3
+'''
+/************************/
+/*       mod_epr        */
+/*      Version 1.0     */
+/*      2026/10/17      */
+/************************/
+'''
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from mod_rng import chunk_streams, sequential_streams
+from mod_spin_operators import TwoSpin
+from mod_statistics import bootstrap, normal_interval, proportion_stderr
+from mod_statistics import SequentialRule
+from mod_storage import ShotLog
+import numpy as np
+import os
+import sys
+from types import SimpleNamespace
+
+cfg = SimpleNamespace(
+    stype=1, n=100, color_up=[0, 1, 0], color_down=[1, 0, 0],
+    invert=True, theta1=0, phi1=0, theta2=0, phi2=0,
+    # additional coefficients  to to convert the real-space angles
+    # into the corresponding angles in the Hilbert space (Bloch sphere)
+    bloch_t=1.0, bloch_p=1.0,
+    appthetaL=240, appthetaC=0, appthetaR=120, experiment=-1,
+    jobs=1, packed=False, log=None, exact=False, model='quantum',
+    interval=None, width=None, sigma=None, statistic=None,
+    verbose=False)
+
+description = (
+    'This script simulates two entangled spin following '
+    'quantum mechanics principles.\n\n'
+    'It can be used to simulate the violation of Bell\'s theorem'
+    'and therefore the impossibility of the presence of hidden variables.\n\n'
+    'Simulation types available (-t SIMUL_TYPE, --simul_type SIMUL_TYPE):\n'
+    '1 - Singlet state\n'
+    '    | Psi > = 1 / sqrt(2) * (| ud > - | du >) [DEFAULT]\n'
+    '2 - Triplet state I\n'
+    '    | Psi > = 1 / sqrt(2) * (| ud > + | du >)\n'
+    '3 - Triplet state II\n'
+    '    | Psi > = 1 / sqrt(2) * (| uu > + | dd >)\n'
+    '4 - Triplet state III\n'
+    '    | Psi > = 1 / sqrt(2) * (| uu > - | dd >)\n'
+    'Both apparatus measure at the same time.\n'
+    'There is a button which allow a random selection of the direction, so '
+    'that statistically they will measure the same direction ⅓ of the times.\n'
+    ' There is a button to perform \'n\' measurements, with the number that '
+    'can be set with the command line option '
+    '"-m, --measurement_number" (default = 100), which can be split among '
+    'several processes with the option "-j, --jobs".\n'
+    'For long runs the history of the shots can be stored bit-packed, '
+    '6 bits per shot, with the option "-k, --packed", and written to a '
+    'binary shot log on disk with the option "-l, --log".\n'
+    'The exact (infinite-shot) values predicted by the Born rule are '
+    'shown next to the measured ones with the option "-a, --exact".\n'
+    'The 95% confidence intervals of the measured values are shown with '
+    'the option "-i, --interval", computed from the analytic standard '
+    'errors ("analytic") or by bootstrap resampling ("bootstrap").\n'
+    'Instead of a fixed number of measurements, a run can stop as soon as '
+    'the confidence interval of a statistic ("-y, --statistic", default '
+    'the Bell value in experiment 2 and the same results otherwise) is '
+    'narrower than "-w, --width" or excludes its local hidden variable '
+    'bound by "-g, --sigma" standard errors, with '
+    '"-m, --measurement_number" as maximum.\n'
+    'As a classical baseline the outcomes can be predetermined by a local '
+    'hidden variable with the option "-z, --model": "vector" (Bell\'s '
+    'shared random vector) or "instructions" (Mermin\'s instruction sets '
+    'for the L, C, R switches), default "quantum".\n\n'
+    'It is possible to set the color for the spin up (| +1 >) result '
+    'with the command line option "-u, --color_up" (default = green) '
+    'and for the spin down (| -1 >) with '
+    '"-d, --color_down (default = red).\n\n'
+    'By default the results are inverted, so, in the case of singlet, if '
+    'the apparatus 1 measure | +1 >, the apparatus 2 will also agree 100% '
+    'of the time if oriented in the same direction, otherwise will be a '
+    '0% agreement. It is set in this way for onvenience of analyizing '
+    'the results and can be overwritten with the command line option '
+    '-n --no-invert.\n\n'
+    'The orientation of the apparatus can be set with theta1, theta2, '
+    'phi1 and phi2 in degrees (default set to 0).\n\n'
+    'The equivalent result (100% agreement if in the same direction '
+    'and 25% otherwise with the following configurations:\n'
+    '1 - invert = True - theta2 = 0° (both apparatus same direction).\n'
+    '2 - invert = False - theta2 = 180° (second apparatus upside down).\n\n'
+    'For convenience, two set of experiments can be selected with the '
+    'command line option "-e, --experiment", and the variables will be set '
+    'automatically:\n'
+    '1 - The detectors are three Stern-Gerlach magnets one oriented along '
+    'the z axis and the other two in the zx plane with ±120° rotation.\n'
+    '    The particles are two entangled electrons in the singlet state.\n'
+    '2 - The apparatus is composed by two polarizers which send two photons '
+    'to three photodectors, one oriented along the z axis and the other two '
+    'in the zx plane with 22.5° and 45° rotation.\n'
+    '    The particles are two entangled photons in the second triplet '
+    ' state | Psi > = 1 / sqrt(2) ( | uu > + | dd > ).'
+    'Selecting either of these experiments will ignore any physical variable '
+    'set from the command line (e.g. theta1, theta2, ..).\n'
+)
+
+
+class CustomHelpFormatter(argparse.HelpFormatter):
+    def _fill_text(self, text, width, indent):
+        # Preserve line breaks by not wrapping text
+        return "\n".join([indent + line for line in text.splitlines()])
+
+
+def parse_color(color_string):
+    """Parse a comma-separated RGB string and normalize it
+    to a tuple of floats."""
+    rgb = tuple(int(x) for x in color_string.split(','))
+    return tuple(c / 255.0 for c in rgb)
+
+
+def parse_positive(value_string):
+    """Parse a float which must be greater than 0."""
+    value = float(value_string)
+    if not value > 0:
+        raise argparse.ArgumentTypeError(
+            f"Incorrect value {value_string}, it must be positive")
+    return value
+
+
+def build_parser():
+    '''
+    Return the command line parser shared by the EPR experiment scripts.
+    '''
+    parser = argparse.ArgumentParser(description=description,
+                                     formatter_class=CustomHelpFormatter)
+    parser.add_argument('-t', '--simul_type', help='simulation type',
+                        required=False)
+    parser.add_argument('-m', '--measurement_number', type=int, default=100,
+                        help='Number of simultaneous measurements - '
+                        'Default: 100')
+    parser.add_argument('-n', '--no-invert', action='store_true',
+                        help='Do not invert the results for apparatus 2',
+                        required=False)
+    parser.add_argument('-u', '--color_up', type=parse_color,
+                        help='Set the spin up (| +1 >) color as '
+                        'comma-separated RGB values (0-255). '
+                        'Example: -c 0,255,0 - Default: green')
+    parser.add_argument('-d', '--color_down', type=parse_color,
+                        help='Set the spin down (| -1 >) color as '
+                        'comma-separated RGB values (0-255). '
+                        'Example: -c 255,0,0 - Default: red')
+    parser.add_argument('-r', '--theta1', type=float,
+                        help='angle theta1 in degrees')
+    parser.add_argument('-s', '--theta2', type=float,
+                        help='angle theta2 in degrees')
+    parser.add_argument('-p', '--phi1', type=float,
+                        help='angle phi1 in degrees')
+    parser.add_argument('-q', '--phi2', type=float,
+                        help='angle phi2 in degrees')
+    parser.add_argument('-e', '--experiment', type=int, choices=[1, 2],
+                        help='predefined experiment')
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='Number of processes performing the '
+                        'multiple measurements, 0 for all the cores - '
+                        'Default: 1')
+    parser.add_argument('-k', '--packed', action='store_true',
+                        help='Store the shots bit-packed',
+                        required=False)
+    parser.add_argument('-l', '--log', type=str,
+                        help='Append the shots to a binary shot log')
+    parser.add_argument('-a', '--exact', action='store_true',
+                        help='Show the exact values next to the '
+                        'measured ones', required=False)
+    parser.add_argument('-i', '--interval', type=str,
+                        choices=['analytic', 'bootstrap'],
+                        help='Show the confidence intervals of the '
+                        'measured values')
+    parser.add_argument('-w', '--width', type=parse_positive,
+                        help='Stop when the confidence interval of the '
+                        'statistic is narrower than WIDTH')
+    parser.add_argument('-g', '--sigma', type=parse_positive,
+                        help='Stop when the statistic is SIGMA standard '
+                        'errors away from its local bound')
+    parser.add_argument('-y', '--statistic', type=str,
+                        choices=['bell', 'equal', 'equal_diff'],
+                        help='statistic of the stopping rule')
+    parser.add_argument('-z', '--model', type=str,
+                        choices=['quantum', 'vector', 'instructions'],
+                        help='model of the outcomes - Default: quantum')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='verbose output', required=False)
+    parser.add_argument('-b', '--bloch-theta', type=float,
+                        help='coefficient theta between real '
+                        'and Hilbert world')
+    parser.add_argument('-c', '--bloch-phi', type=float,
+                        help='coefficient phi between real '
+                        'and Hilbert world')
+    return parser
+
+
+def apply_args(args):
+    '''
+    Set cfg from the parsed command line, including the predefined
+    experiments.
+    '''
+    if (args.simul_type):
+        cfg.stype = int(args.simul_type)
+    if (args.measurement_number):
+        cfg.n = int(args.measurement_number)
+    if (args.no_invert):
+        cfg.invert = False
+    if (args.jobs is not None):
+        cfg.jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    if (args.packed):
+        cfg.packed = True
+    if (args.log):
+        cfg.log = args.log
+    if (args.exact):
+        cfg.exact = True
+    if (args.interval):
+        cfg.interval = args.interval
+    if (args.width is not None):
+        cfg.width = args.width
+    if (args.sigma is not None):
+        cfg.sigma = args.sigma
+    if (args.statistic):
+        cfg.statistic = args.statistic
+    if (args.model):
+        cfg.model = args.model
+    if (args.verbose):
+        cfg.verbose = True
+    if (args.color_up):
+        cfg.color_up = args.color_up
+    if (args.color_down):
+        cfg.color_down = args.color_down
+    if (args.theta1):
+        cfg.theta1 = args.theta1
+    if (args.theta2):
+        cfg.theta2 = args.theta2
+    if (args.phi1):
+        cfg.phi1 = args.phi1
+    if (args.phi2):
+        cfg.phi2 = args.phi2
+    if (args.bloch_theta):
+        cfg.bloch_t = args.bloch_theta
+    if (args.bloch_phi):
+        cfg.bloch_p = args.bloch_phi
+    # if a specific experiment is selected, set the proper variables
+    if args.experiment is not None:
+        cfg.experiment = args.experiment
+        match cfg.experiment:
+            case 1:
+                # The detectors are three Stern-Gerlach magnets one
+                # oriented along the z axis and the other two in the zx plane
+                # with ±120° rotation and the particles are two entangled
+                # electrons in the singlet state
+                # Particles are in the singlet state
+                cfg.stype = 1
+                # orientation ±120°
+                cfg.appthetaL = 240
+                cfg.appthetaC = 0
+                cfg.appthetaR = 120
+                cfg.theta1 = 0
+                cfg.theta2 = 0
+                # xz plane
+                cfg.phi1 = 0
+                cfg.phi2 = 0
+                cfg.invert = True
+            case 2:
+                # The apparatus is composed by two polarizers which
+                # send the photons to three photodectors, one oriented
+                # along the z axis and the other two in the zx plane
+                # with 22.5° and 67.5° rotation and the particles
+                # are two entangled photons in the second triplet state
+                # Particles are a triplet in the second state
+                cfg.stype = 3
+                # orientation 22.5° and 67.5°
+                cfg.appthetaL = 0
+                cfg.appthetaC = 22.5
+                cfg.appthetaR = 45
+                cfg.theta1 = 0
+                cfg.theta2 = 0
+                # In the real world, light polarization is typically measured
+                # in degrees, and the angle θ can be from 0° to 360°.
+                # In the Hilbert space, the angles are typically represented by
+                # the state vectors on the Bloch sphere,
+                # where θ ranges from 0 to π.
+                #  Since vertical and horizontal polarizations are orthogonal
+                # and correspond to π/2 in real-world measurements and π
+                # on the Bloch sphere, the relationship between the real-world
+                # polarization angle `θ_real` and the Hilbert space angle
+                # `θ_Hilbert` is given by:
+                # θHilbert = 2 * θreal
+                cfg.bloch_t = 2
+                cfg.bloch_p = 1
+                # xz plane
+                cfg.phi1 = 0
+                cfg.phi2 = 0
+                cfg.invert = False
+
+
+# statistics of EPRCounts.fractions and EPRCounts.confidence
+FRACTIONS = ('prob_p1', 'prob_m1', 'prob_p2', 'prob_m2', 'same', 'diff',
+             'equal', 'equal_same', 'equal_diff', 'pass01', 'pass12',
+             'pass02', 'bell')
+# lower bounds of the statistics for local hidden variables with random
+# switches, per predefined experiment: the inequality of experiment 2
+# and, for the switches 120° apart of experiment 1, at least 5/9 of same
+# results overall and 1/3 for different switches. Other settings have
+# no known bound.
+LOCAL_BOUNDS = {1: {'equal': 5 / 9, 'equal_diff': 1 / 3}, 2: {'bell': 0.0}}
+
+
+class EPRCounts:
+    '''
+    Running contingency table of the EPR shots,
+    counts[switch1, switch2, outcome1, outcome2] where the outcome
+    index 0 is "+1" and 1 is "-1". It is updated as the shots arrive
+    and every statistic is derived from it, so the cost does not
+    depend on the number of shots.
+    '''
+
+    def __init__(self, counts: np.ndarray = None):
+        if counts is None:
+            counts = np.zeros((3, 3, 2, 2), dtype=np.int64)
+        self.counts = counts
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def merge(self, counts: np.ndarray):
+        self.counts += counts
+
+    def update(self, switches1: np.ndarray, switches2: np.ndarray,
+               measurements1: np.ndarray, measurements2: np.ndarray):
+        k = self.counts.shape[0]
+        cells = switches1.astype(np.intp) * k + switches2
+        cells = cells * 2 + (1 - measurements1.astype(np.intp)) // 2
+        cells = cells * 2 + (1 - measurements2.astype(np.intp)) // 2
+        self.counts += np.bincount(
+            cells, minlength=self.counts.size).reshape(self.counts.shape)
+
+    def statistics(self):
+        '''
+        Return the statistics shown by the EPR experiment: number of
+        measurements, outcome probabilities of each apparatus and the
+        agreement for same and different switches.
+        '''
+        counts = self.counts
+        measurements_nb = self.total
+        outcomes1 = counts.sum(axis=(0, 1, 3))
+        outcomes2 = counts.sum(axis=(0, 1, 2))
+        # counts of the same switch and of the same results
+        same = np.einsum('iikl->kl', counts)
+        equal = counts[..., 0, 0] + counts[..., 1, 1]
+        norm = max(measurements_nb, 1)
+        return SimpleNamespace(
+            total=measurements_nb,
+            prob_p1=outcomes1[0] / norm, prob_m1=outcomes1[1] / norm,
+            prob_p2=outcomes2[0] / norm, prob_m2=outcomes2[1] / norm,
+            num_same=int(same.sum()),
+            num_diff=measurements_nb - int(same.sum()),
+            equal=int(equal.sum()),
+            equal_same_mask=int(np.trace(equal)),
+            equal_diff_mask=int(equal.sum() - np.trace(equal)))
+
+    @staticmethod
+    def proportions(counts: np.ndarray):
+        '''
+        Return the statistics of the count tables counts (shape
+        (..., 3, 3, 2, 2)) that are proportions, as (k, n) pairs of
+        arrays: the fields of EPRApparatus.expected and the
+        probabilities of passing the first and not the second polarizer
+        of EPRCounts.bell_exp2 (pass01, pass12, pass02).
+        '''
+        counts = np.asarray(counts)
+        total = counts.sum(axis=(-4, -3, -2, -1))
+        outcomes1 = counts.sum(axis=(-4, -3, -1))
+        outcomes2 = counts.sum(axis=(-4, -3, -2))
+        shots = counts.sum(axis=(-2, -1))
+        same = np.einsum('...ii->...', shots)
+        equal = counts[..., 0, 0] + counts[..., 1, 1]
+        equal_same = np.einsum('...ii->...', equal)
+        # pass the first (s) and not the second (t) in either order
+        pass_not = counts[..., 0, 1] + np.swapaxes(counts[..., 1, 0], -2, -1)
+        pairs = shots + np.swapaxes(shots, -2, -1)
+        return {
+            'prob_p1': (outcomes1[..., 0], total),
+            'prob_m1': (outcomes1[..., 1], total),
+            'prob_p2': (outcomes2[..., 0], total),
+            'prob_m2': (outcomes2[..., 1], total),
+            'same': (same, total), 'diff': (total - same, total),
+            'equal': (equal.sum(axis=(-2, -1)), total),
+            'equal_same': (equal_same, same),
+            'equal_diff': (equal.sum(axis=(-2, -1)) - equal_same,
+                           total - same),
+            'pass01': (pass_not[..., 0, 1], pairs[..., 0, 1]),
+            'pass12': (pass_not[..., 1, 2], pairs[..., 1, 2]),
+            'pass02': (pass_not[..., 0, 2], pairs[..., 0, 2])}
+
+    @staticmethod
+    def fractions(counts: np.ndarray):
+        '''
+        Return the statistics of EPRCounts.proportions of the count
+        tables counts as fractions and the Bell value of experiment 2,
+        bell = pass01 + pass12 - pass02 (negative if violated), stacked
+        on the last axis in the order of FRACTIONS.
+        '''
+        proportions = EPRCounts.proportions(counts)
+        values = {name: proportion_stderr(k, n)[0]
+                  for name, (k, n) in proportions.items()}
+        values['bell'] = values['pass01'] + values['pass12'] - \
+            values['pass02']
+        return np.stack([values[name] for name in FRACTIONS], axis=-1)
+
+    def standard_errors(self):
+        '''
+        Return the statistics of EPRCounts.fractions as (value, stderr)
+        pairs with their analytic standard errors.
+        '''
+        proportions = self.proportions(self.counts)
+        values = {name: proportion_stderr(k, n)
+                  for name, (k, n) in proportions.items()}
+        # the three pairs of switches have disjoint shots
+        terms = [values['pass01'], values['pass12'], values['pass02']]
+        values['bell'] = (terms[0][0] + terms[1][0] - terms[2][0],
+                          np.sqrt(sum(t[1] ** 2 for t in terms)))
+        return SimpleNamespace(**{name: values[name] for name in FRACTIONS})
+
+    def confidence(self, level: float = 0.95, method: str = 'analytic',
+                   resamples: int = 1000,
+                   seed_seq: np.random.SeedSequence = None, executor=None):
+        '''
+        Return the confidence intervals (low, high) of the statistics of
+        EPRCounts.fractions with the given level, from the analytic
+        standard errors or with method 'bootstrap' from resamples
+        multinomial resamples of the count table, see
+        mod_statistics.bootstrap. The intervals of the statistics not
+        defined for the counts (e.g. no shots with different switches)
+        are None.
+        '''
+        match method:
+            case 'analytic':
+                values = vars(self.standard_errors())
+                low, high = normal_interval(
+                    np.array([values[name][0] for name in FRACTIONS]),
+                    np.array([values[name][1] for name in FRACTIONS]),
+                    level)
+            case 'bootstrap':
+                result = bootstrap(self.counts, self.fractions, resamples,
+                                   level, seed_seq, executor)
+                low, high = result.low, result.high
+            case _:
+                raise ValueError(f"Incorrect method {method}")
+        defined = np.isfinite(low) & np.isfinite(high)
+        return SimpleNamespace(**{
+            name: (float(low[i]), float(high[i])) if defined[i] else None
+            for i, name in enumerate(FRACTIONS)})
+
+    def probabilities_exp2(self, sw_A, sw_B, r_1, r_2):
+        '''
+        Return the number of shots with switches (sw_A, sw_B) in either
+        order and the probability of the outcomes (r_1, r_2) for them.
+        '''
+        i_1 = (1 - r_1) // 2
+        i_2 = (1 - r_2) // 2
+        count1 = self.counts[sw_A, sw_B]
+        count2 = self.counts[sw_B, sw_A]
+        countnb = int(count1.sum() + count2.sum())
+        if countnb == 0:
+            return 0, 0
+        prob = (count1[i_1, i_2] + count2[i_2, i_1]) / countnb
+        return countnb, prob
+
+    def bell_exp2(self):
+        '''
+        Compute the probabilities for Bell's inequality of experiment 2,
+        return the counts and the probabilities of passing the first and
+        not the second polarizer for the (L, C), (C, R) and (L, R) pairs.
+        '''
+        c01, p01 = self.probabilities_exp2(0, 1, 1, -1)
+        c12, p12 = self.probabilities_exp2(1, 2, 1, -1)
+        c02, p02 = self.probabilities_exp2(0, 2, 1, -1)
+        return c01, p01, c12, p12, c02, p02
+
+
+def bell_text_exp2():
+    '''
+    Return the inequality tested in experiment 2 with the measured
+    counts and with the expected probabilities.
+    '''
+    text1 = f"N({cfg.appthetaL}°+,{cfg.appthetaC}°-) + "\
+        f"N({cfg.appthetaC}°+,{cfg.appthetaR}°-) ≥ "\
+        f"N({cfg.appthetaL}°+,{cfg.appthetaR}°-)"
+    text2 = f"1/2*sin^2({cfg.appthetaC - cfg.appthetaL}°) + " \
+        f"1/2*sin^2({cfg.appthetaR - cfg.appthetaC}°)  ≥ " \
+        f"1/2*sin^2({cfg.appthetaR - cfg.appthetaL}°)"
+    return text1, text2
+
+
+def percent(value: float, exact: float = None, interval: tuple = None):
+    '''
+    Format a fraction as percentage, followed by its confidence interval
+    and its exact value if given.
+    '''
+    text = f"{value * 100:.1f}%"
+    if interval is not None:
+        text += f" [{interval[0] * 100:.1f}%, {interval[1] * 100:.1f}%]"
+    if exact is not None:
+        text += f" (exact {exact * 100:.1f}%)"
+    return text
+
+
+class AliasSampler:
+    '''
+    Categorical sampler using the alias method: after an O(k) setup
+    each sample costs a single uniform number and two table lookups.
+    '''
+
+    def __init__(self, p: np.ndarray):
+        p = np.asarray(p, dtype=float).ravel()
+        k = len(p)
+        scaled = p / p.sum() * k
+        self.__prob = np.ones(k)
+        self.__alias = np.arange(k)
+        small = [i for i in range(k) if scaled[i] < 1]
+        large = [i for i in range(k) if scaled[i] >= 1]
+        while small and large:
+            i = small.pop()
+            j = large.pop()
+            self.__prob[i] = scaled[i]
+            self.__alias[i] = j
+            scaled[j] += scaled[i] - 1
+            if scaled[j] < 1:
+                small.append(j)
+            else:
+                large.append(j)
+
+    def sample(self, n: int, rng: np.random.Generator):
+        u = rng.random(n) * len(self.__prob)
+        i = np.minimum(u.astype(np.intp), len(self.__prob) - 1)
+        return np.where(u - i < self.__prob[i], i, self.__alias[i])
+
+
+class EPRApparatus:
+    '''
+    Headless EPR apparatus: two detectors with three switch settings
+    (L, C, R) measuring a pair of entangled spins.
+    The 3x3 joint outcome distributions are computed once at
+    construction and the shots are drawn from them with an alias
+    sampler, so the cost per shot does not depend on the state.
+    '''
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        # Set the Spin Type
+        spin = TwoSpin()
+        match cfg.stype:
+            case 1:
+                spin.Singlet()
+            case 2:
+                spin.Triplet(1)
+            case 3:
+                spin.Triplet(2)
+            case 4:
+                spin.Triplet(3)
+            case _:
+                raise ValueError(
+                    f"Incorrect simulation type {cfg.stype}")
+        self.spin = spin
+        # Initialize the directions which have a defined rotation between
+        # each other for the first and the second apparatus
+        self.direction1p, self.direction1m = self.directions(
+            cfg.theta1, cfg.phi1)
+        self.direction2p, self.direction2m = self.directions(
+            cfg.theta2, cfg.phi2)
+        # joint[s1, s2, i, j]: probability of apparatus 1 giving i and
+        # apparatus 2 giving j (index 0 is "+1", index 1 is "-1") with
+        # switches s1 and s2
+        self.joint = spin.JointProbabilities(
+            np.stack([self.direction1p, self.direction1m], axis=1)[
+                :, None],
+            np.stack([self.direction2p, self.direction2m], axis=1)[
+                None, :])
+        # Invert the results for apparatus 2 if in the config,
+        # so, in the case of singlet, if the apparatus 1 measure +1,
+        #  apparatus 2 will agree 100% of the time it is oriented
+        # in the same direction.
+        if cfg.invert:
+            self.joint = self.joint[..., ::-1]
+        # switches and outcomes of every cell of the joint distribution
+        cells = np.indices(self.joint.shape).reshape(4, -1)
+        self.__cell_switches1 = cells[0].astype(np.int8)
+        self.__cell_switches2 = cells[1].astype(np.int8)
+        self.__cell_outcomes1 = (1 - 2 * cells[2]).astype(np.int8)
+        self.__cell_outcomes2 = (1 - 2 * cells[3]).astype(np.int8)
+        self.__samplers = {}
+
+    def directions(self, theta: float, phi: float):
+        '''
+        Return the "+1" and "-1" directions of the L, C, R switches of
+        an apparatus rotated by theta and phi (degrees).
+        '''
+        cfg = self.cfg
+        thetas = (theta + np.array([
+            cfg.appthetaL, cfg.appthetaC, cfg.appthetaR])) * \
+            cfg.bloch_t * np.pi / 180
+        phase = np.exp(1j * phi * cfg.bloch_p * np.pi / 180)
+        direction_p = np.stack([
+            np.cos(thetas / 2), phase * np.sin(thetas / 2)], axis=1)
+        direction_m = np.stack([
+            np.cos((thetas + np.pi) / 2),
+            phase * np.sin((thetas + np.pi) / 2)], axis=1)
+        return direction_p, direction_m
+
+    def sampler(self, switch1: int = None, switch2: int = None):
+        '''
+        Return the sampler of the joint (switches, outcomes) cells.
+        A switch set to None is selected uniformly at random.
+        '''
+        key = (switch1, switch2)
+        if key not in self.__samplers:
+            p_switches = self.switch_probabilities(switch1, switch2)
+            self.__samplers[key] = AliasSampler(
+                p_switches[:, :, None, None] * self.joint)
+        return self.__samplers[key]
+
+    @staticmethod
+    def switch_probabilities(switch1: int = None, switch2: int = None):
+        '''
+        Return the probabilities of the (switch1, switch2) combinations,
+        a switch set to None is selected uniformly at random.
+        '''
+        p_switch1 = np.full(3, 1 / 3)
+        p_switch2 = np.full(3, 1 / 3)
+        if switch1 is not None:
+            p_switch1 = np.eye(3)[switch1]
+        if switch2 is not None:
+            p_switch2 = np.eye(3)[switch2]
+        return np.outer(p_switch1, p_switch2)
+
+    def expected(self, p_switches: np.ndarray):
+        '''
+        Return the exact (infinite-shot) statistics of EPRCounts for the
+        probabilities p_switches of the switch combinations, as
+        fractions: outcome probabilities of each apparatus, probability
+        of same and different switches, and of same results overall and
+        for same and different switches.
+        '''
+        p = p_switches[:, :, None, None] * self.joint
+        outcomes1 = p.sum(axis=(0, 1, 3))
+        outcomes2 = p.sum(axis=(0, 1, 2))
+        same = np.trace(p_switches)
+        equal = p[..., 0, 0] + p[..., 1, 1]
+        equal_same = np.trace(equal)
+        equal_diff = equal.sum() - equal_same
+        return SimpleNamespace(
+            prob_p1=outcomes1[0], prob_m1=outcomes1[1],
+            prob_p2=outcomes2[0], prob_m2=outcomes2[1],
+            same=same, diff=1 - same, equal=equal.sum(),
+            equal_same=equal_same / same if same > 0 else np.nan,
+            equal_diff=equal_diff / (1 - same) if same < 1 else np.nan)
+
+    def expected_bell_exp2(self):
+        '''
+        Return the exact probabilities of passing the first and not the
+        second polarizer for the (L, C), (C, R) and (L, R) pairs, as
+        EPRCounts.bell_exp2 with random switches.
+        '''
+        def probability(sw_A, sw_B):
+            # both orders of the switches are equally likely
+            pass_not_pass = self.joint[sw_A, sw_B, 0, 1]
+            pass_not_pass += self.joint[sw_B, sw_A, 1, 0]
+            return pass_not_pass / 2
+        return probability(0, 1), probability(1, 2), probability(0, 2)
+
+    def sample(self, n: int, rng: np.random.Generator,
+               switch1: int = None, switch2: int = None):
+        '''
+        Perform n measurements, return the switches and the outcomes
+        of the two apparatus as int8 arrays.
+        '''
+        sampler = self.sampler(switch1, switch2)
+        result = np.empty((4, n), dtype=np.int8)
+        tables = (self.__cell_switches1, self.__cell_switches2,
+                  self.__cell_outcomes1, self.__cell_outcomes2)
+        chunk = 1 << 20
+        for start in range(0, n, chunk):
+            end = min(start + chunk, n)
+            cells = sampler.sample(end - start, rng)
+            for row, table in zip(result, tables):
+                row[start:end] = table[cells]
+        return tuple(result)
+
+    def sample_chunks(self, n: int, seed_seq: np.random.SeedSequence,
+                      switch1: int = None, switch2: int = None):
+        '''
+        Perform n measurements in chunks of fixed size, each drawn from
+        its own stream spawned from seed_seq, yield the result of every
+        chunk as returned by sample.
+        '''
+        for size, chunk_seed in chunk_streams(seed_seq, n):
+            yield self.sample(size, np.random.default_rng(chunk_seed),
+                              switch1, switch2)
+
+
+class EPRReplay:
+    '''
+    Replay of a run stored in a ShotLog, without re-simulating it. The
+    cumulative count tables at every block of shots are computed once
+    and cached next to the log, so the statistics up to any shot are a
+    table lookup plus the count of less than one block.
+    '''
+    block = 1 << 16
+
+    def __init__(self, path: str):
+        self.log = ShotLog(path)
+        self.records = self.log.records
+        self.prefix = self.__prefix_counts()
+
+    def __len__(self):
+        return len(self.records)
+
+    @staticmethod
+    def __fields(records: np.ndarray):
+        return (records['switch1'], records['switch2'],
+                records['measurement1'], records['measurement2'])
+
+    def __prefix_counts(self):
+        # prefix[i] counts the first i * block shots, the cached rows
+        # stay valid as the log is append-only
+        blocks = len(self) // self.block
+        prefix = np.zeros((1, 3, 3, 2, 2), dtype=np.int64)
+        if os.path.exists(self.log.index_path):
+            prefix = np.load(self.log.index_path)[:blocks + 1]
+        start = len(prefix) - 1
+        if start == blocks:
+            return prefix
+        counts = EPRCounts(prefix[-1].copy())
+        rows = np.empty((blocks - start, 3, 3, 2, 2), dtype=np.int64)
+        for i in range(start, blocks):
+            counts.update(*self.__fields(
+                self.records[i * self.block:(i + 1) * self.block]))
+            rows[i - start] = counts.counts
+        prefix = np.concatenate([prefix, rows])
+        try:
+            np.save(self.log.index_path, prefix)
+        except OSError:
+            # read-only location, the index is only kept in memory
+            pass
+        return prefix
+
+    def apply_config(self, cfg):
+        '''
+        Set cfg to the configuration of the stored run.
+        '''
+        for name, value in self.log.header.items():
+            if name != 'seed':
+                setattr(cfg, name, value)
+
+    def counts(self, index: int):
+        '''
+        Return the EPRCounts of the first index shots.
+        '''
+        block, rest = divmod(index, self.block)
+        counts = EPRCounts(self.prefix[block].copy())
+        if rest:
+            counts.update(*self.__fields(
+                self.records[block * self.block:index]))
+        return counts
+
+    def shot(self, index: int):
+        '''
+        Return switches and outcomes of the shot index as integers.
+        '''
+        return tuple(int(v) for v in self.__fields(self.records[index]))
+
+
+# apparatus of the worker processes of EPRPool
+_apparatus = None
+
+
+def _init_worker(factory, cfg):
+    global _apparatus
+    _apparatus = factory(cfg)
+
+
+def _sample_chunk(n: int, seed_seq: np.random.SeedSequence,
+                  switch1: int = None, switch2: int = None):
+    return _apparatus.sample(
+        n, np.random.default_rng(seed_seq), switch1, switch2)
+
+
+def _count_chunk(n: int, seed_seq: np.random.SeedSequence,
+                 switch1: int = None, switch2: int = None):
+    counts = EPRCounts()
+    counts.update(*_sample_chunk(n, seed_seq, switch1, switch2))
+    return counts.counts
+
+
+class EPRPool:
+    '''
+    Pool of processes performing the chunks of a run of the EPR
+    experiment on several cores. The chunks and their streams are the
+    same of EPRApparatus.sample_chunks, so the results for a given seed
+    do not depend on the number of processes.
+    factory builds the apparatus of each process from cfg, as
+    EPRApparatus or mod_lhv.make_apparatus.
+    '''
+
+    def __init__(self, cfg, workers: int = None, factory=EPRApparatus):
+        self.workers = workers or os.cpu_count()
+        self.__executor = ProcessPoolExecutor(
+            self.workers, initializer=_init_worker,
+            initargs=(factory, cfg))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def shutdown(self):
+        self.__executor.shutdown(cancel_futures=True)
+
+    def __map(self, fn, n: int, seed_seq: np.random.SeedSequence,
+              switch1: int = None, switch2: int = None):
+        # results in chunk order, keeping a bounded number of chunks in
+        # flight so that a stopped run does not leave work queued
+        pending = deque()
+        try:
+            for size, chunk_seed in chunk_streams(seed_seq, n):
+                pending.append(self.__executor.submit(
+                    fn, size, chunk_seed, switch1, switch2))
+                if len(pending) >= 2 * self.workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def sample_chunks(self, n: int, seed_seq: np.random.SeedSequence,
+                      switch1: int = None, switch2: int = None):
+        '''
+        Same as EPRApparatus.sample_chunks, with the chunks performed
+        by the pool.
+        '''
+        return self.__map(_sample_chunk, n, seed_seq, switch1, switch2)
+
+    def count(self, n: int, seed_seq: np.random.SeedSequence,
+              switch1: int = None, switch2: int = None):
+        '''
+        Perform n measurements and return only their EPRCounts, the
+        count tables of the chunks are merged without moving the shots
+        between the processes.
+        '''
+        counts = EPRCounts()
+        for chunk_counts in self.__map(
+                _count_chunk, n, seed_seq, switch1, switch2):
+            counts.merge(chunk_counts)
+        return counts
+
+
+class EPRSequential:
+    '''
+    Run of the EPR experiment which stops as soon as the stopping rule
+    holds for the statistic (see EPRCounts.fractions) of the shots
+    measured so far. The shots are performed by engine, EPRApparatus or
+    EPRPool, in segments whose totals double (mod_rng.sequential_streams),
+    and the rule is checked after each of them.
+    '''
+
+    def __init__(self, engine, rule: SequentialRule, statistic: str):
+        if statistic not in FRACTIONS:
+            raise ValueError(f"Incorrect statistic {statistic}")
+        self.engine = engine
+        self.rule = rule
+        self.statistic = statistic
+        self.counts = EPRCounts()
+        self.stopped = False
+
+    @property
+    def estimate(self):
+        '''
+        Return the value of the statistic and its standard error.
+        '''
+        return getattr(self.counts.standard_errors(), self.statistic)
+
+    def sample_chunks(self, n: int, seed_seq: np.random.SeedSequence,
+                      switch1: int = None, switch2: int = None):
+        '''
+        Same as EPRApparatus.sample_chunks, stopping before n shots
+        when the rule holds.
+        '''
+        self.counts = EPRCounts()
+        self.stopped = False
+        segments = sequential_streams(seed_seq, n)
+        for look, (size, segment_seed) in enumerate(segments):
+            for shots in self.engine.sample_chunks(
+                    size, segment_seed, switch1, switch2):
+                self.counts.update(*shots)
+                yield shots
+            if self.rule.stop(*self.estimate, look):
+                self.stopped = True
+                return
+
+
+def sequential_rule(cfg, random_switches: bool = True):
+    '''
+    Return the stopping rule and the statistic selected in cfg, or None
+    for runs of a fixed number of measurements. A rule on sigma needs
+    the local bound of the statistic, only known for the predefined
+    experiments with random switches, otherwise ValueError is raised.
+    '''
+    if cfg.width is None and cfg.sigma is None:
+        return None
+    statistic = cfg.statistic or ('bell' if cfg.experiment == 2
+                                  else 'equal')
+    bound = None
+    if random_switches:
+        bound = LOCAL_BOUNDS.get(cfg.experiment, {}).get(statistic)
+    if cfg.sigma is not None and bound is None:
+        raise ValueError(
+            f"Incorrect stopping rule on sigma: the statistic {statistic} "
+            "has no local bound for this experiment, only 'equal' and "
+            "'equal_diff' of experiment 1 and 'bell' of experiment 2 "
+            "with random switches have one")
+    rule = SequentialRule(cfg.width, cfg.sigma, bound)
+    return rule, statistic
+
+
+if __name__ == '__main__':
+    if sys.version_info[0] < 3:
+        raise RuntimeError('Must be using Python 3')
+    pass
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+'''
+/************************/
+/*       mod_lhv        */
+/*      Version 1.0     */
+/*      2026/10/17      */
+/************************/
+'''
+import abc
+from mod_epr import AliasSampler, EPRApparatus
+from mod_spin_operators import bloch_vector
+import numpy as np
+import sys
+
+
+class LHVApparatus(EPRApparatus, abc.ABC):
+    '''
+    EPR apparatus whose outcomes are predetermined by a local hidden
+    variable shared by the two particles, as a classical baseline of
+    the quantum one. Each shot draws the switches and the hidden
+    variable, and each apparatus computes its outcome from its own
+    switch and the hidden variable only. The shots have the same format
+    of EPRApparatus.sample, and joint holds the exact distributions of
+    the model, so the statistics and the exact values are the same.
+    '''
+
+    def __init__(self, cfg):
+        super().__init__(cfg)
+        # distributions predicted by quantum mechanics, for comparison
+        self.quantum = self.joint
+        self.joint = self.model_joint()
+        self.__switch_samplers = {}
+
+    @abc.abstractmethod
+    def model_joint(self):
+        '''
+        Set up the model from the state and the directions of the
+        quantum apparatus, return its exact joint distributions
+        joint[s1, s2, i, j].
+        '''
+
+    @abc.abstractmethod
+    def outcomes(self, n: int, rng: np.random.Generator,
+                 switches1: np.ndarray, switches2: np.ndarray):
+        '''
+        Draw n hidden variables and return the outcomes of the two
+        apparatus for the switches as int8 arrays.
+        '''
+
+    def sample(self, n: int, rng: np.random.Generator,
+               switch1: int = None, switch2: int = None):
+        key = (switch1, switch2)
+        if key not in self.__switch_samplers:
+            self.__switch_samplers[key] = AliasSampler(
+                self.switch_probabilities(switch1, switch2))
+        sampler = self.__switch_samplers[key]
+        result = np.empty((4, n), dtype=np.int8)
+        chunk = 1 << 20
+        for start in range(0, n, chunk):
+            end = min(start + chunk, n)
+            cells = sampler.sample(end - start, rng)
+            result[0, start:end] = cells // 3
+            result[1, start:end] = cells % 3
+            result[2:, start:end] = self.outcomes(
+                end - start, rng, result[0, start:end],
+                result[1, start:end])
+        return tuple(result)
+
+
+class HiddenVectorApparatus(LHVApparatus):
+    '''
+    Bell's model: the hidden variable is a unit vector l uniformly
+    distributed on the sphere, apparatus 1 measures sign(a . l) and
+    apparatus 2 sign(c . l), where a is the Bloch vector of the
+    direction of apparatus 1 and c = T b the one of apparatus 2 mapped
+    by the correlation tensor T of the state. It reproduces the perfect
+    (anti)correlations of the state, but the correlation is linear in
+    the angle instead of its cosine.
+    '''
+
+    def model_joint(self):
+        self.vectors1 = bloch_vector(self.direction1p)
+        vectors2 = bloch_vector(self.direction2p)
+        mapped = vectors2 @ self.spin.summary.T.T
+        norm = np.linalg.norm(mapped, axis=-1, keepdims=True)
+        self.vectors2 = np.divide(mapped, norm, out=vectors2,
+                                  where=norm > 1e-12)
+        # sign of the outcomes of apparatus 2 as shown, see EPRApparatus
+        self.sign2 = -1 if self.cfg.invert else 1
+        # the outcomes are equal unless l falls between the two planes
+        # orthogonal to a and c, with probability angle(a, c) / pi
+        cosine = np.clip(self.vectors1 @ self.vectors2.T, -1, 1)
+        differ = np.arccos(cosine) / np.pi
+        joint = np.empty((3, 3, 2, 2))
+        joint[..., 0, 0] = joint[..., 1, 1] = (1 - differ) / 2
+        joint[..., 0, 1] = joint[..., 1, 0] = differ / 2
+        if self.sign2 < 0:
+            joint = joint[..., ::-1]
+        return joint
+
+    def outcomes(self, n: int, rng: np.random.Generator,
+                 switches1: np.ndarray, switches2: np.ndarray):
+        # the normal distribution is isotropic, so l need not be
+        # normalized to give the sign of the projections
+        hidden = rng.standard_normal((n, 3))
+        projection1 = np.einsum('ij,ij->i', hidden, self.vectors1[switches1])
+        projection2 = np.einsum('ij,ij->i', hidden, self.vectors2[switches2])
+        outcome1 = np.where(projection1 >= 0, 1, -1).astype(np.int8)
+        outcome2 = np.where(projection2 >= 0, self.sign2, -self.sign2)
+        return outcome1, outcome2.astype(np.int8)
+
+
+class InstructionSetApparatus(LHVApparatus):
+    '''
+    Mermin's model: every pair carries an instruction set, the outcomes
+    of the L, C, R switches, drawn with probabilities weights from the
+    8 possible sets. The instructions of apparatus 2 agree with those of
+    apparatus 1 when the state gives equal results on equal switches and
+    are opposite otherwise, so that equal switches are always perfectly
+    (anti)correlated as in quantum mechanics.
+    '''
+
+    def __init__(self, cfg, weights: np.ndarray = None):
+        if weights is None:
+            weights = np.full(8, 1 / 8)
+        self.weights = np.asarray(weights, dtype=float)
+        if self.weights.shape != (8,) or np.any(self.weights < 0):
+            raise ValueError(f"Incorrect instruction weights {weights}")
+        self.weights = self.weights / self.weights.sum()
+        self.__sampler = AliasSampler(self.weights)
+        # instructions1[k, s]: outcome of apparatus 1 with set k, switch s
+        bits = (np.arange(8)[:, None] >> np.arange(3)) & 1
+        self.instructions1 = (1 - 2 * bits).astype(np.int8)
+        super().__init__(cfg)
+
+    def model_joint(self):
+        # sign of the correlation of equal switches predicted by the
+        # state, as shown by the apparatus
+        diagonal = self.quantum[np.arange(3), np.arange(3)]
+        E = diagonal[:, 0, 0] + diagonal[:, 1, 1] - diagonal[:, 0, 1] - \
+            diagonal[:, 1, 0]
+        self.instructions2 = self.instructions1 * np.where(
+            E >= 0, 1, -1).astype(np.int8)
+        index1 = (1 - self.instructions1) // 2
+        index2 = (1 - self.instructions2) // 2
+        joint = np.zeros((3, 3, 2, 2))
+        s1, s2 = np.indices((3, 3))
+        for k in range(8):
+            np.add.at(joint, (s1, s2, index1[k][s1], index2[k][s2]),
+                      self.weights[k])
+        return joint
+
+    def outcomes(self, n: int, rng: np.random.Generator,
+                 switches1: np.ndarray, switches2: np.ndarray):
+        sets = self.__sampler.sample(n, rng)
+        return (self.instructions1[sets, switches1],
+                self.instructions2[sets, switches2])
+
+
+# apparatus of each model selected with cfg.model
+MODELS = {'quantum': EPRApparatus, 'vector': HiddenVectorApparatus,
+          'instructions': InstructionSetApparatus}
+
+
+def make_apparatus(cfg):
+    '''
+    Return the apparatus of the model cfg.model.
+    '''
+    if cfg.model not in MODELS:
+        raise ValueError(f"Incorrect model {cfg.model}")
+    return MODELS[cfg.model](cfg)
+
+
+if __name__ == '__main__':
+    if sys.version_info[0] < 3:
+        raise RuntimeError('Must be using Python 3')
+    pass
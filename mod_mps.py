@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+'''
+/************************/
+/*       mod_mps        */
+/*      Version 1.0     */
+/*      2026/10/17      */
+/************************/
+'''
+import math
+from mod_rng import generator
+import numpy as np
+import sys
+
+_SMAP = {
+    'z': np.array([[1, 0], [0, -1]], dtype=complex),
+    'x': np.array([[0, 1], [1, 0]], dtype=complex),
+    'y': np.array([[0, -1j], [1j, 0]], dtype=complex),
+    'I': np.eye(2, dtype=complex)}
+
+
+def _operator(operator):
+    # 2x2 matrix of 'x', 'y', 'z', 'I' or of the operator given
+    if isinstance(operator, str):
+        if operator not in _SMAP:
+            raise ValueError("Incorrect operator " + operator)
+        return _SMAP[operator]
+    return np.asarray(operator, dtype=complex)
+
+
+def _transfer(E: np.ndarray, A: np.ndarray, operator: np.ndarray = None):
+    # left environment E[a, b] of < psi | ... | psi > carried through the
+    # tensor A[l, s, r], with the operator on its spin if given
+    bra = np.tensordot(E, A.conj(), axes=(0, 0))
+    if operator is not None:
+        A = np.einsum('st,btd->bsd', operator, A)
+    return bra.reshape(-1, bra.shape[2]).T @ A.reshape(-1, A.shape[2])
+
+
+class MPS:
+    '''
+    State of a chain of n spins as a matrix product state: one tensor
+    A[k] of shape (D_left, 2, D_right) per spin, the bond dimensions D
+    being at most bond. The tensors left of the orthogonality center
+    are left canonical and the ones right of it right canonical, so
+    local expectations, measurements and gates only touch a few tensors
+    and cost O(n D^3) at most, polynomial in the chain length. Two-spin
+    gates are truncated to bond singular values (and the ones whose
+    weight is below cutoff), the discarded weight is accumulated in
+    truncation_error. Spin 0 is the first factor of the kron products,
+    "u" the +1 eigenstate of z as in TwoSpin.
+    '''
+
+    def __init__(self, n: int, bond: int = 64, cutoff: float = 1e-12):
+        if n < 2:
+            raise ValueError("Incorrect number of spins " + str(n))
+        if bond < 1:
+            raise ValueError("Incorrect bond dimension " + str(bond))
+        self.n = n
+        self.bond = bond
+        self.cutoff = cutoff
+        self.truncation_error = 0.0
+        # all spins up
+        up = np.zeros((1, 2, 1), dtype=complex)
+        up[0, 0, 0] = 1
+        self.tensors = [up.copy() for _ in range(n)]
+        self.center = 0
+
+    def BondDimensions(self):
+        return [A.shape[2] for A in self.tensors[:-1]]
+
+    def __SetTensors(self, tensors: list):
+        # set the tensors of a state, bring them in canonical form with
+        # the center on spin 0 and normalize it
+        if len(tensors) != self.n:
+            raise ValueError("Incorrect number of tensors")
+        self.tensors = [np.asarray(A, dtype=complex) for A in tensors]
+        self.center = self.n - 1
+        self.MoveCenter(0)
+        norm = np.linalg.norm(self.tensors[0])
+        if norm == 0:
+            raise ValueError("Incorrect null state")
+        self.tensors[0] /= norm
+
+    def MoveCenter(self, k: int):
+        '''
+        Move the orthogonality center to spin k with QR decompositions.
+        '''
+        if not 0 <= k < self.n:
+            raise ValueError("Incorrect spin " + str(k))
+        A = self.tensors
+        while self.center < k:
+            c = self.center
+            dl, _, dr = A[c].shape
+            q, r = np.linalg.qr(A[c].reshape(dl * 2, dr))
+            A[c] = q.reshape(dl, 2, -1)
+            A[c + 1] = np.einsum('ab,bsr->asr', r, A[c + 1])
+            self.center += 1
+        while self.center > k:
+            c = self.center
+            dl, _, dr = A[c].shape
+            q, r = np.linalg.qr(A[c].reshape(dl, 2 * dr).T)
+            A[c] = q.T.reshape(-1, 2, dr)
+            A[c - 1] = np.einsum('lsa,ba->lsb', A[c - 1], r)
+            self.center -= 1
+
+    def ProductState(self, *spinors: np.ndarray):
+        if len(spinors) != self.n:
+            raise ValueError("Incorrect number of spinors")
+        tensors = []
+        for spinor in spinors:
+            spinor = np.asarray(spinor, dtype=complex).reshape(2)
+            # check that length is unitary
+            assert math.isclose(np.linalg.norm(spinor), 1)
+            tensors.append(spinor.reshape(1, 2, 1))
+        self.__SetTensors(tensors)
+
+    def GHZ(self):
+        # 1 / sqrt(2) * (| u...u > + | d...d >), bond dimension 2
+        middle = np.zeros((2, 2, 2))
+        middle[0, 0, 0] = middle[1, 1, 1] = 1
+        first = middle.sum(axis=0, keepdims=True)
+        last = middle.sum(axis=2, keepdims=True)
+        self.__SetTensors([first] + [middle] * (self.n - 2) + [last])
+
+    def W(self):
+        # equal superposition of the states with a single spin down: the
+        # bond index tells whether the spin down is on the left
+        middle = np.zeros((2, 2, 2))
+        middle[0, 0, 0] = middle[1, 0, 1] = middle[0, 1, 1] = 1
+        first, last = middle[:1], middle[:, :, 1:]
+        self.__SetTensors([first] + [middle] * (self.n - 2) + [last])
+
+    def Dimers(self):
+        '''
+        Set the spins (0, 1), (2, 3), ... in the singlet state
+        1 / sqrt(2) * (| ud > - | du >), a valence bond chain of EPR
+        pairs; with n odd the last spin is up.
+        '''
+        first = np.zeros((1, 2, 2))
+        first[0, 0, 0] = first[0, 1, 1] = 1
+        second = np.zeros((2, 2, 1))
+        second[0, 1, 0] = 1
+        second[1, 0, 0] = -1
+        tensors = [first, second] * (self.n // 2)
+        if self.n % 2:
+            tensors.append(np.array([1, 0]).reshape(1, 2, 1))
+        self.__SetTensors(tensors)
+
+    def Cluster(self):
+        '''
+        Set the linear cluster state, CZ on every neighbouring pair of
+        spins along x.
+        '''
+        plus = np.array([1, 1]) / np.sqrt(2)
+        self.ProductState(*[plus] * self.n)
+        cz = np.diag([1, 1, 1, -1]).astype(complex)
+        for k in range(self.n - 1):
+            self.ApplyTwoSpin(cz, k)
+
+    def ApplyLocal(self, operator, k: int):
+        '''
+        Apply the 2x2 unitary operator (or 'x', 'y', 'z') to spin k,
+        the tensors are updated in place as by NSpin.ApplyLocal.
+        '''
+        if not 0 <= k < self.n:
+            raise ValueError("Incorrect spin " + str(k))
+        self.tensors[k] = np.einsum(
+            'st,ltr->lsr', _operator(operator), self.tensors[k])
+
+    def ApplyTwoSpin(self, gate: np.ndarray, k: int):
+        '''
+        Apply the 4x4 unitary gate, in the basis of TwoSpin (spin k
+        first), to the spins k and k + 1, truncating the bond between
+        them. The center moves to k + 1.
+        '''
+        if not 0 <= k < self.n - 1:
+            raise ValueError("Incorrect spin " + str(k))
+        self.MoveCenter(k)
+        A, B = self.tensors[k], self.tensors[k + 1]
+        dl, dr = A.shape[0], B.shape[2]
+        gate = np.asarray(gate, dtype=complex).reshape(2, 2, 2, 2)
+        theta = np.einsum('stuv,lua,avr->lstr', gate, A, B, optimize=True)
+        u, s, vh = np.linalg.svd(theta.reshape(dl * 2, 2 * dr),
+                                 full_matrices=False)
+        weights = s ** 2 / np.sum(s ** 2)
+        keep = min(self.bond, max(1, np.count_nonzero(
+            weights > self.cutoff)))
+        self.truncation_error += weights[keep:].sum()
+        s = s[:keep] / np.linalg.norm(s[:keep])
+        self.tensors[k] = u[:, :keep].reshape(dl, 2, keep)
+        self.tensors[k + 1] = (s[:, None] * vh[:keep]).reshape(keep, 2, dr)
+        self.center = k + 1
+
+    def Expectation(self, operators: dict):
+        '''
+        Return < psi | O_k1 ... O_kj | psi > for the 2x2 operators (or
+        'x', 'y', 'z', 'I') of the dictionary {spin: operator}, as
+        NSpin.Expectation.
+        '''
+        spins = sorted(operators)
+        if not spins:
+            return 1.0
+        if spins[0] < 0 or spins[-1] >= self.n:
+            raise ValueError("Incorrect spins " + str(spins))
+        self.MoveCenter(spins[0])
+        E = np.eye(self.tensors[spins[0]].shape[0])
+        for k in range(spins[0], spins[-1] + 1):
+            operator = _operator(operators[k]) if k in operators else None
+            E = _transfer(E, self.tensors[k], operator)
+        return np.trace(E)
+
+    def Correlation(self, i: int, j: int, sA='z', sB='z'):
+        '''
+        Return the two-point correlation < O_i O_j > of the operators sA
+        on spin i and sB on spin j (i != j).
+        '''
+        if i == j:
+            raise ValueError("Incorrect equal spins " + str(i))
+        return self.Expectation({i: sA, j: sB}).real
+
+    def CorrelationFunction(self, sA='z', sB='z', i: int = 0):
+        '''
+        Return the correlation function C[d - 1] = < O_i O_i+d > of the
+        operators sA on spin i and sB on the spins j = i + d to the right
+        of it, and the connected one C[d - 1] - < O_i > < O_i+d >, in a
+        single sweep along the chain, O(n D^3).
+        '''
+        if not 0 <= i < self.n - 1:
+            raise ValueError("Incorrect spin " + str(i))
+        A_op, B_op = _operator(sA), _operator(sB)
+        self.MoveCenter(i)
+        mean_i = self.Expectation({i: A_op}).real
+        E = _transfer(np.eye(self.tensors[i].shape[0]), self.tensors[i],
+                      A_op)
+        correlation = np.empty(self.n - i - 1)
+        for j in range(i + 1, self.n):
+            correlation[j - i - 1] = np.trace(
+                _transfer(E, self.tensors[j], B_op)).real
+            E = _transfer(E, self.tensors[j])
+        # local expectations of sB, each with the center on its spin
+        means = np.empty(self.n - i - 1)
+        for j in range(i + 1, self.n):
+            self.MoveCenter(j)
+            A = self.tensors[j]
+            means[j - i - 1] = np.einsum(
+                'asb,st,atb->', A.conj(), B_op, A).real
+        return correlation, correlation - mean_i * means
+
+    def Entropy(self, k: int):
+        '''
+        Return the entanglement entropy (bits) of the spins 0..k with
+        the rest of the chain, from the Schmidt values of the bond k.
+        '''
+        if not 0 <= k < self.n - 1:
+            raise ValueError("Incorrect spin " + str(k))
+        self.MoveCenter(k)
+        A = self.tensors[k]
+        s = np.linalg.svd(A.reshape(-1, A.shape[2]), compute_uv=False)
+        p = s[s > 1e-15] ** 2
+        return float(-np.sum(p * np.log2(p)))
+
+    def Measure(self, k: int, directions: np.ndarray, update: bool = False,
+                rng: np.random.Generator = None):
+        '''
+        Perform the measurement of spin k along the [+1, -1] pair of
+        directions, return the outcome. With update the state collapses
+        on it, so that measurements of several spins can follow.
+        '''
+        if rng is None:
+            rng = generator()
+        directions = np.asarray(directions, dtype=complex)
+        self.MoveCenter(k)
+        amplitudes = np.einsum('is,lsr->ilr', directions.conj(),
+                               self.tensors[k])
+        prob_p1 = np.vdot(amplitudes[0], amplitudes[0]).real
+        sp = 1 if rng.random() < prob_p1 else -1
+        if update:
+            i = 0 if sp == 1 else 1
+            prob = prob_p1 if sp == 1 else 1 - prob_p1
+            self.tensors[k] = np.einsum(
+                's,lr->lsr', directions[i], amplitudes[i]) / np.sqrt(prob)
+        return sp
+
+    def MeasureBatch(self, directions: np.ndarray, shots: int,
+                     rng: np.random.Generator = None):
+        '''
+        Perform shots measurements of all the spins along the [+1, -1]
+        pairs of directions, shape (n, 2, 2) or (2, 2) for all of them,
+        return the outcomes as an int8 array of shape (shots, n). The
+        spins are sampled one after the other along the chain from their
+        probabilities conditioned on the outcomes of the previous ones,
+        O(shots n D^2), and the state is not modified.
+        '''
+        if rng is None:
+            rng = generator()
+        directions = np.broadcast_to(
+            np.asarray(directions, dtype=complex), (self.n, 2, 2))
+        # with all the tensors right canonical, the probabilities of a
+        # spin only need the left part of the chain
+        self.MoveCenter(0)
+        result = np.empty((shots, self.n), dtype=np.int8)
+        chunk = 1 << 12
+        for start in range(0, shots, chunk):
+            end = min(start + chunk, shots)
+            left = np.ones((end - start, 1), dtype=complex)
+            for k, A in enumerate(self.tensors):
+                projected = np.einsum('is,lsr->ilr', directions[k].conj(),
+                                      A)
+                amplitudes = np.matmul(left, projected)
+                p = np.sum(amplitudes.real ** 2 + amplitudes.imag ** 2,
+                           axis=-1)
+                minus = rng.random(end - start) * (p[0] + p[1]) >= p[0]
+                result[start:end, k] = np.where(minus, -1, 1)
+                left = np.where(minus[:, None], amplitudes[1], amplitudes[0])
+                left /= np.sqrt(np.where(minus, p[1], p[0]))[:, None]
+        return result
+
+    def ToStateVector(self):
+        '''
+        Return the state as a tensor of shape (2,) * n for NSpin, O(2^n).
+        '''
+        psi = np.ones((1, 1), dtype=complex)
+        for A in self.tensors:
+            psi = np.einsum('pl,lsr->psr', psi, A).reshape(-1, A.shape[2])
+        return psi.reshape((2,) * self.n)
+
+
+if __name__ == '__main__':
+    if sys.version_info[0] < 3:
+        raise RuntimeError('Must be using Python 3')
+    pass
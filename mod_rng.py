@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+'''
+/************************/
+/*       mod_rng        */
+/*      Version 1.0     */
+/*      2026/10/17      */
+/************************/
+'''
+import numpy as np
+import sys
+
+# Number of shots drawn from each independent stream. It is fixed so that
+# the split of a run in chunks, and hence its result, does not depend on
+# how many workers process the chunks.
+CHUNK_SIZE = 1 << 20
+
+
+class RandomStreams:
+    '''
+    Reproducible random streams built on numpy Generator: a root
+    SeedSequence from which the generator of the interactive
+    measurements and an independent SeedSequence per batch run are
+    spawned.
+    '''
+
+    def __init__(self, seed: int = None):
+        self.seed(seed)
+
+    def seed(self, seed: int = None):
+        self.__root = np.random.SeedSequence(seed)
+        # the seed, or the entropy drawn from the system if it is None
+        self.entropy = self.__root.entropy
+        self.__generator = np.random.default_rng(self.__root.spawn(1)[0])
+
+    @property
+    def generator(self):
+        return self.__generator
+
+    @property
+    def root(self):
+        '''
+        Return the root SeedSequence before any spawn, from which the
+        generator and the runs are spawned again in the same order.
+        '''
+        return np.random.SeedSequence(self.entropy)
+
+    def spawn(self):
+        '''
+        Return the SeedSequence of a new run, independent of the
+        previous ones.
+        '''
+        return self.__root.spawn(1)[0]
+
+
+def chunk_streams(seed_seq: np.random.SeedSequence, n: int,
+                  chunk: int = CHUNK_SIZE):
+    '''
+    Split a run of n shots in chunks of fixed size, each with its own
+    SeedSequence spawned from seed_seq, return the (size, seed) pairs.
+    Chunk i always receives the same stream, whichever worker draws it.
+    '''
+    sizes = [min(chunk, n - start) for start in range(0, n, chunk)]
+    return list(zip(sizes, seed_seq.spawn(len(sizes))))
+
+
+def sequential_streams(seed_seq: np.random.SeedSequence, n: int,
+                       first: int = 1024):
+    '''
+    Split a run of at most n shots in segments after which the run can
+    stop, the totals doubling from first, return the (size, seed) pairs
+    of the segments. Each segment is then split with chunk_streams.
+    '''
+    ends = []
+    end = first
+    while end < n:
+        ends.append(end)
+        end *= 2
+    ends.append(n)
+    sizes = np.diff([0] + ends).tolist()
+    return list(zip(sizes, seed_seq.spawn(len(sizes))))
+
+
+# Streams shared by the scripts, as the functions of the random module
+streams = RandomStreams()
+
+
+def seed(value: int = None):
+    streams.seed(value)
+
+
+def generator():
+    return streams.generator
+
+
+def spawn():
+    return streams.spawn()
+
+
+if __name__ == '__main__':
+    if sys.version_info[0] < 3:
+        raise RuntimeError('Must be using Python 3')
+    pass
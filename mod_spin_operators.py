@@ -8,9 +8,166 @@
 '''
 import cmath
 import math
+from mod_rng import generator
 import numpy as np
-import random
 import sys
+from types import SimpleNamespace
+
+
+def bloch_vector(direction: np.ndarray):
+    '''
+    Return the Bloch vector (x, y, z) of the spinors in direction,
+    shape (..., 2).
+    '''
+    direction = np.asarray(direction, dtype=complex)
+    c = direction[..., 0].conj() * direction[..., 1]
+    return np.stack([
+        2 * c.real, 2 * c.imag,
+        np.abs(direction[..., 0]) ** 2 - np.abs(direction[..., 1]) ** 2],
+        axis=-1)
+
+
+def correlation_tensor(states: np.ndarray):
+    '''
+    Return the correlation tensors T[..., k, l] = < σ_k σ_l >, with k, l
+    in (x, y, z), of the two spin states of shape (..., 4) or (..., 4, 1)
+    in the 'ud' basis.
+    '''
+    states = np.asarray(states, dtype=complex)
+    if states.shape[-1] == 1:
+        states = states[..., 0]
+    m = states.reshape(states.shape[:-1] + (2, 2))
+    p = np.array([[[0, 1], [1, 0]], [[0, -1j], [1j, 0]], [[1, 0], [0, -1]]])
+    return np.einsum('...ij,kia,ljb,...ab->...kl', m.conj(), p, p, m).real
+
+
+def pauli_masks(strings, n: int = None):
+    '''
+    Return the bit masks of the Pauli strings (e.g. 'xzI', one of 'I',
+    'x', 'y', 'z' per spin, spin 0 being the most significant bit of
+    the basis index): x flipped by x and y, z with a sign from z and y,
+    and the number of y. As P = i^ny X^x Z^z, P |b> = i^ny
+    (-1)^popcount(b & z) |b ^ x>.
+    '''
+    strings = [strings] if isinstance(strings, str) else list(strings)
+    if n is None:
+        n = len(strings[0])
+    # one character code per spin
+    codes = np.array(strings, dtype=f'<U{max(n, 1)}')
+    codes = codes.view(np.uint32).reshape(len(strings), -1)
+    lengths = np.char.str_len(np.array(strings, dtype=str))
+    valid = np.isin(codes, [ord(c) for c in 'Ixyz'])
+    if np.any(lengths != n) or not np.all(valid):
+        bad = np.flatnonzero((lengths != n) | ~valid.all(axis=1))[0]
+        raise ValueError("Incorrect Pauli string " + strings[bad])
+    bits = np.int64(1) << np.arange(n - 1, -1, -1, dtype=np.int64)
+    is_y = codes == ord('y')
+    x = ((codes == ord('x')) | is_y) @ bits
+    z = ((codes == ord('z')) | is_y) @ bits
+    ny = is_y.sum(axis=1)
+    return x, z, ny
+
+
+def _parity(v: np.ndarray):
+    # parity of the set bits of the int64 array v, folding it with xor
+    v = v.copy()
+    for shift in (32, 16, 8, 4, 2, 1):
+        v ^= v >> shift
+    return v & 1
+
+
+def _walsh_hadamard(a: np.ndarray):
+    # w[z] = sum_b a[b] (-1)^popcount(b & z) with n butterflies
+    w = a.copy()
+    half = 1
+    while half < w.size:
+        w = w.reshape(-1, 2, half)
+        w = np.stack([w[:, 0] + w[:, 1], w[:, 0] - w[:, 1]], axis=1)
+        half *= 2
+    return w.reshape(-1)
+
+
+def pauli_expectations(psi: np.ndarray, strings):
+    '''
+    Return the expectations < psi | P | psi > of the Pauli strings (see
+    pauli_masks) without forming any matrix: every string permutes the
+    basis indices and changes their signs, O(2^n) each. The strings
+    sharing the same flips are evaluated together, all at once with a
+    Walsh-Hadamard transform when they are many, so the 4^n strings of
+    n spins cost O(n 4^n).
+    '''
+    psi = np.asarray(psi, dtype=complex).reshape(-1)
+    n = len(psi).bit_length() - 1
+    if len(psi) != 1 << n:
+        raise ValueError("Incorrect state size " + str(len(psi)))
+    x, z, ny = pauli_masks(strings, n)
+    index = np.arange(len(psi), dtype=np.int64)
+    values = np.empty(len(x), dtype=complex)
+    for flips in np.unique(x):
+        selected = np.flatnonzero(x == flips)
+        # conj(psi[b ^ x]) psi[b]: amplitude of P |b> on the bra
+        a = psi[index ^ flips].conj() * psi
+        if len(selected) > n:
+            sums = _walsh_hadamard(a)[z[selected]]
+        else:
+            sums = np.array([
+                np.sum(a * (1 - 2 * _parity(index & signs)))
+                for signs in z[selected]])
+        values[selected] = 1j ** ny[selected] * sums
+    # the strings are hermitian
+    return values.real
+
+
+def apply_pauli(psi: np.ndarray, string: str):
+    '''
+    Return P |psi> for the Pauli string P (see pauli_masks), permuting
+    the basis indices and changing their signs.
+    '''
+    psi = np.asarray(psi, dtype=complex)
+    flat = psi.reshape(-1)
+    n = len(flat).bit_length() - 1
+    x, z, ny = pauli_masks(string, n)
+    index = np.arange(len(flat), dtype=np.int64)
+    result = np.empty_like(flat)
+    result[index ^ x[0]] = 1j ** ny[0] * (
+        1 - 2 * _parity(index & z[0])) * flat
+    return result.reshape(psi.shape)
+
+
+def measurement_directions(theta: np.ndarray, phi: np.ndarray,
+                           bloch_t: float = 1.0, bloch_p: float = 1.0):
+    '''
+    Return the [+1, -1] pairs of directions of the apparatus rotated by
+    theta and phi (radians, any broadcastable shapes), shape (..., 2, 2).
+    bloch_t and bloch_p convert the angles into the angles on the Bloch
+    sphere.
+    '''
+    half = np.asarray(theta) * bloch_t / 2
+    phase = np.exp(1j * np.asarray(phi) * bloch_p)
+    half, phase = np.broadcast_arrays(half, phase)
+    return np.stack([
+        np.stack([np.cos(half), phase * np.sin(half)], axis=-1),
+        np.stack([np.cos(np.pi / 2 + half),
+                  phase * np.sin(np.pi / 2 + half)], axis=-1)], axis=-2)
+
+
+def joint_moments(p: np.ndarray):
+    '''
+    Return the means of the two outcomes, the expectation of their
+    product and their correlation coefficient (nan if either outcome is
+    certain) from the joint probabilities p of shape (..., 2, 2), where
+    index 0 is "+1" and index 1 is "-1".
+    '''
+    mean1 = p[..., 0, :].sum(axis=-1) - p[..., 1, :].sum(axis=-1)
+    mean2 = p[..., :, 0].sum(axis=-1) - p[..., :, 1].sum(axis=-1)
+    expectation = np.trace(p, axis1=-2, axis2=-1) - p[..., 0, 1] - \
+        p[..., 1, 0]
+    den = np.sqrt(np.clip((1 - mean1 ** 2) * (1 - mean2 ** 2), 0, None))
+    correlation = np.divide(
+        expectation - mean1 * mean2, den, out=np.full_like(den, np.nan),
+        where=den > 1e-12)
+    return SimpleNamespace(mean1=mean1, mean2=mean2,
+                           expectation=expectation, correlation=correlation)
 
 
 class SingleSpin:
@@ -148,6 +305,9 @@ class TwoSpin:
                 np.array([[1, 0], [0, 1]], dtype=complex)
             ]
             self.__smap = {'z': 0, 'x': 1, 'y': 2, 'I': 3}
+            # Pauli matrices in the (x, y, z) order of the Bloch vectors
+            self.__pauli = np.array([self.__s[1], self.__s[2], self.__s[0]])
+            self.__summary = None
         else:
             raise NotImplementedError(
                 "Basis " + basis + "not Implemented")
@@ -161,6 +321,24 @@ class TwoSpin:
         # check that length is unitary
         assert math.isclose(np.linalg.norm(value), 1)
         self.__state = value
+        self.__UpdateSummary()
+
+    @property
+    def summary(self):
+        '''
+        State summary computed once when psi is set: the Bloch vectors
+        r and s of the two systems and the correlation tensor
+        T[k, l] = < σ_k σ_l >, with k, l in (x, y, z).
+        '''
+        return self.__summary
+
+    def __UpdateSummary(self):
+        m = self.__state.reshape(2, 2)
+        p = self.__pauli
+        self.__summary = SimpleNamespace(
+            r=np.einsum('ij,kia,aj->k', m.conj(), p, m).real,
+            s=np.einsum('ij,kja,ia->k', m.conj(), p, m).real,
+            T=correlation_tensor(self.__state))
 
     def BasisVector(self, s):
         return self.__b[self.__bmap[s]]
@@ -176,18 +354,19 @@ class TwoSpin:
         return np.kron(self.__s[3], self.__s[self.__smap[s]])
 
     def Expectation(self, sA: str, sB: str):
-        if (sA == 'I'):
-            # expectation of  System B
-            return np.linalg.multi_dot([
-                self.__state.conj().T, self.Sigma_B(sB), self.__state])[0, 0]
-        elif (sB == 'I'):
-            # expectation of  System A
-            return np.linalg.multi_dot([
-                self.__state.conj().T, self.Sigma_A(sA), self.__state])[0, 0]
-        else:
-            # expectation of the composite system
-            return np.linalg.multi_dot([
-                self.__state.conj().T, self.Sigma(sA, sB), self.__state])[0, 0]
+        '''
+        Return the expectation of sA on system A and sB on system B,
+        each one of 'x', 'y', 'z' or 'I'.
+        '''
+        return self.PauliExpectations([sA + sB])[0]
+
+    def PauliExpectations(self, strings):
+        '''
+        Return the expectations of the two spin Pauli strings, e.g. all
+        the correlations ['xx', 'xy', ..., 'zz'] in one call, see
+        pauli_expectations.
+        '''
+        return pauli_expectations(self.__state, strings)
 
     def ProductState(self, A: np.array, B: np.array):
         # check that length is unitary
@@ -211,11 +390,14 @@ class TwoSpin:
 
     def Measure(self, directions1: np.ndarray,
                 directions2: np.ndarray, simulate_1: bool = True,
-                update: bool = False):
+                update: bool = False, rng: np.random.Generator = None):
         '''
         Perform the measurement of the spin of two directions 1 and 2,
         which one to simulate is decided by the caller.
         '''
+        if rng is None:
+            rng = generator()
+
         def Rho1(psi: np.ndarray):
             return np.outer(psi, psi.conj()).reshape(
                 (2, 2, 2, 2)).trace(axis1=1, axis2=3)
@@ -254,8 +436,8 @@ class TwoSpin:
 
         # Calculate the probability of this first spin being "+1"
         prob_p11 = np.linalg.norm(np.trace(np.dot(projector_p11, rho_i)))
-        # Generate a random number between 0 and 1
-        random_number1 = random.uniform(0, 1)
+        # Generate the two random numbers between 0 and 1
+        random_number1, random_number2 = rng.random(2)
 
         # Perform the measurement in apparatus direction
         sp1 = 1 if random_number1 < prob_p11 else -1
@@ -272,14 +454,607 @@ class TwoSpin:
         # Calculate the probability of "system 2" being "+1"
         prob_p12 = np.linalg.norm(np.trace(np.dot(projector_p21, rho_j)))
 
-        # Generate a random number between 0 and 1
-        random_number2 = random.uniform(0, 1)
-
         sp2 = 1 if random_number2 < prob_p12 else -1
         if update:
             self.__state = psi
         return (sp1, sp2)
 
+    def MeasureProbabilities(self, directions1: np.ndarray,
+                             directions2: np.ndarray, simulate_1=True,
+                             method: str = 'state'):
+        '''
+        Compute, as Measure does, the probability of the system measured
+        first being "+1" and the probabilities of the other system being
+        "+1" after the first one collapsed on "+1" and on "-1".
+        directions1 and directions2 have shape (..., 2, 2) and are
+        broadcast together with simulate_1.
+        With method 'state' the wave function is collapsed explicitly,
+        with method 'tensor' the joint distribution
+        p(a, b) = (1 + a r.m + b s.n + ab m.T.n) / 4 is evaluated from
+        the state summary, which requires the "-1" direction of each
+        pair to be orthogonal to the "+1" one.
+        '''
+        directions1 = np.asarray(directions1, dtype=complex)
+        directions2 = np.asarray(directions2, dtype=complex)
+        match method:
+            case 'state':
+                pass
+            case 'tensor':
+                return self.__TensorProbabilities(
+                    directions1, directions2, simulate_1)
+            case _:
+                raise ValueError("Incorrect method " + method)
+        first = np.asarray(simulate_1, dtype=bool)[..., None]
+        # psi as a matrix: rows are system 1, columns system 2. Projecting
+        # system 1 on a direction a leaves system 2 in conj(a) . psi,
+        # projecting system 2 on b leaves system 1 in psi . conj(b)
+        psi = self.__state.reshape(2, 2)
+        d1 = directions1.conj()
+        d2 = directions2.conj()
+        psi_p1 = np.where(first, d1[..., 0, :] @ psi, d2[..., 0, :] @ psi.T)
+        psi_m1 = np.where(first, d1[..., 1, :] @ psi, d2[..., 1, :] @ psi.T)
+        d_j = np.where(first, d2[..., 0, :], d1[..., 0, :])
+        prob_p11 = np.sum(psi_p1.real ** 2 + psi_p1.imag ** 2, axis=-1)
+        probs = [prob_p11]
+        for psi_r in (psi_p1, psi_m1):
+            # Normalize the collapsed wave function of the second system
+            norm2 = np.sum(psi_r.real ** 2 + psi_r.imag ** 2, axis=-1)
+            amp = np.sum(d_j * psi_r, axis=-1)
+            amp = amp.real ** 2 + amp.imag ** 2
+            probs.append(np.divide(amp, norm2, out=np.zeros_like(amp),
+                                   where=norm2 > 0))
+        return tuple(probs)
+
+    def JointProbabilities(self, directions1: np.ndarray,
+                           directions2: np.ndarray, method: str = 'state'):
+        '''
+        Return the joint probabilities p[..., i, j] of system 1 giving
+        the outcome i and system 2 the outcome j, where index 0 is "+1"
+        and index 1 is "-1", for the pairs of directions 1 and 2 of
+        shape (..., 2, 2).
+        '''
+        prob_p11, prob_p12_p, prob_p12_m = self.MeasureProbabilities(
+            directions1, directions2, True, method)
+        return np.stack([
+            np.stack([prob_p11 * prob_p12_p,
+                      prob_p11 * (1 - prob_p12_p)], axis=-1),
+            np.stack([(1 - prob_p11) * prob_p12_m,
+                      (1 - prob_p11) * (1 - prob_p12_m)], axis=-1)],
+            axis=-2)
+
+    def Correlation(self, directions1: np.ndarray,
+                    directions2: np.ndarray, method: str = 'state'):
+        '''
+        Return the exact (infinite-shot) means of the outcomes of the
+        two systems and their correlation coefficient, for the pairs of
+        directions 1 and 2 of shape (..., 2, 2). As np.corrcoef, the
+        correlation is nan if either outcome is certain.
+        '''
+        moments = joint_moments(
+            self.JointProbabilities(directions1, directions2, method))
+        return moments.mean1, moments.mean2, moments.correlation
+
+    def __TensorProbabilities(self, directions1: np.ndarray,
+                              directions2: np.ndarray, simulate_1=True):
+        summary = self.__summary
+        m = bloch_vector(directions1[..., 0, :])
+        n = bloch_vector(directions2[..., 0, :])
+        rm = m @ summary.r
+        sn = n @ summary.s
+        mtn = np.einsum('...k,kl,...l->...', m, summary.T, n)
+        first = np.asarray(simulate_1, dtype=bool)
+        # Marginal of the system measured first and of the other one
+        x = np.where(first, rm, sn)
+        y = np.where(first, sn, rm)
+        prob_p11 = (1 + x) / 2
+        probs = [prob_p11]
+        for sign in (1, -1):
+            # p(first = sign, second = +1) / p(first = sign)
+            joint = (1 + sign * x + y + sign * mtn) / 4
+            marginal = (1 + sign * x) / 2
+            probs.append(np.divide(
+                joint, marginal, out=np.zeros_like(joint),
+                where=marginal > 0))
+        return tuple(probs)
+
+    def MeasureBatch(self, directions1: np.ndarray,
+                     directions2: np.ndarray, simulate_1=True,
+                     rng: np.random.Generator = None,
+                     settings1: np.ndarray = None,
+                     settings2: np.ndarray = None,
+                     method: str = 'state'):
+        '''
+        Perform n measurements of the spin of two directions 1 and 2 in
+        a single vectorized pass.
+        directions1 and directions2 contain one [+1, -1] pair of
+        directions per shot, shape (n, 2, 2), or a single pair, shape
+        (2, 2), used for every shot. If settings1 and settings2 are
+        given, the directions are instead tables of shape (k, 2, 2)
+        and the settings are the n indices of the pair used per shot,
+        so that the probabilities are computed once per combination.
+        simulate_1 is a boolean or an array of n booleans deciding which
+        system is measured first. method selects how the probabilities
+        are computed, see MeasureProbabilities.
+        Differently from Measure, the outcomes are always returned in
+        the order (system 1, system 2) as two int8 arrays.
+        '''
+        if rng is None:
+            rng = generator()
+        directions1 = np.asarray(directions1, dtype=complex)
+        directions2 = np.asarray(directions2, dtype=complex)
+        simulate_1 = np.asarray(simulate_1, dtype=bool)
+        use_settings = settings1 is not None or settings2 is not None
+        if use_settings:
+            settings1 = np.asarray(
+                0 if settings1 is None else settings1, dtype=np.intp)
+            settings2 = np.asarray(
+                0 if settings2 is None else settings2, dtype=np.intp)
+            shape = np.broadcast_shapes(
+                settings1.shape, settings2.shape, simulate_1.shape)
+            directions1 = directions1.reshape(-1, 2, 2)
+            directions2 = directions2.reshape(-1, 2, 2)
+            k2 = len(directions2)
+            # probabilities for every (setting1, setting2, first) combination
+            table = np.stack(self.MeasureProbabilities(
+                directions1[:, None, None], directions2[None, :, None],
+                np.array([False, True]), method), axis=-1).reshape(-1, 3)
+        else:
+            shape = np.broadcast_shapes(
+                directions1.shape[:-2], directions2.shape[:-2],
+                simulate_1.shape)
+        n = shape[0] if shape else 1
+        simulate_1 = np.broadcast_to(simulate_1, (n,))
+        sp1 = np.empty(n, dtype=np.int8)
+        sp2 = np.empty(n, dtype=np.int8)
+        chunk = 1 << 16
+        for start in range(0, n, chunk):
+            end = min(start + chunk, n)
+            first = simulate_1[start:end]
+            if use_settings:
+                s1 = np.broadcast_to(settings1, (n,))[start:end]
+                s2 = np.broadcast_to(settings2, (n,))[start:end]
+                idx = (s1 * k2 + s2) * 2 + first
+                prob_p11, prob_p12_p, prob_p12_m = table[idx].T
+            else:
+                prob_p11, prob_p12_p, prob_p12_m = self.MeasureProbabilities(
+                    np.broadcast_to(directions1, (n, 2, 2))[start:end],
+                    np.broadcast_to(directions2, (n, 2, 2))[start:end],
+                    first, method)
+            random_numbers = rng.random((2, end - start))
+            # Perform the measurement of the first system and then of the
+            # second one with the collapsed wave function
+            first_p1 = random_numbers[0] < prob_p11
+            second_p1 = random_numbers[1] < np.where(
+                first_p1, prob_p12_p, prob_p12_m)
+            res_i = np.where(first_p1, 1, -1).astype(np.int8)
+            res_j = np.where(second_p1, 1, -1).astype(np.int8)
+            sp1[start:end] = np.where(first, res_i, res_j)
+            sp2[start:end] = np.where(first, res_j, res_i)
+        return (sp1, sp2)
+
+
+class NSpin:
+    '''
+    State of n spins stored as a tensor of shape (2,) * n, axis k being
+    spin k, so that the memory is O(2^n): the local operators, the
+    measurements and the reduced density matrices act on single axes
+    with tensordot and einsum, without forming 2^n x 2^n matrices.
+    '''
+
+    def __init__(self, n: int, basis: str = 'ud'):
+        if n < 1:
+            raise ValueError("Incorrect number of spins " + str(n))
+        self.n = n
+        self.__basis = basis
+        self.__state = None
+        if (basis == 'ud'):
+            self.__u = np.array([1, 0], dtype=complex)
+            self.__d = np.array([0, 1], dtype=complex)
+            self.__smap = {
+                'z': np.array([[1, 0], [0, -1]], dtype=complex),
+                'x': np.array([[0, 1], [1, 0]], dtype=complex),
+                'y': np.array([[0, -1j], [1j, 0]], dtype=complex),
+                'I': np.eye(2, dtype=complex)}
+        else:
+            raise NotImplementedError(
+                "Basis " + basis + "not Implemented")
+
+    @property
+    def psi(self):
+        return self.__state
+
+    @psi.setter
+    def psi(self, value):
+        value = np.asarray(value, dtype=complex)
+        # check that length is unitary
+        assert math.isclose(np.linalg.norm(value), 1)
+        self.__state = value.reshape((2,) * self.n)
+
+    def BasisVector(self, s: str):
+        '''
+        Return the basis state of the string s of 'u' and 'd', one per
+        spin, as a tensor.
+        '''
+        if len(s) != self.n or set(s) - {'u', 'd'}:
+            raise ValueError("Incorrect basis vector " + s)
+        v = np.zeros((2,) * self.n, dtype=complex)
+        v[tuple(0 if c == 'u' else 1 for c in s)] = 1
+        return v
+
+    def ProductState(self, *spinors: np.ndarray):
+        if len(spinors) != self.n:
+            raise ValueError("Incorrect number of spinors")
+        psi = np.ones((), dtype=complex)
+        for spinor in spinors:
+            spinor = np.asarray(spinor, dtype=complex).reshape(2)
+            # check that length is unitary
+            assert math.isclose(np.linalg.norm(spinor), 1)
+            psi = np.multiply.outer(psi, spinor)
+        self.psi = psi
+
+    def GHZ(self):
+        self.psi = 1 / np.sqrt(2) * (
+            self.BasisVector('u' * self.n) + self.BasisVector('d' * self.n))
+
+    def W(self):
+        # equal superposition of the states with a single spin down
+        psi = np.zeros((2,) * self.n, dtype=complex)
+        for k in range(self.n):
+            index = [0] * self.n
+            index[k] = 1
+            psi[tuple(index)] = 1 / np.sqrt(self.n)
+        self.psi = psi
+
+    def __Axis(self, psi: np.ndarray, k: int):
+        # view of psi as (spins before k, spin k, spins after k)
+        if not 0 <= k < self.n:
+            raise ValueError("Incorrect spin " + str(k))
+        return psi.reshape(2 ** k, 2, -1)
+
+    def ApplyLocal(self, operator: np.ndarray, k: int):
+        '''
+        Apply the 2x2 unitary operator (or 'x', 'y', 'z', 'I') to spin k,
+        psi is updated in place as by Measure with update and
+        MPS.ApplyLocal.
+        '''
+        if isinstance(operator, str):
+            operator = self.__smap[operator]
+        m = self.__Axis(self.__state, k)
+        self.__state = np.matmul(operator, m).reshape((2,) * self.n)
+
+    def ReducedDensityMatrix(self, spins):
+        '''
+        Return the reduced density matrix of the spins (an index or a
+        sequence of indices, in the order of the returned matrix),
+        tracing out the others, shape (2^k, 2^k).
+        '''
+        spins = [spins] if np.isscalar(spins) else list(spins)
+        k = len(spins)
+        # rows are the spins kept, columns the ones traced out
+        m = np.moveaxis(self.__state, spins, range(k)).reshape(2 ** k, -1)
+        return m @ m.conj().T
+
+    def Expectation(self, operators: dict):
+        '''
+        Return < psi | O_k1 ... O_kj | psi > for the 2x2 operators (or
+        'x', 'y', 'z', 'I') of the dictionary {spin: operator}.
+        '''
+        # apply the operators one axis at a time, O(j 2^n)
+        result = self.__state
+        for k, operator in operators.items():
+            if isinstance(operator, str):
+                operator = self.__smap[operator]
+            m = self.__Axis(result, k)
+            result = np.matmul(operator, m).reshape((2,) * self.n)
+        return np.vdot(self.__state, result)
+
+    def PauliExpectations(self, strings):
+        '''
+        Return the expectations of the Pauli strings of n characters,
+        see pauli_expectations.
+        '''
+        return pauli_expectations(self.__state, strings)
+
+    def Measure(self, k: int, directions: np.ndarray, update: bool = False,
+                rng: np.random.Generator = None):
+        '''
+        Perform the measurement of spin k along the [+1, -1] pair of
+        directions, return the outcome. With update the state collapses
+        on it, so that measurements of several spins can follow.
+        '''
+        if rng is None:
+            rng = generator()
+        directions = np.asarray(directions, dtype=complex)
+        m = self.__Axis(self.__state, k)
+        # amplitudes of the other spins for each outcome of spin k
+        amplitudes = np.matmul(directions.conj(), m)
+        prob_p1 = np.vdot(amplitudes[:, 0], amplitudes[:, 0]).real
+        sp = 1 if rng.random() < prob_p1 else -1
+        if update:
+            i = 0 if sp == 1 else 1
+            prob = prob_p1 if sp == 1 else 1 - prob_p1
+            collapsed = directions[i][None, :, None] * \
+                amplitudes[:, i][:, None] / np.sqrt(prob)
+            self.__state = collapsed.reshape((2,) * self.n)
+        return sp
+
+    def MeasureProbabilities(self, directions: np.ndarray):
+        '''
+        Return the joint probabilities p[i_0, ..., i_n-1] of the outcomes
+        of all the spins measured along the [+1, -1] pairs of directions,
+        shape (n, 2, 2) or (2, 2) for all of them, where index 0 is "+1"
+        and index 1 is "-1".
+        '''
+        directions = np.broadcast_to(
+            np.asarray(directions, dtype=complex), (self.n, 2, 2))
+        psi = self.__state
+        for k in range(self.n):
+            psi = np.matmul(directions[k].conj(), self.__Axis(psi, k))
+        psi = psi.reshape((2,) * self.n)
+        return psi.real ** 2 + psi.imag ** 2
+
+    def MeasureBatch(self, directions: np.ndarray, shots: int,
+                     rng: np.random.Generator = None):
+        '''
+        Perform shots measurements of all the spins along the [+1, -1]
+        pairs of directions (see MeasureProbabilities), return the
+        outcomes as an int8 array of shape (shots, n).
+        '''
+        if rng is None:
+            rng = generator()
+        p = self.MeasureProbabilities(directions).reshape(-1)
+        cells = rng.choice(len(p), size=shots, p=p / p.sum())
+        bits = (cells[:, None] >> np.arange(self.n - 1, -1, -1)) & 1
+        return (1 - 2 * bits).astype(np.int8)
+
+
+def tridiagonal_matvec(bands: np.ndarray, v: np.ndarray):
+    '''
+    Return A v for the tridiagonal matrix A stored as bands of shape
+    (3, d) in the LAPACK banded layout: bands[0, 1:] the superdiagonal
+    A[k, k + 1], bands[1] the diagonal and bands[2, :-1] the subdiagonal
+    A[k + 1, k]. v has shape (d,) or (d, m).
+    '''
+    if v.ndim == 2:
+        bands = bands[..., None]
+    result = bands[1] * v
+    result[:-1] += bands[0, 1:] * v[1:]
+    result[1:] += bands[2, :-1] * v[:-1]
+    return result
+
+
+def _bessel_j(order: int, x: float):
+    # Bessel functions J_0(x) ... J_order(x), x > 0, with Miller's
+    # backward recurrence J_k-1 = 2k / x J_k - J_k+1 started well above
+    # the largest order, normalized by J_0 + 2 sum J_2k = 1
+    start = order + int(np.sqrt(40 * order)) + 20
+    j = np.zeros(start + 2)
+    j[start] = 1e-300
+    for k in range(start, 0, -1):
+        j[k - 1] = 2 * k / x * j[k] - j[k + 1]
+        if abs(j[k - 1]) > 1e250:
+            j[k - 1:] *= 1e-250
+    return j[:order + 1] / (j[0] + 2 * j[2::2].sum())
+
+
+def _chebyshev_expm(bands: np.ndarray, radius: float, t: float,
+                    v: np.ndarray):
+    # exp(-i t A) v for the hermitian tridiagonal A with spectrum in
+    # [-radius, radius], expanded in the Chebyshev polynomials T_k of
+    # A / radius with coefficients (-i)^k J_k(t radius): about t radius
+    # products, each O(d)
+    tau = abs(t) * radius
+    if tau == 0:
+        return v.copy()
+    if t < 0:
+        bands = -bands
+    bands = bands / radius
+    order = int(tau + 10 * tau ** (1 / 3) + 20)
+    coefficients = _bessel_j(order, tau)
+    # the terms beyond tau vanish super-exponentially
+    significant = np.flatnonzero(np.abs(coefficients) > 1e-17)
+    order = max(significant[-1], 1)
+    previous = v
+    current = tridiagonal_matvec(bands, v)
+    result = coefficients[0] * previous - 2j * coefficients[1] * current
+    phase = -1j
+    for k in range(2, order + 1):
+        previous, current = current, 2 * tridiagonal_matvec(
+            bands, current) - previous
+        phase *= -1j
+        result += 2 * phase * coefficients[k] * current
+    return result
+
+
+class SymmetricSpin:
+    '''
+    State of n identical spins in the permutation-symmetric (Dicke)
+    subspace, spin j = n / 2, stored with its n + 1 amplitudes on the
+    Dicke states | j, m >, index k = j - m being the number of spins
+    down (index 0 all spins up as in NSpin). The collective operators
+    Jx, Jy, Jz are tridiagonal and kept as bands (see
+    tridiagonal_matvec), so states and measurements cost O(n) memory
+    and GHZ, Dicke, coherent and squeezed states of 10^4 spins can be
+    simulated.
+    '''
+
+    def __init__(self, n: int):
+        if n < 1:
+            raise ValueError("Incorrect number of spins " + str(n))
+        self.n = n
+        self.j = n / 2
+        k = np.arange(n + 1)
+        self.m = self.j - k
+        # J+ | j, m > = sqrt(j (j + 1) - m (m + 1)) | j, m + 1 >, from
+        # index k to index k - 1
+        raising = np.sqrt(self.j * (self.j + 1) - self.m * (self.m + 1))
+        zero = np.zeros(n + 1)
+        self.Jx = np.stack([raising / 2, zero, np.roll(raising, -1) / 2])
+        self.Jy = np.stack([-0.5j * raising, zero,
+                            0.5j * np.roll(raising, -1)])
+        self.Jz = np.stack([zero, self.m, zero])
+        self.__state = None
+
+    @property
+    def psi(self):
+        return self.__state
+
+    @psi.setter
+    def psi(self, value):
+        value = np.asarray(value, dtype=complex).reshape(-1)
+        if len(value) != self.n + 1:
+            raise ValueError("Incorrect state size " + str(len(value)))
+        # check that length is unitary
+        assert math.isclose(np.linalg.norm(value), 1)
+        self.__state = value
+
+    def J(self, theta: float, phi: float):
+        '''
+        Return the bands of the collective spin along the direction of
+        the Bloch sphere angles theta and phi (radians).
+        '''
+        return np.sin(theta) * np.cos(phi) * self.Jx + \
+            np.sin(theta) * np.sin(phi) * self.Jy + np.cos(theta) * self.Jz
+
+    def Dicke(self, k: int):
+        '''
+        Set the Dicke state with k spins down, the equal superposition of
+        the product states with k spins down.
+        '''
+        if not 0 <= k <= self.n:
+            raise ValueError("Incorrect number of spins down " + str(k))
+        psi = np.zeros(self.n + 1, dtype=complex)
+        psi[k] = 1
+        self.psi = psi
+
+    def GHZ(self):
+        psi = np.zeros(self.n + 1, dtype=complex)
+        psi[0] = psi[-1] = 1 / np.sqrt(2)
+        self.psi = psi
+
+    def CoherentState(self, theta: float, phi: float):
+        '''
+        Set all the spins along the direction of the Bloch sphere angles
+        theta and phi, the product state of the spinor
+        (cos(theta / 2), exp(i phi) sin(theta / 2)).
+        '''
+        n = self.n
+        k = np.arange(n + 1)
+        # binomial amplitudes in logarithms, as they under and overflow
+        log_binomial = np.array([
+            math.lgamma(n + 1) - math.lgamma(i + 1) - math.lgamma(n - i + 1)
+            for i in k])
+        with np.errstate(divide='ignore'):
+            log_amplitude = log_binomial / 2 + \
+                (n - k) * np.log(abs(np.cos(theta / 2))) + \
+                k * np.log(abs(np.sin(theta / 2)))
+        signs = np.sign(np.cos(theta / 2)) ** (n - k) * \
+            np.sign(np.sin(theta / 2)) ** k
+        psi = signs * np.exp(log_amplitude + 1j * phi * k)
+        self.psi = psi / np.linalg.norm(psi)
+
+    def OneAxisTwisting(self, mu: float):
+        '''
+        Apply exp(-i mu Jz^2 / 2) to the state, which squeezes a coherent
+        state in the xy plane (Kitagawa and Ueda).
+        '''
+        self.psi = np.exp(-0.5j * mu * self.m ** 2) * self.__state
+
+    def __Operator(self, operator):
+        if isinstance(operator, str):
+            if operator not in ('x', 'y', 'z'):
+                raise ValueError("Incorrect operator " + operator)
+            return getattr(self, 'J' + operator)
+        return np.asarray(operator)
+
+    def Expectation(self, operator):
+        '''
+        Return < psi | O | psi > of the collective operator O, 'x', 'y',
+        'z' or the bands of a tridiagonal operator, e.g. J(theta, phi).
+        '''
+        bands = self.__Operator(operator)
+        return np.vdot(self.__state,
+                       tridiagonal_matvec(bands, self.__state)).real
+
+    def Variance(self, operator):
+        '''
+        Return the variance < O^2 > - < O >^2 of the collective operator
+        O, see Expectation.
+        '''
+        v = tridiagonal_matvec(self.__Operator(operator), self.__state)
+        mean = np.vdot(self.__state, v).real
+        return np.vdot(v, v).real - mean ** 2
+
+    def __Rotate(self, psi: np.ndarray, theta: float, phi: float,
+                 inverse: bool):
+        # R = exp(-i phi Jz) exp(-i theta Jy) turns z on the direction
+        # theta, phi: return R psi or, with inverse, R^dagger psi
+        phases = np.exp(-1j * phi * self.m)
+        if inverse:
+            psi = phases.conj() * psi
+            return _chebyshev_expm(self.Jy, self.j, -theta, psi)
+        return phases * _chebyshev_expm(self.Jy, self.j, theta, psi)
+
+    def MeasureProbabilities(self, theta: float, phi: float,
+                             bloch_t: float = 1.0, bloch_p: float = 1.0):
+        '''
+        Return the probabilities of the outcomes of the collective
+        measurement of the spins along the apparatus angles theta and phi
+        (radians, converted into Bloch sphere angles by bloch_t and
+        bloch_p as in measurement_directions), index k being the outcome
+        n - 2k, the sum of the +1 / -1 outcomes of all the spins, i.e.
+        2m along the direction.
+        '''
+        rotated = self.__Rotate(self.__state, theta * bloch_t,
+                                phi * bloch_p, True)
+        p = rotated.real ** 2 + rotated.imag ** 2
+        return p / p.sum()
+
+    def Measure(self, theta: float, phi: float, update: bool = False,
+                rng: np.random.Generator = None, bloch_t: float = 1.0,
+                bloch_p: float = 1.0):
+        '''
+        Perform the collective measurement along theta and phi (see
+        MeasureProbabilities), return the outcome n - 2k. With update the
+        state collapses on the Dicke state of the direction.
+        '''
+        if rng is None:
+            rng = generator()
+        p = self.MeasureProbabilities(theta, phi, bloch_t, bloch_p)
+        k = rng.choice(len(p), p=p)
+        if update:
+            basis = np.zeros(self.n + 1, dtype=complex)
+            basis[k] = 1
+            psi = self.__Rotate(basis, theta * bloch_t, phi * bloch_p,
+                                False)
+            self.psi = psi / np.linalg.norm(psi)
+        return self.n - 2 * k
+
+    def MeasureBatch(self, theta: float, phi: float, shots: int,
+                     rng: np.random.Generator = None, bloch_t: float = 1.0,
+                     bloch_p: float = 1.0):
+        '''
+        Perform shots collective measurements along theta and phi of
+        copies of the state, return the outcomes n - 2k as an int64
+        array.
+        '''
+        if rng is None:
+            rng = generator()
+        p = self.MeasureProbabilities(theta, phi, bloch_t, bloch_p)
+        return self.n - 2 * rng.choice(len(p), size=shots, p=p)
+
+    def ToStateVector(self):
+        '''
+        Return the state as a tensor of shape (2,) * n for NSpin, O(2^n).
+        '''
+        index = np.arange(2 ** self.n)
+        down = np.zeros(len(index), dtype=np.intp)
+        for shift in range(self.n):
+            down += (index >> shift) & 1
+        counts = np.array([math.comb(self.n, k) for k in range(self.n + 1)])
+        psi = self.__state[down] / np.sqrt(counts[down])
+        return psi.reshape((2,) * self.n)
+
 
 if __name__ == '__main__':
     if sys.version_info[0] < 3:
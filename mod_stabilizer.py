@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+'''
+/************************/
+/*    mod_stabilizer    */
+/*      Version 1.0     */
+/*      2026/10/17      */
+/************************/
+'''
+from mod_rng import generator
+from mod_spin_operators import NSpin, apply_pauli, bloch_vector
+import numpy as np
+import sys
+
+_ONE = np.uint64(1)
+# largest number of spins whose state vector is built, O(2^n) memory
+STATE_VECTOR_SPINS = 20
+
+
+def _popcount_rows(words: np.ndarray):
+    # number of set bits of every row of the uint64 array words
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    return np.unpackbits(
+        words.view(np.uint8), axis=-1).sum(axis=-1, dtype=np.int64)
+
+
+def _bits(words: np.ndarray, n: int):
+    # rows of the uint64 words unpacked in n bits, bit a of word a >> 6
+    # being column a
+    return np.unpackbits(words.view(np.uint8), axis=-1,
+                         bitorder='little')[:, :n]
+
+
+def _product(x1: np.ndarray, z1: np.ndarray, r1: np.ndarray,
+             x2: np.ndarray, z2: np.ndarray, r2: np.ndarray):
+    # product P1 P2 of the bit-packed Pauli rows (x, z, sign bit r), for
+    # every row at once. Each position contributes a factor i or -i when
+    # the two Paulis anticommute there; for commuting rows the total is
+    # a sign, for anticommuting ones the sign is not meaningful.
+    x = x1 ^ x2
+    z = z1 ^ z2
+    x1z2 = x1 & z2
+    anticommute = (x2 & z1) ^ x1z2
+    minus_i = (x ^ z ^ x1z2) & anticommute
+    log_i = _popcount_rows(anticommute) + 2 * _popcount_rows(minus_i)
+    log_i += 2 * (r1.astype(np.int64) + r2)
+    return x, z, ((log_i & 3) >> 1).astype(np.uint8)
+
+
+class Stabilizer:
+    '''
+    Stabilizer state of n spins in the tableau representation of
+    Aaronson and Gottesman (CHP): n destabilizer and n stabilizer
+    generators, Pauli strings stored as x and z bits packed in uint64
+    words, plus a sign bit. Clifford gates cost O(n) and a measurement
+    along x, y or z at most O(n^2 / 64), so states of thousands of spins
+    can be sampled. "u" is the +1 eigenstate of z as in TwoSpin.
+    '''
+
+    def __init__(self, n: int):
+        if n < 1:
+            raise ValueError("Incorrect number of spins " + str(n))
+        self.n = n
+        words = (n + 63) // 64
+        # rows 0..n-1 destabilizers, rows n..2n-1 stabilizers
+        self.xs = np.zeros((2 * n, words), dtype=np.uint64)
+        self.zs = np.zeros((2 * n, words), dtype=np.uint64)
+        self.r = np.zeros(2 * n, dtype=np.uint8)
+        # all spins up: destabilizers X_a and stabilizers Z_a
+        a = np.arange(n)
+        bits = _ONE << (a & 63).astype(np.uint64)
+        self.xs[a, a >> 6] = bits
+        self.zs[n + a, a >> 6] = bits
+
+    def Copy(self):
+        state = Stabilizer.__new__(Stabilizer)
+        state.n = self.n
+        state.xs = self.xs.copy()
+        state.zs = self.zs.copy()
+        state.r = self.r.copy()
+        return state
+
+    def __Column(self, words: np.ndarray, a: int):
+        # bits of spin a of every row as booleans
+        if not 0 <= a < self.n:
+            raise ValueError("Incorrect spin " + str(a))
+        return (words[:, a >> 6] >> np.uint64(a & 63)) & _ONE != 0
+
+    def __Flip(self, words: np.ndarray, a: int, rows: np.ndarray):
+        words[:, a >> 6] ^= np.where(rows, _ONE << np.uint64(a & 63),
+                                     np.uint64(0))
+
+    def H(self, a: int):
+        x = self.__Column(self.xs, a)
+        z = self.__Column(self.zs, a)
+        self.r ^= x & z
+        self.__Flip(self.xs, a, x ^ z)
+        self.__Flip(self.zs, a, x ^ z)
+
+    def S(self, a: int):
+        x = self.__Column(self.xs, a)
+        z = self.__Column(self.zs, a)
+        self.r ^= x & z
+        self.__Flip(self.zs, a, x)
+
+    def Sdg(self, a: int):
+        for _ in range(3):
+            self.S(a)
+
+    def X(self, a: int):
+        self.r ^= self.__Column(self.zs, a)
+
+    def Y(self, a: int):
+        self.r ^= self.__Column(self.xs, a) ^ self.__Column(self.zs, a)
+
+    def Z(self, a: int):
+        self.r ^= self.__Column(self.xs, a)
+
+    def CNOT(self, a: int, b: int):
+        if a == b:
+            raise ValueError("Incorrect CNOT on spin " + str(a))
+        xa = self.__Column(self.xs, a)
+        za = self.__Column(self.zs, a)
+        xb = self.__Column(self.xs, b)
+        zb = self.__Column(self.zs, b)
+        self.r ^= xa & zb & ~(xb ^ za)
+        self.__Flip(self.xs, b, xa)
+        self.__Flip(self.zs, a, zb)
+
+    def CZ(self, a: int, b: int):
+        self.H(b)
+        self.CNOT(a, b)
+        self.H(b)
+
+    def Singlet(self, a: int = 0, b: int = 1):
+        '''
+        Set spins a and b, which must be up, in the singlet state
+        1 / sqrt(2) * (| ud > - | du >).
+        '''
+        self.Triplet(1, a, b)
+        self.Z(a)
+
+    def Triplet(self, i: int, a: int = 0, b: int = 1):
+        '''
+        Set spins a and b, which must be up, in the triplet state i of
+        TwoSpin.Triplet.
+        '''
+        self.H(a)
+        self.CNOT(a, b)
+        match i:
+            case 1:
+                self.X(b)
+            case 2:
+                pass
+            case 3:
+                self.Z(a)
+            case _:
+                raise ValueError("Incorrect index " + str(i))
+
+    def GHZ(self):
+        '''
+        Set the spins, which must be up, in the GHZ state
+        1 / sqrt(2) * (| u...u > + | d...d >).
+        '''
+        self.H(0)
+        for a in range(1, self.n):
+            self.CNOT(a - 1, a)
+
+    def Cluster(self):
+        '''
+        Set the spins, which must be up, in the linear cluster state.
+        '''
+        for a in range(self.n):
+            self.H(a)
+        for a in range(1, self.n):
+            self.CZ(a - 1, a)
+
+    def __MeasureZ(self, a: int, rng: np.random.Generator):
+        n = self.n
+        x = self.__Column(self.xs, a)
+        anticommuting = np.flatnonzero(x[n:])
+        if anticommuting.size:
+            # random outcome: the first anticommuting stabilizer p is
+            # replaced by +-Z_a, the other rows anticommuting with Z_a
+            # are multiplied by it
+            p = n + anticommuting[0]
+            rows = np.flatnonzero(x)
+            rows = rows[rows != p]
+            self.xs[rows], self.zs[rows], self.r[rows] = _product(
+                self.xs[rows], self.zs[rows], self.r[rows],
+                self.xs[p], self.zs[p], self.r[p])
+            self.xs[p - n] = self.xs[p]
+            self.zs[p - n] = self.zs[p]
+            self.r[p - n] = self.r[p]
+            self.xs[p] = 0
+            self.zs[p] = 0
+            self.zs[p, a >> 6] = _ONE << np.uint64(a & 63)
+            self.r[p] = rng.integers(2)
+            return 1 - 2 * int(self.r[p])
+        # deterministic outcome: +-Z_a is the product of the stabilizers
+        # paired with the destabilizers anticommuting with it, reduced
+        # pairwise
+        rows = n + np.flatnonzero(x[:n])
+        xs, zs, r = self.xs[rows], self.zs[rows], self.r[rows]
+        while len(r) > 1:
+            half = len(r) // 2
+            px, pz, pr = _product(xs[:half], zs[:half], r[:half],
+                                  xs[half:2 * half], zs[half:2 * half],
+                                  r[half:2 * half])
+            xs = np.concatenate([px, xs[2 * half:]])
+            zs = np.concatenate([pz, zs[2 * half:]])
+            r = np.concatenate([pr, r[2 * half:]])
+        return 1 - 2 * int(r[0])
+
+    def Measure(self, a: int, basis: str = 'z',
+                rng: np.random.Generator = None):
+        '''
+        Perform the measurement of spin a along 'x', 'y' or 'z', return
+        the outcome. The state collapses on it.
+        '''
+        if rng is None:
+            rng = generator()
+        match basis:
+            case 'z':
+                return self.__MeasureZ(a, rng)
+            case 'x':
+                self.H(a)
+                sp = self.__MeasureZ(a, rng)
+                self.H(a)
+            case 'y':
+                self.Sdg(a)
+                self.H(a)
+                sp = self.__MeasureZ(a, rng)
+                self.H(a)
+                self.S(a)
+            case _:
+                raise ValueError("Incorrect basis " + basis)
+        return sp
+
+    def MeasureBases(self, bases: str, shots: int,
+                     rng: np.random.Generator = None):
+        '''
+        Perform shots measurements of all the spins along the bases, a
+        string of 'x', 'y', 'z' with one character per spin or a single
+        one for all of them, return the outcomes as an int8 array of
+        shape (shots, n). The state is not modified. The space of the
+        outcomes is computed once, O(n^3 / 64), then each shot costs
+        O(n^2) at most.
+        '''
+        if rng is None:
+            rng = generator()
+        if len(bases) == 1:
+            bases = bases * self.n
+        if len(bases) != self.n:
+            raise ValueError("Incorrect bases " + bases)
+        # rotate the bases on z once, then every shot measures z
+        rotated = self.Copy()
+        for a, basis in enumerate(bases):
+            match basis:
+                case 'z':
+                    pass
+                case 'x':
+                    rotated.H(a)
+                case 'y':
+                    rotated.Sdg(a)
+                    rotated.H(a)
+                case _:
+                    raise ValueError("Incorrect basis " + basis)
+        # the outcomes are uniform on an affine space: each shot is the
+        # particular outcome plus a random combination of its basis
+        particular, basis = rotated.__OutcomeSpace()
+        basis = basis.astype(np.float32)
+        result = np.empty((shots, self.n), dtype=np.int8)
+        chunk = 1 << 10
+        for start in range(0, shots, chunk):
+            end = min(start + chunk, shots)
+            random_bits = rng.integers(
+                2, size=(end - start, len(basis))).astype(np.float32)
+            bits = (random_bits @ basis).astype(np.int64) + particular
+            result[start:end] = 1 - 2 * (bits & 1)
+        return result
+
+    def __OutcomeSpace(self):
+        # outcomes of the measurement of all the spins along z, as bits b
+        # (1 for -1): they are uniform on the solutions of z . b = r for
+        # the stabilizers +-Z^z without x part. Return a particular
+        # solution and a basis of the homogeneous ones, shape (k, n),
+        # k being the number of random outcomes. O(n^3 / 64) once.
+        n = self.n
+        xs, zs, r = self.xs[n:].copy(), self.zs[n:].copy(), self.r[n:].copy()
+        # Gaussian elimination of the x parts, multiplying the stabilizers
+        row = 0
+        for a in range(n):
+            x = self.__Column(xs, a)
+            candidates = np.flatnonzero(x[row:])
+            if not candidates.size:
+                continue
+            p = row + candidates[0]
+            for words in (xs, zs, r):
+                words[[row, p]] = words[[p, row]]
+            x[[row, p]] = x[[p, row]]
+            rows = np.flatnonzero(x)
+            rows = rows[rows != row]
+            xs[rows], zs[rows], r[rows] = _product(
+                xs[rows], zs[rows], r[rows], xs[row], zs[row], r[row])
+            row += 1
+        # the remaining rows are z strings, reduced to row echelon form
+        # of z . b = r over GF(2)
+        zs, r = zs[row:], r[row:]
+        pivots = []
+        for a in range(n):
+            z = self.__Column(zs, a)
+            candidates = np.flatnonzero(z[len(pivots):])
+            if not candidates.size:
+                continue
+            top = len(pivots)
+            p = top + candidates[0]
+            zs[[top, p]] = zs[[p, top]]
+            r[[top, p]] = r[[p, top]]
+            z[[top, p]] = z[[p, top]]
+            rows = np.flatnonzero(z)
+            rows = rows[rows != top]
+            zs[rows] ^= zs[top]
+            r[rows] ^= r[top]
+            pivots.append(a)
+        free = np.setdiff1d(np.arange(n), pivots)
+        particular = np.zeros(n, dtype=np.int64)
+        particular[pivots] = r[:len(pivots)]
+        # one solution per free bit set, fixing the pivot bits
+        basis = np.zeros((len(free), n), dtype=np.uint8)
+        basis[np.arange(len(free)), free] = 1
+        basis[:, pivots] = _bits(zs[:len(pivots)], n)[:, free].T
+        return particular, basis
+
+    def Stabilizers(self):
+        '''
+        Return the stabilizer generators as signed Pauli strings, e.g.
+        '+xx', '-zz'.
+        '''
+        n = self.n
+        x = np.stack([self.__Column(self.xs[n:], a) for a in range(n)], 1)
+        z = np.stack([self.__Column(self.zs[n:], a) for a in range(n)], 1)
+        letters = np.array(['I', 'x', 'z', 'y'])[x + 2 * z]
+        return [('-' if r else '+') + ''.join(row)
+                for r, row in zip(self.r[n:], letters)]
+
+    def ToStateVector(self):
+        '''
+        Return the state vector, shape (2,) * n, as the projection of a
+        random vector on the stabilized subspace, O(n 2^n). Its global
+        phase makes the largest amplitude real and positive. Only for
+        at most STATE_VECTOR_SPINS spins.
+        '''
+        if self.n > STATE_VECTOR_SPINS:
+            raise ValueError(
+                f"Incorrect state vector of {self.n} spins, at most "
+                f"{STATE_VECTOR_SPINS} are supported")
+        rng = np.random.default_rng(0)
+        psi = rng.standard_normal(2 ** self.n) + 0j
+        for string in self.Stabilizers():
+            sign = -1 if string[0] == '-' else 1
+            psi = (psi + sign * apply_pauli(psi, string[1:])) / 2
+        psi /= np.linalg.norm(psi)
+        largest = psi[np.argmax(np.abs(psi))]
+        psi *= abs(largest) / largest
+        return psi.reshape((2,) * self.n)
+
+    def MeasureBatch(self, directions: np.ndarray, shots: int,
+                     rng: np.random.Generator = None):
+        '''
+        Perform shots measurements of all the spins along the [+1, -1]
+        pairs of directions, as NSpin.MeasureBatch. Directions along
+        the x, y, z axes are sampled with the tableau, any other one,
+        like the 120° settings of the EPR experiment, is not a Clifford
+        measurement and falls back to the state vector of NSpin, for at
+        most STATE_VECTOR_SPINS spins.
+        '''
+        if rng is None:
+            rng = generator()
+        directions = np.broadcast_to(
+            np.asarray(directions, dtype=complex), (self.n, 2, 2))
+        vectors = bloch_vector(directions[:, 0])
+        axes = np.argmax(np.abs(vectors), axis=1)
+        components = vectors[np.arange(self.n), axes]
+        if not np.allclose(np.abs(components), 1):
+            if self.n > STATE_VECTOR_SPINS:
+                raise ValueError(
+                    "Incorrect directions not along x, y or z for "
+                    f"{self.n} spins: the non-Clifford measurement falls "
+                    f"back to the state vector, limited to "
+                    f"{STATE_VECTOR_SPINS} spins")
+            state = NSpin(self.n)
+            state.psi = self.ToStateVector()
+            return state.MeasureBatch(directions, shots, rng)
+        bases = ''.join('xyz'[axis] for axis in axes)
+        # a direction along -x, -y or -z inverts the outcome
+        signs = np.where(components > 0, 1, -1).astype(np.int8)
+        return self.MeasureBases(bases, shots, rng) * signs
+
+
+if __name__ == '__main__':
+    if sys.version_info[0] < 3:
+        raise RuntimeError('Must be using Python 3')
+    pass
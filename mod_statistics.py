@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+'''
+/************************/
+/*    mod_statistics    */
+/*      Version 1.0     */
+/*      2026/10/17      */
+/************************/
+'''
+import numpy as np
+from statistics import NormalDist
+import sys
+from types import SimpleNamespace
+import warnings
+
+# Number of resamples drawn from each independent stream of bootstrap, so
+# that the intervals do not depend on how the blocks are distributed
+BOOTSTRAP_BLOCK = 256
+
+
+class RunningCorrelation:
+    '''
+    Streaming means, variances and covariance of two paired variables
+    (Welford update, merged per batch with Chan's formula), so that
+    their correlation is available in O(1) without storing the samples.
+    '''
+
+    def __init__(self):
+        self.n = 0
+        self.mean = np.zeros(2)
+        # sums of the squared deviations and co-moment
+        self.m2 = np.zeros(2)
+        self.cm = 0.0
+
+    def update(self, a, b):
+        x = np.stack([np.atleast_1d(a), np.atleast_1d(b)]).astype(float)
+        n_b = x.shape[1]
+        if n_b == 0:
+            return
+        mean_b = x.mean(axis=1)
+        d = x - mean_b[:, None]
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        weight = self.n * n_b / n
+        self.mean = self.mean + delta * n_b / n
+        self.m2 = self.m2 + np.sum(d ** 2, axis=1) + delta ** 2 * weight
+        self.cm += np.sum(d[0] * d[1]) + delta[0] * delta[1] * weight
+        self.n = n
+
+    def variance(self):
+        return self.m2 / self.n if self.n > 0 else np.full(2, np.nan)
+
+    def covariance(self):
+        return self.cm / self.n if self.n > 0 else np.nan
+
+    def correlation(self):
+        # as np.corrcoef, nan if either variable is constant
+        den = np.sqrt(self.m2[0] * self.m2[1])
+        return self.cm / den if den > 0 else np.nan
+
+
+class SequentialRule:
+    '''
+    Stopping rule of a run checked on a statistic at growing numbers of
+    shots (looks): stop when its confidence interval is narrower than
+    width, or when it is at least sigma standard errors away from bound.
+    The error probability of look i is 2^-(i+1) of the total one, so
+    that the level holds for the whole run despite the repeated looks.
+    '''
+
+    def __init__(self, width: float = None, sigma: float = None,
+                 bound: float = None, level: float = 0.95):
+        if width is None and sigma is None:
+            raise ValueError("Incorrect rule without width and sigma")
+        if sigma is not None and bound is None:
+            raise ValueError("Incorrect rule with sigma and no bound")
+        self.width = width
+        self.sigma = sigma
+        self.bound = bound
+        self.level = level
+
+    def threshold(self, alpha: float, look: int):
+        '''
+        Return the number of standard errors of a two sided test with
+        error probability alpha at look.
+        '''
+        return NormalDist().inv_cdf(1 - alpha / 2 ** (look + 2))
+
+    def stop(self, value: float, stderr: float, look: int):
+        if not np.isfinite(value) or not np.isfinite(stderr):
+            return False
+        if self.width is not None:
+            z = self.threshold(1 - self.level, look)
+            if 2 * z * stderr < self.width:
+                return True
+        if self.sigma is not None:
+            alpha = 2 * (1 - NormalDist().cdf(self.sigma))
+            z = self.threshold(alpha, look)
+            if abs(value - self.bound) >= z * stderr:
+                return True
+        return False
+
+
+def normal_interval(value, stderr, level: float = 0.95):
+    '''
+    Return the bounds of the normal confidence interval with the given
+    level around value.
+    '''
+    z = NormalDist().inv_cdf((1 + level) / 2)
+    return value - z * stderr, value + z * stderr
+
+
+def proportion_stderr(k, n):
+    '''
+    Return the proportions k / n and their analytic (binomial) standard
+    errors, nan where n is zero.
+    '''
+    k = np.asarray(k, dtype=float)
+    n = np.asarray(n, dtype=float)
+    p = np.divide(k, n, out=np.full(np.broadcast(k, n).shape, np.nan),
+                  where=n > 0)
+    return p, np.sqrt(p * (1 - p) / np.where(n > 0, n, np.nan))
+
+
+def _bootstrap_block(counts: np.ndarray, statistic, size: int,
+                     seed_seq: np.random.SeedSequence):
+    rng = np.random.default_rng(seed_seq)
+    total = int(counts.sum())
+    resampled = rng.multinomial(total, counts.ravel() / total, size=size)
+    return statistic(resampled.reshape((size,) + counts.shape))
+
+
+def bootstrap(counts: np.ndarray, statistic, resamples: int = 1000,
+              level: float = 0.95, seed_seq: np.random.SeedSequence = None,
+              executor=None):
+    '''
+    Percentile bootstrap of statistic over the count table counts: the
+    table is resampled from the multinomial distribution of its
+    frequencies, so the cost depends on the number of cells and not on
+    the number of shots. statistic maps tables of shape (B, ...) to B
+    values (or B rows of values), nan values are ignored.
+    The resamples are drawn in blocks, each from its own stream spawned
+    from seed_seq, on executor (a concurrent.futures executor, a process
+    one needs a picklable statistic) if given.
+    Return the bounds of the interval with the given level and the
+    standard deviation of the resampled values.
+    '''
+    counts = np.asarray(counts)
+    if counts.sum() == 0:
+        nan = np.full(np.shape(statistic(counts[None])[0]), np.nan)
+        return SimpleNamespace(low=nan, high=nan, stderr=nan)
+    if seed_seq is None:
+        seed_seq = np.random.SeedSequence()
+    sizes = [min(BOOTSTRAP_BLOCK, resamples - start)
+             for start in range(0, resamples, BOOTSTRAP_BLOCK)]
+    args = [(counts, statistic, size, block_seed)
+            for size, block_seed in zip(sizes, seed_seq.spawn(len(sizes)))]
+    if executor is None:
+        blocks = [_bootstrap_block(*a) for a in args]
+    else:
+        blocks = list(executor.map(_bootstrap_block, *zip(*args)))
+    values = np.concatenate(blocks)
+    alpha = (1 - level) / 2
+    with warnings.catch_warnings():
+        # statistics undefined in every resample stay nan
+        warnings.simplefilter('ignore', RuntimeWarning)
+        low, high = np.nanquantile(values, [alpha, 1 - alpha], axis=0)
+        stderr = np.nanstd(values, axis=0)
+    return SimpleNamespace(low=low, high=high, stderr=stderr)
+
+
+if __name__ == '__main__':
+    if sys.version_info[0] < 3:
+        raise RuntimeError('Must be using Python 3')
+    pass
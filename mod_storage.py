@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+'''
+/************************/
+/*     mod_storage      */
+/*      Version 1.0     */
+/*      2026/10/17      */
+/************************/
+'''
+import numpy as np
+import os
+import sys
+
+# number of set bits of every uint8 value, used when np.bitwise_count
+# is not available (numpy < 2.0)
+_POPCOUNT = np.unpackbits(
+    np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
+
+def popcount(words: np.ndarray):
+    '''
+    Return the number of set bits of the uint8 array words.
+    '''
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(words).sum(dtype=np.int64))
+    return int(_POPCOUNT[words].sum(dtype=np.int64))
+
+
+class ShotBuffer:
+    '''
+    Growable buffer of the shots of the EPR experiment: switches and
+    outcomes of the two apparatus are stored as int8 in a preallocated
+    array whose capacity grows geometrically, so appending is amortized
+    O(1) per shot and the stored values are returned as views.
+    '''
+
+    def __init__(self, capacity: int = 1024):
+        self.__data = np.empty((4, max(capacity, 1)), dtype=np.int8)
+        self.__size = 0
+
+    def __len__(self):
+        return self.__size
+
+    @property
+    def capacity(self):
+        return self.__data.shape[1]
+
+    def reserve(self, capacity: int):
+        if capacity <= self.capacity:
+            return
+        data = np.empty(
+            (4, max(capacity, 2 * self.capacity)), dtype=np.int8)
+        data[:, :self.__size] = self.__data[:, :self.__size]
+        self.__data = data
+
+    def append(self, switches1: np.ndarray, switches2: np.ndarray,
+               measurements1: np.ndarray, measurements2: np.ndarray):
+        n = len(switches1)
+        self.reserve(self.__size + n)
+        end = self.__size + n
+        self.__data[0, self.__size:end] = switches1
+        self.__data[1, self.__size:end] = switches2
+        self.__data[2, self.__size:end] = measurements1
+        self.__data[3, self.__size:end] = measurements2
+        self.__size = end
+
+    def clear(self):
+        self.__size = 0
+
+    @property
+    def switches1(self):
+        return self.__data[0, :self.__size]
+
+    @property
+    def switches2(self):
+        return self.__data[1, :self.__size]
+
+    @property
+    def measurements1(self):
+        return self.__data[2, :self.__size]
+
+    @property
+    def measurements2(self):
+        return self.__data[3, :self.__size]
+
+
+class PackedShotBuffer:
+    '''
+    Bit-packed buffer of the shots of the EPR experiment: each switch
+    takes 2 bits and each outcome 1 bit per shot, stored as bit planes
+    of uint8 words (6 bits per shot instead of the 4 bytes of
+    ShotBuffer). The count table of the shots is computed with AND and
+    popcount directly on the packed words.
+    '''
+    # bit planes: low and high bit of the switches of apparatus 1 and 2,
+    # outcomes of apparatus 1 and 2 (set for "-1")
+    planes = 6
+
+    def __init__(self, capacity: int = 1024):
+        self.__data = np.zeros(
+            (self.planes, (max(capacity, 1) + 7) // 8), dtype=np.uint8)
+        self.__size = 0
+
+    def __len__(self):
+        return self.__size
+
+    @property
+    def capacity(self):
+        return self.__data.shape[1] * 8
+
+    @property
+    def nbytes(self):
+        return self.__data.nbytes
+
+    def reserve(self, capacity: int):
+        if capacity <= self.capacity:
+            return
+        data = np.zeros((self.planes, (max(
+            capacity, 2 * self.capacity) + 7) // 8), dtype=np.uint8)
+        data[:, :self.__words] = self.__data[:, :self.__words]
+        self.__data = data
+
+    @property
+    def __words(self):
+        return (self.__size + 7) // 8
+
+    def append(self, switches1: np.ndarray, switches2: np.ndarray,
+               measurements1: np.ndarray, measurements2: np.ndarray):
+        n = len(switches1)
+        self.reserve(self.__size + n)
+        bits = np.empty((self.planes, n), dtype=np.uint8)
+        bits[0] = switches1 & 1
+        bits[1] = switches2 & 1
+        bits[2] = switches1 >> 1
+        bits[3] = switches2 >> 1
+        bits[4] = measurements1 < 0
+        bits[5] = measurements2 < 0
+        start, offset = divmod(self.__size, 8)
+        if offset:
+            # complete the partially filled last word
+            head = np.unpackbits(self.__data[:, start:start + 1], axis=1,
+                                 count=offset, bitorder='little')
+            bits = np.concatenate([head, bits], axis=1)
+        packed = np.packbits(bits, axis=1, bitorder='little')
+        self.__data[:, start:start + packed.shape[1]] = packed
+        self.__size += n
+
+    def clear(self):
+        self.__size = 0
+
+    def __plane(self, plane: int):
+        return np.unpackbits(self.__data[plane, :self.__words],
+                             count=self.__size, bitorder='little')
+
+    def __switches(self, plane: int):
+        switches = self.__plane(plane + 2) << 1
+        switches |= self.__plane(plane)
+        return switches.view(np.int8)
+
+    def __measurements(self, plane: int):
+        return (1 - 2 * self.__plane(plane).view(np.int8)).astype(np.int8)
+
+    @property
+    def switches1(self):
+        return self.__switches(0)
+
+    @property
+    def switches2(self):
+        return self.__switches(1)
+
+    @property
+    def measurements1(self):
+        return self.__measurements(4)
+
+    @property
+    def measurements2(self):
+        return self.__measurements(5)
+
+    def __valid(self, start: int):
+        # words from the one of shot start with a bit set for every
+        # stored shot from start
+        first, offset = divmod(start, 8)
+        valid = np.full(self.__words - first, 0xff, dtype=np.uint8)
+        if len(valid) and self.__size % 8:
+            valid[-1] = (1 << (self.__size % 8)) - 1
+        if len(valid):
+            valid[0] &= (0xff << offset) & 0xff
+        return valid
+
+    def counts(self, start: int = 0):
+        '''
+        Return the contingency table of the stored shots from start, as
+        EPRCounts.counts, counted on the packed words: counting the new
+        shots after each append keeps a running table.
+        '''
+        w = self.__data[:, start // 8:self.__words]
+        valid = self.__valid(start)
+        # words selecting the value 0, 1 of every bit plane
+        bit = np.stack([~w & valid, w])
+        counts = np.zeros((3, 3, 2, 2), dtype=np.int64)
+        for s1 in range(3):
+            sel1 = bit[s1 & 1, 0] & bit[s1 >> 1, 2]
+            for s2 in range(3):
+                sel = sel1 & bit[s2 & 1, 1] & bit[s2 >> 1, 3]
+                for o1 in range(2):
+                    for o2 in range(2):
+                        counts[s1, s2, o1, o2] = popcount(
+                            sel & bit[o1, 4] & bit[o2, 5])
+        return counts
+
+
+# Shot log: a fixed size header followed by one fixed-width record per
+# shot, so that the records can be memory-mapped while they are appended
+LOG_MAGIC = b'EPRSHOTS'
+LOG_VERSION = 3
+LOG_HEADER_SIZE = 256
+# longest spawn key of the SeedSequence of a run stored in the header
+LOG_SPAWN_DEPTH = 8
+LOG_HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'), ('version', '<u4'), ('stype', '<i4'),
+    ('experiment', '<i4'), ('invert', '<i4'),
+    ('theta1', '<f8'), ('phi1', '<f8'), ('theta2', '<f8'), ('phi2', '<f8'),
+    ('appthetaL', '<f8'), ('appthetaC', '<f8'), ('appthetaR', '<f8'),
+    ('bloch_t', '<f8'), ('bloch_p', '<f8'), ('model', 'S16'),
+    ('seed', 'S40'), ('spawn_key', '<u4', (LOG_SPAWN_DEPTH,)),
+    ('spawn_depth', '<u4'), ('children', '<u4')])
+# suffix of the files derived from a log, e.g. the index of the replay
+LOG_INDEX_SUFFIX = '.idx.npy'
+LOG_RECORD_DTYPE = np.dtype([
+    ('switch1', 'i1'), ('switch2', 'i1'),
+    ('measurement1', 'i1'), ('measurement2', 'i1')])
+
+
+class ShotLog:
+    '''
+    Append-only binary log of the shots of the EPR experiment on disk.
+    The header records the configuration (state type, angles,
+    bloch_t/bloch_p, model of the outcomes) and the SeedSequence of
+    the run, then every shot is a fixed-width record of switches and outcomes,
+    which is read back zero-copy with np.memmap, so the log is not
+    limited by the RAM and a run can be reopened instantly.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = np.frombuffer(
+                f.read(LOG_HEADER_DTYPE.itemsize), dtype=LOG_HEADER_DTYPE)
+        if len(header) == 0 or header['magic'][0] != LOG_MAGIC:
+            raise ValueError("Incorrect shot log " + path)
+        if header['version'][0] != LOG_VERSION:
+            raise ValueError(
+                f"Unsupported shot log version {header['version'][0]}")
+        self.header = {name: header[name][0].item()
+                       for name in LOG_HEADER_DTYPE.names[2:-4]}
+        self.header['invert'] = bool(self.header['invert'])
+        self.header['model'] = self.header['model'].decode()
+        # the run is regenerated from the SeedSequence alone
+        spawn_key = header['spawn_key'][0][:header['spawn_depth'][0]]
+        self.header['seed'] = np.random.SeedSequence(
+            int(header['seed'][0]), spawn_key=spawn_key.tolist(),
+            n_children_spawned=int(header['children'][0]))
+        self.__file = None
+
+    @classmethod
+    def create(cls, path: str, cfg, seed_seq: np.random.SeedSequence):
+        '''
+        Create an empty log for the configuration cfg and the
+        SeedSequence of the run, overwriting path.
+        '''
+        if len(seed_seq.spawn_key) > LOG_SPAWN_DEPTH:
+            raise ValueError(
+                f"Incorrect spawn key {seed_seq.spawn_key}, at most "
+                f"{LOG_SPAWN_DEPTH} levels are supported")
+        header = np.zeros(1, dtype=LOG_HEADER_DTYPE)
+        header['magic'] = LOG_MAGIC
+        header['version'] = LOG_VERSION
+        for name in LOG_HEADER_DTYPE.names[2:-4]:
+            header[name] = getattr(cfg, name)
+        header['seed'] = str(seed_seq.entropy).encode()
+        depth = len(seed_seq.spawn_key)
+        header['spawn_key'][0, :depth] = seed_seq.spawn_key
+        header['spawn_depth'] = depth
+        header['children'] = seed_seq.n_children_spawned
+        with open(path, 'wb') as f:
+            f.write(header.tobytes().ljust(LOG_HEADER_SIZE, b'\0'))
+        # the index of a previous log does not apply to the new one
+        if os.path.exists(path + LOG_INDEX_SUFFIX):
+            os.remove(path + LOG_INDEX_SUFFIX)
+        return cls(path)
+
+    @property
+    def index_path(self):
+        return self.path + LOG_INDEX_SUFFIX
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        size = os.path.getsize(self.path) - LOG_HEADER_SIZE
+        return size // LOG_RECORD_DTYPE.itemsize
+
+    def append(self, switches1: np.ndarray, switches2: np.ndarray,
+               measurements1: np.ndarray, measurements2: np.ndarray):
+        records = np.empty(len(switches1), dtype=LOG_RECORD_DTYPE)
+        records['switch1'] = switches1
+        records['switch2'] = switches2
+        records['measurement1'] = measurements1
+        records['measurement2'] = measurements2
+        if self.__file is None:
+            self.__file = open(self.path, 'ab')
+        self.__file.write(records.tobytes())
+        self.__file.flush()
+
+    def close(self):
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+    @property
+    def records(self):
+        '''
+        Memory-mapped read-only view of the records written so far.
+        '''
+        n = len(self)
+        if n == 0:
+            # an empty region cannot be mapped
+            return np.empty(0, dtype=LOG_RECORD_DTYPE)
+        return np.memmap(self.path, dtype=LOG_RECORD_DTYPE, mode='r',
+                         offset=LOG_HEADER_SIZE, shape=(n,))
+
+    @property
+    def switches1(self):
+        return self.records['switch1']
+
+    @property
+    def switches2(self):
+        return self.records['switch2']
+
+    @property
+    def measurements1(self):
+        return self.records['measurement1']
+
+    @property
+    def measurements2(self):
+        return self.records['measurement2']
+
+
+if __name__ == '__main__':
+    if sys.version_info[0] < 3:
+        raise RuntimeError('Must be using Python 3')
+    pass
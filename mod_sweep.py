@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+'''
+/************************/
+/*      mod_sweep       */
+/*      Version 1.0     */
+/*      2026/10/17      */
+/************************/
+'''
+from mod_rng import generator
+from mod_spin_operators import SingleSpin, TwoSpin
+from mod_spin_operators import measurement_directions, joint_moments
+import numpy as np
+import sys
+from types import SimpleNamespace
+
+
+def two_spin_state(spin: TwoSpin, stype: int):
+    '''
+    Set the state of spin to the simulation type stype of two_spin_sim.
+    '''
+    s = SingleSpin()
+    match stype:
+        case 1:
+            A = s.u
+            B = s.d
+            spin.ProductState(A, B)
+        case 2:
+            A = 1 / np.sqrt(2) * (s.u + s.d)
+            B = s.u / 2 + np.sqrt(3) / 2 * s.d
+            spin.ProductState(A, B)
+        case 3:
+            spin.Singlet()
+        case 4:
+            spin.Triplet(1)
+        case 5:
+            spin.Triplet(2)
+        case 6:
+            spin.Triplet(3)
+        case 7:
+            spin.psi = np.sqrt(0.6) * spin.BasisVector('ud') - \
+                np.sqrt(0.4) * spin.BasisVector('du')
+        case _:
+            raise ValueError(
+                f"Incorrect simulation type {stype}")
+
+
+def sweep_directions(thetaA: np.ndarray, phiA: np.ndarray,
+                     thetaB: np.ndarray, phiB: np.ndarray,
+                     bloch_t: float = 1.0, bloch_p: float = 1.0):
+    '''
+    Return the pairs of directions of A and B for every point of the
+    grid of angles (radians, broadcast together), shape (..., 2, 2).
+    '''
+    directionsA = measurement_directions(thetaA, phiA, bloch_t, bloch_p)
+    directionsB = measurement_directions(thetaB, phiB, bloch_t, bloch_p)
+    return np.broadcast_arrays(directionsA, directionsB)
+
+
+def exact_sweep(spin: TwoSpin, thetaA: np.ndarray, phiA: np.ndarray,
+                thetaB: np.ndarray, phiB: np.ndarray,
+                bloch_t: float = 1.0, bloch_p: float = 1.0):
+    '''
+    Return the exact joint probabilities, the means of A and B, the
+    correlation E = < σ^A σ^B > and the correlation coefficient for
+    every point of the grid of angles, in a single vectorized pass.
+    '''
+    directionsA, directionsB = sweep_directions(
+        thetaA, phiA, thetaB, phiB, bloch_t, bloch_p)
+    p = spin.JointProbabilities(directionsA, directionsB, 'tensor')
+    moments = joint_moments(p)
+    return SimpleNamespace(
+        probabilities=p, meanA=moments.mean1, meanB=moments.mean2,
+        E=moments.expectation, correlation=moments.correlation)
+
+
+def sampled_sweep(spin: TwoSpin, thetaA: np.ndarray, phiA: np.ndarray,
+                  thetaB: np.ndarray, phiB: np.ndarray, shots: int,
+                  bloch_t: float = 1.0, bloch_p: float = 1.0,
+                  rng: np.random.Generator = None, simulate_1=True):
+    '''
+    Perform shots measurements for every point of the grid of angles
+    with TwoSpin.MeasureBatch and return the counts of the outcomes,
+    shape (..., 2, 2), the estimated means, the correlation E and its
+    standard error.
+    '''
+    if rng is None:
+        rng = generator()
+    directionsA, directionsB = sweep_directions(
+        thetaA, phiA, thetaB, phiB, bloch_t, bloch_p)
+    shape = directionsA.shape[:-2]
+    # the distinct directions of each side are the settings of the
+    # batch, so the probabilities are computed once per combination
+    tableA, settingsA = np.unique(
+        directionsA.reshape(-1, 4), axis=0, return_inverse=True)
+    tableB, settingsB = np.unique(
+        directionsB.reshape(-1, 4), axis=0, return_inverse=True)
+    tableA = tableA.reshape(-1, 2, 2)
+    tableB = tableB.reshape(-1, 2, 2)
+    settingsA = settingsA.reshape(-1)
+    settingsB = settingsB.reshape(-1)
+    points = len(settingsA)
+    counts = np.zeros(points * 4, dtype=np.int64)
+    # points per batch, so that a batch has about 1 << 20 shots; grids
+    # which are not an outer product use the directions of the batch
+    # only, whose combinations grow quadratically
+    block = max(1, (1 << 20) // max(shots, 1))
+    outer = len(tableA) * len(tableB) <= 4 * points
+    if not outer:
+        block = min(block, 256)
+    for start in range(0, points, block):
+        end = min(start + block, points)
+        if outer:
+            tables = (tableA, tableB)
+            s1, s2 = settingsA[start:end], settingsB[start:end]
+        else:
+            tables = (tableA[settingsA[start:end]],
+                      tableB[settingsB[start:end]])
+            s1 = s2 = np.arange(end - start)
+        sp1, sp2 = spin.MeasureBatch(
+            tables[0], tables[1], simulate_1, rng,
+            np.repeat(s1, shots), np.repeat(s2, shots), 'tensor')
+        cells = np.repeat(np.arange(start, end), shots) * 4
+        cells += (1 - sp1.astype(np.intp)) // 2 * 2
+        cells += (1 - sp2.astype(np.intp)) // 2
+        counts += np.bincount(cells, minlength=len(counts))
+    counts = counts.reshape(shape + (2, 2))
+    moments = joint_moments(counts / max(shots, 1))
+    E = moments.expectation
+    return SimpleNamespace(
+        counts=counts, meanA=moments.mean1, meanB=moments.mean2, E=E,
+        stderr=np.sqrt(np.clip(1 - E ** 2, 0, None) / max(shots, 1)))
+
+
+if __name__ == '__main__':
+    if sys.version_info[0] < 3:
+        raise RuntimeError('Must be using Python 3')
+    pass
@@ -9,6 +9,7 @@
 import argparse
 import cmath
 import math
+from mod_rng import seed, generator
 from mod_spin_operators import SingleSpin
 import numpy as np
 from PyQt6 import QtWidgets
@@ -26,7 +27,6 @@ from OpenGL.GLU import gluPerspective, gluLookAt
 from OpenGL.GL import (
     GL_DEPTH_TEST, GL_COLOR_BUFFER_BIT, GL_DEPTH_BUFFER_BIT,
     GL_QUADS, GL_LINES, glFlush, GL_PROJECTION, GL_MODELVIEW)
-import random
 import sys
 import time
 from types import SimpleNamespace
@@ -270,7 +270,7 @@ class OpenGLWidget(QOpenGLWidget):
             np.exp(1j * self.a_phi) * np.sin(self.a_theta / 2)])
         prob_p1 = np.abs(np.vdot(direction, self.current_state)) ** 2
         # generate a random number between 0 and 1
-        random_number = random.uniform(0, 1)
+        random_number = generator().random()
 
         # perform the measurement in apparatus direction
         self.num_measurements += 1
@@ -372,7 +372,7 @@ def parse_color(color_string):
 def main():
     # Set a fixed seed value
     seed_value = 5692
-    random.seed(seed_value)
+    seed(seed_value)
     parser = argparse.ArgumentParser(description=description,
                                      formatter_class=CustomHelpFormatter)
     parser.add_argument('-t', '--simul_type', help='simulation type',
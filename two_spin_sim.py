@@ -8,7 +8,11 @@
 '''
 import argparse
 import math
-from mod_spin_operators import SingleSpin, TwoSpin
+from mod_rng import seed, generator
+from mod_spin_operators import TwoSpin
+from mod_spin_operators import measurement_directions
+from mod_statistics import RunningCorrelation
+from mod_sweep import two_spin_state
 import numpy as np
 from PyQt6 import QtWidgets
 from PyQt6.QtWidgets import QPushButton, QSlider, QLabel
@@ -25,7 +29,6 @@ from OpenGL.GLU import gluPerspective, gluLookAt
 from OpenGL.GL import (
     GL_DEPTH_TEST, GL_COLOR_BUFFER_BIT, GL_DEPTH_BUFFER_BIT,
     GL_QUADS, GL_LINES, glFlush, GL_PROJECTION, GL_MODELVIEW)
-import random
 import sys
 import time
 from types import SimpleNamespace
@@ -35,7 +38,7 @@ cfg = SimpleNamespace(
     # additional coefficients  to to convert the real-space angles
     # into the corresponding angles in the Hilbert space (Bloch sphere)
     bloch_t=1.0, bloch_p=1.0,
-    verbose=False)
+    exact=False, verbose=False)
 
 description = (
     'This script simulates two spin following '
@@ -68,10 +71,23 @@ description = (
     '"-m, --measure_both" (default = False).\n\n'
     'It is possible to set the color for the left and right apparatus '
     'with the command line option "-l, --color_left" (default = green) '
-    'and "-r, --color_right (default = red).'
+    'and "-r, --color_right (default = red).\n\n'
+    'The exact (infinite-shot) values predicted by the Born rule are '
+    'shown next to the measured ones with the command line option '
+    '"-a, --exact".'
 )
 
 
+def with_exact(value: float, exact: float = None, spec: str = '.2f'):
+    '''
+    Format value followed by its exact value if given.
+    '''
+    text = format(value, spec)
+    if exact is not None:
+        text += f" (exact {format(exact, spec)})"
+    return text
+
+
 class SimulationThread(QThread):
     # Currently is not used but it is ready in case there is a time
     # evolution for example updating with a magnetic field applied
@@ -83,31 +99,8 @@ class SimulationThread(QThread):
 
     def run(self):
         spin = TwoSpin()
-        s = SingleSpin()
         # initial condition for the case needed
-        match cfg.stype:
-            case 1:
-                A = s.u
-                B = s.d
-                spin.ProductState(A, B)
-            case 2:
-                A = 1 / np.sqrt(2) * (s.u + s.d)
-                B = s.u / 2 + np.sqrt(3) / 2 * s.d
-                spin.ProductState(A, B)
-            case 3:
-                spin.Singlet()
-            case 4:
-                spin.Triplet(1)
-            case 5:
-                spin.Triplet(2)
-            case 6:
-                spin.Triplet(3)
-            case 7:
-                spin.psi = np.sqrt(0.6) * spin.BasisVector('ud') - \
-                    np.sqrt(0.4) * spin.BasisVector('du')
-            case _:
-                raise ValueError(
-                    f"Incorrect simulation type {cfg.stype}")
+        two_spin_state(spin, cfg.stype)
         while True:
             self.current_state = spin.psi
             self.result.emit(self.current_state)
@@ -129,9 +122,13 @@ class OpenGLWidget(QOpenGLWidget):
         self.count_p1B = 0
         self.count_m1B = 0
         self.spin = TwoSpin()
-        self.sigma = {'A': {'x': [], 'y': [], 'z': [], 'th_ph': []},
-                      'B': {'x': [], 'y': [], 'z': [], 'th_ph': []}
-                      }
+        # generator of the batched measurements, spawned from the seeded
+        # streams so that the fixed seed in main still applies
+        self.rng = generator()
+        # streaming statistics of the paired (A, B) measurements
+        self.sigma = {'x': RunningCorrelation(), 'y': RunningCorrelation(),
+                      'z': RunningCorrelation(),
+                      'th_ph': RunningCorrelation()}
         self.directions = {
             'z': np.array([[1, 0],
                            [0, 1]]),
@@ -175,10 +172,16 @@ class OpenGLWidget(QOpenGLWidget):
         self.drawRectangleAndArrow()
         glPopMatrix()
 
-        if len(self.sigma['A']['th_ph']) > 0:
-            saz = np.mean(self.sigma['A']['z'])
-            sax = np.mean(self.sigma['A']['x'])
-            say = np.mean(self.sigma['A']['y'])
+        measurements_nbA = self.count_p1A + self.count_m1A
+        measurements_nbB = self.count_p1B + self.count_m1B
+        # exact values shown next to the measured ones
+        exact = {}
+        if cfg.exact and self.spin.psi is not None:
+            exact = self.exact()
+        if measurements_nbA > 0:
+            saz = self.sigma['z'].mean[0]
+            sax = self.sigma['x'].mean[0]
+            say = self.sigma['y'].mean[0]
             sai = saz**2 + sax**2 + say**2
             painter = QPainter(self)
             painter.setFont(QFont('Arial', 14))
@@ -187,19 +190,23 @@ class OpenGLWidget(QOpenGLWidget):
             y = int(0.25 * self.height() + 55)
             rect = QRect(0, 0, half_width, self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             f"Σ< σ_Ai > = {sai:.2f}")
+                             "Σ< σ_Ai > = " + with_exact(
+                                 sai, exact.get('Ai')))
             y = int(0.25 * self.height() + 90)
             rect = QRect(0, 0, half_width, self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             f"< σ^Ay > = {say:.2f}")
+                             "< σ^Ay > = " + with_exact(
+                                 say, exact.get('Ay')))
             y = int(0.25 * self.height() + 125)
             rect = QRect(0, 0, half_width, self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             f"< σ^Ax > = {sax:.2f}")
+                             "< σ^Ax > = " + with_exact(
+                                 sax, exact.get('Ax')))
             y = int(0.25 * self.height() + 160)
             rect = QRect(0, 0, half_width, self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             f"< σ^Az > = {saz:.2f}")
+                             "< σ^Az > = " + with_exact(
+                                 saz, exact.get('Az')))
             y = int(0.25 * self.height() + 55)
             rect = QRect(0, y, half_width, self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
@@ -208,23 +215,25 @@ class OpenGLWidget(QOpenGLWidget):
             rect = QRect(0, y, half_width, self.height() - y)
             painter.drawText(
                 rect, Qt.AlignmentFlag.AlignCenter,
-                f"Total Measurements: {len(self.sigma['A']['th_ph'])}")
+                f"Total Measurements: {measurements_nbA}")
             y = int(0.25 * self.height() + 125)
             rect = QRect(0, y, half_width, self.height() - y)
-            prob_p1 = self.count_p1A / len(self.sigma['A']['th_ph']) * 100
+            prob_p1 = self.count_p1A / measurements_nbA
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             f" < +1 > = {prob_p1:.1f}%")
+                             " < +1 > = " + with_exact(
+                                 prob_p1, exact.get('A+'), '.1%'))
             y = int(0.25 * self.height() + 160)
             rect = QRect(0, y, half_width, self.height() - y)
-            prob_m1 = self.count_m1A / len(self.sigma['A']['th_ph']) * 100
+            prob_m1 = self.count_m1A / measurements_nbA
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             f"< -1 > = {prob_m1:.1f}%")
+                             "< -1 > = " + with_exact(
+                                 prob_m1, exact.get('A-'), '.1%'))
             painter.end()
 
-        if len(self.sigma['B']['th_ph']) > 0:
-            sbz = np.mean(self.sigma['B']['z'])
-            sbx = np.mean(self.sigma['B']['x'])
-            sby = np.mean(self.sigma['B']['y'])
+        if measurements_nbB > 0:
+            sbz = self.sigma['z'].mean[1]
+            sbx = self.sigma['x'].mean[1]
+            sby = self.sigma['y'].mean[1]
             sbi = sbz**2 + sbx**2 + sby**2
             painter = QPainter(self)
             painter.setFont(QFont('Arial', 14))
@@ -233,19 +242,23 @@ class OpenGLWidget(QOpenGLWidget):
             y = int(0.25 * self.height() + 55)
             rect = QRect(0, 0, tq_width, self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             f"Σ< σ_Bi > = {sbi:.2f}")
+                             "Σ< σ_Bi > = " + with_exact(
+                                 sbi, exact.get('Bi')))
             y = int(0.25 * self.height() + 90)
             rect = QRect(0, 0, tq_width, self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             f"< σ^By > = {sby:.2f}")
+                             "< σ^By > = " + with_exact(
+                                 sby, exact.get('By')))
             y = int(0.25 * self.height() + 125)
             rect = QRect(0, 0, tq_width, self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             f"< σ^Bx > = {sbx:.2f}")
+                             "< σ^Bx > = " + with_exact(
+                                 sbx, exact.get('Bx')))
             y = int(0.25 * self.height() + 160)
             rect = QRect(0, 0, tq_width, self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             f"< σ^Bz > = {sbz:.2f}")
+                             "< σ^Bz > = " + with_exact(
+                                 sbz, exact.get('Bz')))
             y = int(0.25 * self.height() + 55)
             rect = QRect(0, y, tq_width, self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
@@ -254,54 +267,53 @@ class OpenGLWidget(QOpenGLWidget):
             rect = QRect(0, y, tq_width, self.height() - y)
             painter.drawText(
                 rect, Qt.AlignmentFlag.AlignCenter,
-                f"Total Measurements: {len(self.sigma['B']['th_ph'])}")
+                f"Total Measurements: {measurements_nbB}")
             y = int(0.25 * self.height() + 125)
             rect = QRect(0, y, tq_width, self.height() - y)
-            prob_p2 = self.count_p1B / len(self.sigma['B']['th_ph']) * 100
+            prob_p2 = self.count_p1B / measurements_nbB
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             f"< +1 > = {prob_p2:.1f}%")
+                             "< +1 > = " + with_exact(
+                                 prob_p2, exact.get('B+'), '.1%'))
             y = int(0.25 * self.height() + 160)
             rect = QRect(0, y, tq_width, self.height() - y)
-            prob_m2 = self.count_m1B / len(self.sigma['B']['th_ph']) * 100
+            prob_m2 = self.count_m1B / measurements_nbB
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             f"< -1 > = {prob_m2:.1f}%")
+                             "< -1 > = " + with_exact(
+                                 prob_m2, exact.get('B-'), '.1%'))
             painter.end()
 
-        if (len(self.sigma['A']['th_ph']) > 0) and \
-                (len(self.sigma['B']['th_ph']) > 0) and \
-                (len(self.sigma['A']['z']) > 3):
-            # with limited number of measurements, the following
-            # warning might appears.
-            # RuntimeWarning: invalid value encountered in divide
-            # c /= stddev[None, :]
-            corrz = np.corrcoef(self.sigma['A']['z'],
-                                self.sigma['B']['z'])[0, 1]
-            corrx = np.corrcoef(self.sigma['A']['x'],
-                                self.sigma['B']['x'])[0, 1]
-            corry = np.corrcoef(self.sigma['A']['y'],
-                                self.sigma['B']['y'])[0, 1]
+        if (measurements_nbA > 0) and (measurements_nbB > 0) and \
+                (self.sigma['z'].n > 3):
+            # with limited number of measurements, the correlation
+            # might be nan if all the measurements are equal
+            corrz = self.sigma['z'].correlation()
+            corrx = self.sigma['x'].correlation()
+            corry = self.sigma['y'].correlation()
             painter = QPainter(self)
             painter.setFont(QFont('Arial', 14))
             painter.setPen(QColor(255, 255, 255))
             y = int(0.25 * self.height() + 90)
             rect = QRect(0, 0, self.width(), self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             f"Correlation <σ^Ay> <σ^By> = {corry:.2f}")
+                             "Correlation <σ^Ay> <σ^By> = " + with_exact(
+                                 corry, exact.get('corry')))
             y = int(0.25 * self.height() + 125)
             rect = QRect(0, 0, self.width(), self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             f"Correlation <σ^Ax> <σ^Bx> = {corrx:.2f}")
+                             "Correlation <σ^Ax> <σ^Bx> = " + with_exact(
+                                 corrx, exact.get('corrx')))
             y = int(0.25 * self.height() + 160)
             rect = QRect(0, 0, self.width(), self.height() - y)
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                             f"Correlation <σ^Az> <σ^Bz> = {corrz:.2f}")
+                             "Correlation <σ^Az> <σ^Bz> = " + with_exact(
+                                 corrz, exact.get('corrz')))
             if (cfg.m):
                 y = int(0.25 * self.height() + 55)
-                corrm = np.corrcoef(self.sigma['A']['th_ph'],
-                                    self.sigma['B']['th_ph'])[0, 1]
+                corrm = self.sigma['th_ph'].correlation()
                 rect = QRect(0, y, self.width(), self.height() - y)
                 painter.drawText(rect, Qt.AlignmentFlag.AlignCenter,
-                                 f"Correlation <σ^Am> <σ^Bm> = {corrm:.2f}")
+                                 "Correlation <σ^Am> <σ^Bm> = " + with_exact(
+                                     corrm, exact.get('corrm')))
             painter.end()
         glFlush()
 
@@ -351,52 +363,63 @@ class OpenGLWidget(QOpenGLWidget):
             self.count_m1A += 1
             self.measurementA = -1
 
+    def slider_directions(self):
+        # measurement directions set with the sliders and their opposite
+        # for A and B
+        return (
+            measurement_directions(self.a_thetaA, self.a_phiA,
+                                   cfg.bloch_t, cfg.bloch_p),
+            measurement_directions(self.a_thetaB, self.a_phiB,
+                                   cfg.bloch_t, cfg.bloch_p))
+
+    def exact(self):
+        # exact means of A and B and their correlation along the axes
+        # and the slider directions, for the last measured state
+        axes = ['z', 'x', 'y']
+        directionsA, directionsB = self.slider_directions()
+        directions = np.array([self.directions[axis] for axis in axes])
+        meanA, meanB, corr = self.spin.Correlation(
+            np.concatenate([directions, directionsA[None]]),
+            np.concatenate([directions, directionsB[None]]), 'tensor')
+        exact = {}
+        for i, axis in enumerate(axes):
+            exact['A' + axis] = meanA[i]
+            exact['B' + axis] = meanB[i]
+            exact['corr' + axis] = corr[i]
+        exact['Ai'] = np.sum(meanA[:3] ** 2)
+        exact['Bi'] = np.sum(meanB[:3] ** 2)
+        # probabilities of +1 and -1 along the slider directions
+        exact['A+'], exact['A-'] = (1 + meanA[3]) / 2, (1 - meanA[3]) / 2
+        exact['B+'], exact['B-'] = (1 + meanB[3]) / 2, (1 - meanB[3]) / 2
+        exact['corrm'] = corr[3]
+        return exact
+
     def measureAB(self, current_state: np.ndarray, measureA: bool):
         self.spin.psi = current_state
-        for axis in ['z', 'x', 'y']:
-            sp = self.spin.Measure(self.directions[axis],
-                                   self.directions[axis], True)
-            self.sigma['A'][axis].append(sp[0])
-            self.sigma['B'][axis].append(sp[1])
-
-        # get the measurement direction for A
-        directionAp = np.array([
-            np.cos(self.a_thetaA * cfg.bloch_t / 2),
-            np.exp(1j * self.a_phiA * cfg.bloch_p) * np.sin(
-                self.a_thetaA * cfg.bloch_t / 2)])
-        # get the opposite measurement direction
-        directionAm = np.array([
-            np.cos(np.pi / 2 + self.a_thetaA * cfg.bloch_t / 2),
-            np.exp(1j * self.a_phiA * cfg.bloch_p) * np.sin(
-                np.pi / 2 + self.a_thetaA * cfg.bloch_t / 2)])
-
-        # get the measurement direction for B
-        directionBp = np.array([
-            np.cos(self.a_thetaB * cfg.bloch_t / 2),
-            np.exp(1j * self.a_phiB * cfg.bloch_p) * np.sin(
-                self.a_thetaB * cfg.bloch_t / 2)])
-        # get the opposite measurement direction
-        directionBm = np.array([
-            np.cos(np.pi / 2 + self.a_thetaB * cfg.bloch_t / 2),
-            np.exp(1j * self.a_phiB * cfg.bloch_p) * np.sin(
-                np.pi / 2 + self.a_thetaB * cfg.bloch_t / 2)])
-
+        # measure the three axes in a single batch, sampling directly
+        # from the correlation tensor of the state
+        axes = ['z', 'x', 'y']
+        directions = np.array([self.directions[axis] for axis in axes])
+        spA, spB = self.spin.MeasureBatch(directions, directions, True,
+                                          self.rng, method='tensor')
+        for i, axis in enumerate(axes):
+            self.sigma[axis].update(spA[i], spB[i])
+
+        # the outcomes are returned as (A, B) whichever is measured first
+        directionsA, directionsB = self.slider_directions()
+        spA, spB = self.spin.MeasureBatch(
+            directionsA, directionsB, measureA, self.rng, method='tensor')
+        spA, spB = int(spA[0]), int(spB[0])
         if measureA:
-            sp = self.spin.Measure(np.array([directionAp, directionAm]),
-                                   np.array([directionBp, directionBm]), True)
-            self.sigma['A']['th_ph'].append(sp[0])
-            self.updateCountA(sp[0])
+            self.updateCountA(spA)
             if cfg.m:
-                self.sigma['B']['th_ph'].append(sp[1])
-                self.updateCountB(sp[1])
+                self.updateCountB(spB)
         else:
-            sp = self.spin.Measure(np.array([directionAp, directionAm]),
-                                   np.array([directionBp, directionBm]), False)
-            self.sigma['B']['th_ph'].append(sp[1])
-            self.updateCountB(sp[1])
+            self.updateCountB(spB)
             if cfg.m:
-                self.sigma['A']['th_ph'].append(sp[0])
-                self.updateCountA(sp[0])
+                self.updateCountA(spA)
+        if cfg.m:
+            self.sigma['th_ph'].update(spA, spB)
 
         self.update()
 
@@ -542,7 +565,7 @@ def parse_color(color_string):
 def main():
     # Set a fixed seed value
     seed_value = 5948
-    random.seed(seed_value)
+    seed(seed_value)
     parser = argparse.ArgumentParser(description=description,
                                      formatter_class=CustomHelpFormatter)
     parser.add_argument('-t', '--simul_type', help='simulation type',
@@ -557,6 +580,9 @@ def main():
                         help='Set the right apparatus color as comma-separated'
                         ' RGB values (0-255). Example: -r 255,0,0 -'
                         ' Default: red')
+    parser.add_argument('-a', '--exact', action='store_true',
+                        help='Show the exact values next to the '
+                        'measured ones', required=False)
     parser.add_argument('-v', '--verbose', action='store_true',
                         help='verbose output', required=False)
     parser.add_argument('-b', '--bloch-theta', type=float,
@@ -574,6 +600,8 @@ def main():
         cfg.color_left = args.color_left
     if (args.color_right):
         cfg.color_right = args.color_right
+    if (args.exact):
+        cfg.exact = True
     if (args.verbose):
         cfg.verbose = True
     if (args.bloch_theta):